@@ -0,0 +1,137 @@
+"""
+Redemption load test.
+
+Creates a limited-stock reward and a batch of users, then fires concurrent
+redemptions at it (several per user, released together) through the same
+redemption engine the /api/rewards/redeem endpoint uses, against MONGO_URI.
+Afterwards it checks that nothing was oversold or overdrawn, and that retries
+sharing an idempotency key produced a single redemption.
+
+    python load_test_redeem.py                          # 50 users, 10 in stock
+    python load_test_redeem.py --users 200 --stock 25 --attempts 4 --workers 64
+    python load_test_redeem.py --keep                   # leave the test data in place
+
+Runs in transactions on a replica set and with compensating updates on a
+standalone server.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from src.db import rewards_collection, redemptions_collection, users_collection  # noqa: E402
+from src.utils.activity import activity_collection  # noqa: E402
+from src.utils.leaderboard import leaderboard_windows_collection  # noqa: E402
+from src.utils.points_ledger import points_ledger_collection, points_daily_collection  # noqa: E402
+from src.utils.redemption import redeem, RedemptionError  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="number of test users")
+    parser.add_argument("--stock", type=int, default=10, help="units of the limited reward")
+    parser.add_argument("--cost", type=int, default=100, help="points per redemption")
+    parser.add_argument("--points", type=int, default=250, help="starting points per user")
+    parser.add_argument("--attempts", type=int, default=3, help="redemptions attempted per user")
+    parser.add_argument("--workers", type=int, default=32, help="concurrent requests")
+    parser.add_argument("--keep", action="store_true", help="do not delete the test data")
+    args = parser.parse_args()
+
+    run = uuid.uuid4().hex[:8]
+    user_ids = [f"loadtest_{run}_{i}" for i in range(args.users)]
+    reward_id = rewards_collection.insert_one({
+        "name": f"Load test keytag {run}",
+        "description": "Limited drop used by load_test_redeem.py",
+        "points_required": args.cost,
+        "category": "loadtest",
+        "image": "",
+        "stock": args.stock,
+        "active": True
+    }).inserted_id
+    users_collection.insert_many([
+        {"clerk_id": user_id, "name": user_id, "points": args.points} for user_id in user_ids
+    ])
+
+    # Every user's last attempt is sent twice with the same idempotency key
+    requests = []
+    for user_id in user_ids:
+        for attempt in range(args.attempts):
+            requests.append((user_id, f"{run}-{attempt}"))
+        requests.append((user_id, f"{run}-{args.attempts - 1}"))
+
+    outcomes = Counter()
+    latencies = []
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def fire(user_id, key):
+        start.wait()
+        started = time.perf_counter()
+        try:
+            result = redeem(user_id, str(reward_id), idempotency_key=key)
+            outcome = "replayed" if result["replayed"] else "redeemed"
+        except RedemptionError as e:
+            outcome = e.message.split(".")[0]
+        except Exception as e:
+            outcome = f"error: {type(e).__name__}"
+        with lock:
+            outcomes[outcome] += 1
+            latencies.append(time.perf_counter() - started)
+
+    print(f"Redeeming {len(requests)} times ({args.users} users, {args.stock} in stock, {args.workers} workers)")
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(fire, user_id, key) for user_id, key in requests]
+        start.set()
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - wall
+
+    latencies.sort()
+    for outcome, count in outcomes.most_common():
+        print(f"  {count:>6}  {outcome}")
+    print(f"  {wall:.2f}s wall, p50 {latencies[len(latencies) // 2] * 1000:.0f}ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f}ms")
+
+    # ---------------- Invariants ----------------
+    stock_left = rewards_collection.find_one({"_id": reward_id})["stock"]
+    redemptions = list(redemptions_collection.find({"reward_id": str(reward_id)}))
+    per_user = Counter(r["user_clerk_id"] for r in redemptions)
+    balances = {u["clerk_id"]: u["points"] for u in users_collection.find({"clerk_id": {"$in": user_ids}})}
+    logged = activity_collection.count_documents({"user_id": {"$in": user_ids}, "type": "reward_redemption"})
+    ledgered = points_ledger_collection.count_documents({"user_id": {"$in": user_ids}, "source": "redemption"})
+
+    checks = [
+        ("stock never negative", stock_left >= 0),
+        ("stock matches redemptions", stock_left == args.stock - len(redemptions)),
+        ("redeemed responses match records", outcomes["redeemed"] == len(redemptions)),
+        ("no user overdrawn", all(points >= 0 for points in balances.values())),
+        ("balances match redemptions",
+         all(balances[u] == args.points - args.cost * per_user[u] for u in user_ids)),
+        ("one activity entry per redemption", logged == len(redemptions)),
+        ("one ledger entry per redemption", ledgered == len(redemptions)),
+        ("idempotency keys unique", len({r.get("idempotency_key") for r in redemptions}) == len(redemptions)),
+    ]
+    for description, ok in checks:
+        print(f"{'✅' if ok else '❌'} {description}")
+
+    if not args.keep:
+        rewards_collection.delete_one({"_id": reward_id})
+        redemptions_collection.delete_many({"reward_id": str(reward_id)})
+        users_collection.delete_many({"clerk_id": {"$in": user_ids}})
+        activity_collection.delete_many({"user_id": {"$in": user_ids}})
+        leaderboard_windows_collection.delete_many({"clerk_id": {"$in": user_ids}})
+        points_ledger_collection.delete_many({"user_id": {"$in": user_ids}})
+        points_daily_collection.delete_many({"user_id": {"$in": user_ids}})
+
+    sys.exit(0 if all(ok for _, ok in checks) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Import-time profile of the API.
+
+Runs `python -X importtime -c "import src.main"` in a fresh interpreter and
+reports the slowest modules, so heavy imports creeping back into start-up are
+easy to spot.
+
+    python profile_imports.py                 # top 25 modules by cumulative time
+    python profile_imports.py --top 50
+    python profile_imports.py --module src.crews.orchestrator_crew
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile(module: str):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True
+    )
+    wall = time.perf_counter() - started
+
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return completed, wall, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.main", help="module to import (default: src.main)")
+    parser.add_argument("--top", type=int, default=25, help="number of modules to list")
+    args = parser.parse_args()
+
+    completed, wall, entries = profile(args.module)
+    if completed.returncode != 0:
+        print(f"❌ import {args.module} failed:\n{completed.stderr[-2000:]}")
+        sys.exit(completed.returncode)
+
+    top_level = [entry for entry in entries if entry[3] == 0]
+    total_us = sum(entry[2] for entry in top_level)
+
+    print(f"import {args.module}: {total_us / 1e6:.3f}s in imports, {wall:.3f}s wall (incl. interpreter start)")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_us, cumulative_us, depth in sorted(entries, key=lambda e: e[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {'  ' * min(depth, 6)}{name}")
+
+    heavy = [name for name in ("crewai", "litellm", "PIL", "tiktoken") if any(e[0] == name for e in entries)]
+    if heavy:
+        print(f"⚠️ Heavy packages imported at start-up: {', '.join(heavy)}")
+    else:
+        print("✅ No heavy agent/LLM/image packages imported at start-up")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,29 @@ Handles chat interactions with recycling guide context and memory.
 """
 import traceback
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 
 # ✅ Clerk + MongoDB integration
 from ..utils.auth import verify_clerk_token
 from ..utils.memory_manager import MemoryManager
-from ..db import users_collection
+from ..utils.executor import run_blocking
+from ..utils.streaming import sse_event, SSE_HEADERS
 
-# ✅ Chat Assistant Crew
-from ..crews.chat_assistant_crew import ChatAssistantCrew
+# ✅ Chat Assistant Crew (built on first use or during start-up warm-up)
+from ..utils.registry import registry
 
-# Initialize router and chat assistant
+# Initialize router; the chat crew (and CrewAI) is only imported when first needed
 router = APIRouter()
-chat_assistant = ChatAssistantCrew()
+
+
+def _build_chat_assistant():
+    from ..crews.chat_assistant_crew import ChatAssistantCrew
+    return ChatAssistantCrew()
+
+
+registry.register("chat_assistant", _build_chat_assistant)
 
 
 # -------------------- MODELS --------------------
@@ -55,43 +64,33 @@ async def handle_chat(request: ChatRequest, user=Depends(verify_clerk_token)):
     try:
         user_id = user["id"]
 
-        # Get conversation history if requested
-        conversation_history = None
-        if request.include_history:
-            history_summary = MemoryManager.get_conversation_summary(user_id, limit=5)
-            conversation_history = history_summary if history_summary else None
+        # History (if requested) and the latest guide come from a single read
+        context = await run_blocking(MemoryManager.load_context, user_id, limit=5 if request.include_history else 0)
+        conversation_history = context["conversation_history"] or None
 
-        # If no recycling guide provided, try to get the latest one
-        recycling_guide = request.recycling_guide
-        if not recycling_guide:
-            recycling_guide = MemoryManager.get_latest_recycling_guide(user_id)
+        # If no recycling guide provided, use the latest one
+        recycling_guide = request.recycling_guide or context["recycling_guide"]
 
         # Generate response from chat assistant
-        response = chat_assistant.chat(
+        chat_assistant = await registry.aget("chat_assistant")
+        response = await run_blocking(
+            chat_assistant.chat,
             user_message=request.message,
             recycling_guide=recycling_guide,
             conversation_history=conversation_history,
             waste_category=request.waste_category
         )
 
-        # Save interaction to memory
-        MemoryManager.save_context(
+        # Save interaction to memory and award points for engagement
+        await run_blocking(
+            MemoryManager.save_context,
             user_id=user_id,
             user_message=request.message,
             assistant_response=response,
-            recycling_guide=recycling_guide
+            recycling_guide=recycling_guide,
+            points=1  # +1 point per chat message
         )
 
-        # Award points for engagement
-        try:
-            users_collection.update_one(
-                {"clerk_id": user_id},
-                {"$inc": {"points": 1}},  # +1 point per chat message
-                upsert=True
-            )
-        except Exception as db_err:
-            print(f"⚠️ MongoDB points update failed: {db_err}")
-
         return {
             "response": response,
             "metadata": {
@@ -101,12 +100,81 @@ async def handle_chat(request: ChatRequest, user=Depends(verify_clerk_token)):
             }
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         print(f"❌ Exception in /chat: {e}\n{tb}")
         raise HTTPException(status_code=500, detail={"error": str(e), "trace": tb[:2000]})
 
 
+@router.post("/chat/stream")
+async def handle_chat_stream(request: ChatRequest, user=Depends(verify_clerk_token)):
+    """
+    Same as /chat, but streams the assistant's reply as Server-Sent Events.
+    Emits "token" events as text arrives, then a "done" event with the full
+    response and metadata once it has been saved ("saved" is false if saving
+    failed; the reply is still delivered).
+    """
+    if not isinstance(user, dict) or not user.get("id"):
+        raise HTTPException(status_code=401, detail="Invalid or missing user authentication")
+
+    user_id = user["id"]
+    try:
+        context = await run_blocking(MemoryManager.load_context, user_id, limit=5 if request.include_history else 0)
+        conversation_history = context["conversation_history"] or None
+        recycling_guide = request.recycling_guide or context["recycling_guide"]
+    except HTTPException:
+        raise
+    except Exception as e:
+        tb = traceback.format_exc()
+        print(f"❌ Exception in /chat/stream: {e}\n{tb}")
+        raise HTTPException(status_code=500, detail={"error": str(e), "trace": tb[:2000]})
+
+    def events():
+        chunks = []
+        try:
+            chat_assistant = registry.get("chat_assistant")
+            for text in chat_assistant.stream_chat(
+                user_message=request.message,
+                recycling_guide=recycling_guide,
+                conversation_history=conversation_history,
+                waste_category=request.waste_category
+            ):
+                chunks.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            print(f"❌ Exception in /chat/stream: {e}")
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        response = "".join(chunks)
+        # The reply has already streamed; always finish with "done"
+        try:
+            saved = MemoryManager.save_context(
+                user_id=user_id,
+                user_message=request.message,
+                assistant_response=response,
+                recycling_guide=recycling_guide,
+                points=1  # +1 point per chat message
+            )
+        except Exception as e:
+            print(f"⚠️ Failed to save streamed chat for user {user_id}: {e}")
+            saved = False
+
+        yield sse_event("done", {
+            "response": response,
+            "saved": saved,
+            "metadata": {
+                "has_guide_context": bool(recycling_guide),
+                "waste_category": request.waste_category,
+                "used_history": bool(conversation_history)
+            }
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 # -------------------- CHAT HISTORY ENDPOINTS --------------------
 @router.get("/chat/history")
 async def get_chat_history(limit: int = 10, user=Depends(verify_clerk_token)):
@@ -1,8 +1,6 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-import os
-import tempfile
 from ..crews.classifier_crew import ClassifierCrew
 
 # Create router for classification endpoints
@@ -69,16 +67,10 @@ async def classify_from_image(file: UploadFile = File(...)):
             detail="File must be an image (JPEG, PNG, etc.)"
         )
 
-    temp_file_path = None
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        # Classify using CrewAI
-        category = classifier_crew.classify(input_data=temp_file_path, is_image=True)
+        # Classify straight from the in-memory upload bytes
+        content = await file.read()
+        category = classifier_crew.classify(input_data=content, is_image=True)
 
         return ClassificationResponse(category=category)
 
@@ -87,10 +79,3 @@ async def classify_from_image(file: UploadFile = File(...)):
             status_code=500,
             detail=f"Image classification failed: {str(e)}"
         )
-    finally:
-        # Always clean up temp file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
@@ -1,70 +1,68 @@
 # backend/src/api/leaderboard_router.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from typing import List
 from ..db import users_collection
+from ..utils.leaderboard import leaderboard
+from ..utils.executor import run_blocking
 
 router = APIRouter(prefix="/api/leaderboard", tags=["leaderboard"])
 
 
 @router.get("/")
-async def get_leaderboard():
+async def get_leaderboard(
+    window: str = Query("all", description="Leaderboard window: all, daily or weekly"),
+    limit: int = Query(10, ge=1, le=100)
+):
     """
-    Get top users for leaderboard
+    Get top users for leaderboard (served from the in-memory ranked index)
     """
-    try:
-        # Get top 10 users sorted by points (descending)
-        top_users = list(users_collection.find().sort("points", -1).limit(10))
-
-        leaderboard_data = []
-        for index, user in enumerate(top_users, 1):
-            leaderboard_data.append({
-                "rank": index,
-                "username": user.get("name", "Anonymous"),
-                "points": user.get("points", 0),
-                "avatar": user.get("avatar"),
-                "clerk_id": user.get("clerk_id")
-            })
+    if window not in ("all", "daily", "weekly"):
+        raise HTTPException(status_code=400, detail=f"Unknown leaderboard window: {window}")
 
-        total_users = users_collection.count_documents({})
+    try:
+        leaderboard_data = await run_blocking(leaderboard.top, limit, window)
+        total_users = await run_blocking(leaderboard.total_users, window)
 
         return {
             "leaderboard": leaderboard_data,
-            "total_users": total_users
+            "total_users": total_users,
+            "window": window
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching leaderboard: {str(e)}")
 
 
 @router.get("/user/{clerk_id}")
-async def get_user_rank(clerk_id: str):
+async def get_user_rank(
+    clerk_id: str,
+    window: str = Query("all", description="Leaderboard window: all, daily or weekly")
+):
     """Get specific user's rank and points"""
-    try:
-        user = users_collection.find_one({"clerk_id": clerk_id})
-
-        # If user doesn't exist, create them with default data
-        if not user:
-            return {
-                "username": "User Not Found",
-                "points": 0,
-                "rank": 0,
-                "avatar": None
-            }
-
-        # Calculate user's rank
-        user_points = user.get("points", 0)
-        users_with_more_points = users_collection.count_documents({
-            "points": {"$gt": user_points}
-        })
-        user_rank = users_with_more_points + 1
-
-        return {
-            "username": user.get("name"),
-            "points": user.get("points", 0),
-            "rank": user_rank,
-            "avatar": user.get("avatar")
-        }
+    if window not in ("all", "daily", "weekly"):
+        raise HTTPException(status_code=400, detail=f"Unknown leaderboard window: {window}")
 
+    try:
+        user_rank = await run_blocking(leaderboard.rank, clerk_id, "all")
+
+        # Users created since the last resync are picked up from MongoDB once
+        if user_rank is None:
+            user = await run_blocking(users_collection.find_one, {"clerk_id": clerk_id})
+            if not user:
+                return {
+                    "username": "User Not Found",
+                    "points": 0,
+                    "rank": 0,
+                    "avatar": None
+                }
+            leaderboard.register_user(clerk_id, user.get("name"), user.get("avatar"), user.get("points", 0))
+
+        return await run_blocking(leaderboard.rank, clerk_id, window)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching user rank: {str(e)}")
 
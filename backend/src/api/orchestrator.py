@@ -1,25 +1,50 @@
-import os, tempfile, traceback
-import os, tempfile
+import os, traceback
+import asyncio
 import re
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Depends, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, List
 
 # ✅ Clerk + MongoDB integration
 from ..utils.auth import verify_clerk_token
 from ..db import users_collection
 
-# ✅ Agent orchestrator
-from ..crews.orchestrator_crew import OrchestratorCrew
+# ✅ Agent orchestrator (built on first use or during start-up warm-up)
+from ..utils.registry import registry
 
 # ✅ Memory manager for chat context
 from ..utils.memory_manager import MemoryManager
-from ..crews.orchestrator_crew import OrchestratorCrew
 
-# Initialize router and orchestrator
+# ✅ Bounded worker pool for blocking agent / DB calls
+from ..utils.executor import run_blocking
+
+# ✅ Append-only activity log (keeps user documents small)
+from ..utils.activity import ActivityLog
+
+# ✅ Points ledger (every award is recorded before the balance changes)
+from ..utils.points_ledger import points_ledger
+
+# ✅ Server-Sent Events helpers for token streaming
+from ..utils.streaming import sse_event, SSE_HEADERS
+
+# ✅ Background queue for side effects (chat memory, activity, points)
+from ..utils.task_queue import task_queue, new_idempotency_key
+
+# Initialize router; the orchestrator (and CrewAI) is only imported when first needed
 router = APIRouter()
-orchestrator = OrchestratorCrew()
+
+
+def _build_orchestrator():
+    from ..crews.orchestrator_crew import OrchestratorCrew
+    return OrchestratorCrew()
+
+
+registry.register("orchestrator", _build_orchestrator)
+
+# Upper bound on images accepted by /handle/images
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", "32"))
 
 
 # -------------------- MODELS --------------------
@@ -36,9 +61,81 @@ class QuizAnswerRequest(BaseModel):
     selected_answer: str
 
 
+# -------------------- HELPERS --------------------
+async def _skip():
+    """Placeholder for an agent step that was not requested."""
+    return None
+
+
+def _summarize_steps(task: str, result: dict) -> str:
+    """One-line activity summary for an orchestrator result."""
+    agents = [step.get("agent") for step in result.get("steps", [])]
+    classifier_step = next((step for step in result.get("steps", []) if step.get("agent") == "classifier"), None)
+    if classifier_step:
+        return f"{task}: classified as {classifier_step.get('output')} ({', '.join(agents)})"
+    return f"{task}: {', '.join(agents) or 'no steps'}"
+
+
+# -------------------- BACKGROUND JOBS --------------------
+# Run on the task queue after the response is sent. Each job is retried until
+# it succeeds; the idempotency key makes repeated runs harmless.
+@task_queue.handler("orchestration")
+def _persist_orchestration(key: str, user_id: str, task: str, result: dict):
+    """Save the recycling guide to chat memory, log the activity and award points."""
+    # ✅ Save recycling guide to chat memory if present in result
+    recycling_step = next((step for step in result.get("steps", []) if step.get("agent") == "recycling"), None)
+    classifier_step = next((step for step in result.get("steps", []) if step.get("agent") == "classifier"), None)
+
+    if recycling_step and classifier_step:
+        if not MemoryManager.save_context(
+            user_id=user_id,
+            user_message=f"Classified waste item: {classifier_step.get('output', 'unknown')}",
+            assistant_response="Here's how to recycle this item.",
+            recycling_guide=recycling_step.get("output"),
+            idempotency_key=key
+        ):
+            raise RuntimeError("Failed to save recycling guide to chat memory")
+
+    # ✅ Log the task and award points once per key
+    ActivityLog.log(
+        user_id,
+        task,
+        {"output": result},
+        summary=_summarize_steps(task, result),
+        points=3,  # base reward for each text task
+        idempotency_key=key
+    )
+
+
+@task_queue.handler("image_classification")
+def _persist_image_classification(key: str, user_id: str, classification: str, response: dict,
+                                  recycling_guide: Optional[str] = None):
+    """Log the classification, award points and keep the guide for the Chat Assistant."""
+    ActivityLog.log(
+        user_id,
+        "image_classification",
+        {"classification": classification, "details": response},
+        summary=f"Classified image as {classification}",
+        points=5,  # +5 points per image classification
+        idempotency_key=key
+    )
+
+    # ✅ Save recycling guide to chat memory for Chat Assistant context
+    if recycling_guide:
+        if not MemoryManager.save_context(
+            user_id=user_id,
+            user_message=f"Classified waste item: {classification}",
+            assistant_response="Here's how to recycle this item.",
+            recycling_guide=recycling_guide,
+            idempotency_key=key
+        ):
+            raise RuntimeError("Failed to save recycling guide to chat memory")
+
+
 # -------------------- TEXT / CUSTOM TASK HANDLER --------------------
 @router.post("/handle")
-async def orchestrate(request: OrchestratorRequest, user=Depends(verify_clerk_token)):
+async def orchestrate(request: OrchestratorRequest, user=Depends(verify_clerk_token),
+                      idempotency_key: Optional[str] = Header(None)):
     print("📩 Received body:", request)
     # Sanity check: ensure user is valid (helps turn internal KeyError into 401)
     if not isinstance(user, dict) or not user.get("id"):
@@ -49,7 +146,8 @@ async def orchestrate(request: OrchestratorRequest, user=Depends(verify_clerk_to
     Supports classify_text, recycle, awareness, quiz, and custom chains.
     """
     try:
-        result = orchestrator.handle_task(
+        orchestrator = await registry.aget("orchestrator")
+        result = await orchestrator.handle_task_async(
             request.task,
             request.payload or {},
             needs=request.need
@@ -64,7 +162,7 @@ async def orchestrate(request: OrchestratorRequest, user=Depends(verify_clerk_to
                 # ✅ fallback: treat as classification request
                 fallback_payload = request.payload or {}
                 category = fallback_payload.get("item") or fallback_payload.get("text")
-                classification = orchestrator.handle_task(
+                classification = await orchestrator.handle_task_async(
                     "classify_text", {"item": category}, needs=["classify"]
                 )
                 result = {
@@ -74,34 +172,14 @@ async def orchestrate(request: OrchestratorRequest, user=Depends(verify_clerk_to
             else:
                 raise HTTPException(status_code=500, detail=result)
 
-        # ✅ Save recycling guide to chat memory if present in result
-        try:
-            recycling_step = next((step for step in result.get("steps", []) if step.get("agent") == "recycling"), None)
-            classifier_step = next((step for step in result.get("steps", []) if step.get("agent") == "classifier"), None)
-
-            if recycling_step and classifier_step:
-                MemoryManager.save_context(
-                    user_id=user["id"],
-                    user_message=f"Classified waste item: {classifier_step.get('output', 'unknown')}",
-                    assistant_response="Here's how to recycle this item.",
-                    recycling_guide=recycling_step.get("output")
-                )
-                print(f"✅ Saved recycling guide to chat memory for user {user['id']}")
-        except Exception as mem_err:
-            print(f"⚠️ Failed to save to chat memory: {mem_err}")
-
-        # ✅ Save to MongoDB (non-fatal: log DB errors but don't crash endpoint)
-        try:
-            users_collection.update_one(
-                {"clerk_id": user["id"]},
-                {
-                    "$push": {"history": {"type": request.task, "output": result}},
-                    "$inc": {"points": 3}  # base reward for each text task
-                },
-                upsert=True
-            )
-        except Exception as db_err:
-            print(f"⚠️ MongoDB update failed in /handle: {db_err}")
+        # ✅ Memory, activity and points are written in the background
+        task_queue.enqueue(
+            "orchestration",
+            new_idempotency_key(user["id"], "orchestration", idempotency_key),
+            user_id=user["id"],
+            task=request.task,
+            result=result
+        )
 
         return result
 
@@ -114,32 +192,70 @@ async def orchestrate(request: OrchestratorRequest, user=Depends(verify_clerk_to
         raise HTTPException(status_code=500, detail={"error": str(e), "trace": tb[:2000]})
 
 
+# -------------------- STREAMING HANDLER --------------------
+@router.post("/handle/stream")
+async def orchestrate_stream(request: OrchestratorRequest, user=Depends(verify_clerk_token),
+                             idempotency_key: Optional[str] = Header(None)):
+    """
+    Same tasks as /handle, streamed as Server-Sent Events.
+    Emits "step" events as agents finish, "token" events while the recycling
+    guide is generated, then a final "result" (or "error") event.
+    """
+    if not isinstance(user, dict) or not user.get("id"):
+        raise HTTPException(status_code=401, detail="Invalid or missing user authentication")
+
+    def events():
+        try:
+            orchestrator = registry.get("orchestrator")
+            for event, data in orchestrator.stream_task(request.task, request.payload or {}, needs=request.need):
+                if event == "result" and "error_type" in data:
+                    yield sse_event("error", data)
+                    return
+                yield sse_event(event, data)
+                if event == "result":
+                    # Persist only once the client has the complete result; the
+                    # result is the final event, so a failure here is only logged
+                    try:
+                        task_queue.enqueue(
+                            "orchestration",
+                            new_idempotency_key(user["id"], "orchestration", idempotency_key),
+                            user_id=user["id"],
+                            task=request.task,
+                            result=data
+                        )
+                    except Exception as e:
+                        print(f"⚠️ Failed to queue streamed result for user {user['id']}: {e}")
+        except Exception as e:
+            print(f"❌ Exception in /handle/stream: {e}\n{traceback.format_exc()}")
+            yield sse_event("error", {"error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 # -------------------- IMAGE HANDLER --------------------
 @router.post("/handle/image")
 async def orchestrate_image(
     file: UploadFile = File(...),
     location: Optional[str] = Query(None, description="Optional user location"),
     needs: Optional[str] = Query(None, description="Comma-separated list of agents: guide,awareness,quiz"),
-    user=Depends(verify_clerk_token)
+    user=Depends(verify_clerk_token),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Handles image-based classification and optional awareness/recycling/quiz.
     """
-    temp_file_path = None
     # Sanity check: ensure user is valid
     if not isinstance(user, dict) or not user.get("id"):
         print("❌ Invalid user from verify_clerk_token in /handle/image:", user)
         raise HTTPException(status_code=401, detail="Invalid or missing user authentication")
     try:
-        # ensure filename has an extension; fallback to jpg
-        filename = getattr(file, "filename", None) or "upload.jpg"
-        ext = filename.split(".")[-1] if "." in filename else "jpg"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        # Upload bytes go straight to the in-memory decode/downscale/encode path
+        content = await file.read()
+        if not content:
+            raise HTTPException(status_code=400, detail="Empty image upload")
 
-        classification_result = orchestrator.handle_task("classify_image", {"image_path": temp_file_path})
+        orchestrator = await registry.aget("orchestrator")
+        classification_result = await orchestrator.handle_task_async("classify_image", {"image_bytes": content})
         if not classification_result.get("steps"):
             return {"error_type": "ClassificationError", "detail": "Could not classify image"}
 
@@ -148,18 +264,26 @@ async def orchestrate_image(
         needs_list = [n.strip().lower() for n in needs.split(",")] if needs else ["guide", "awareness"]
         steps = [{"agent": "classifier", "output": classification}]
 
+        # Guide, awareness and quiz only depend on the classification, so run them together
+        want_guide = "guide" in needs_list or "recycle" in needs_list
+        guide, tip, quiz = await asyncio.gather(
+            orchestrator.handle_task_async("recycle", {"waste_category": classification, "location": location})
+            if want_guide else _skip(),
+            orchestrator.handle_task_async("awareness", {"context": f"Image classified as {classification}"})
+            if "awareness" in needs_list else _skip(),
+            orchestrator.handle_task_async("quiz", {"topic": classification})
+            if "quiz" in needs_list else _skip(),
+        )
+
         recycling_guide_text = None
-        if "guide" in needs_list or "recycle" in needs_list:
-            guide = orchestrator.handle_task("recycle", {"waste_category": classification, "location": location})
+        if want_guide:
             recycling_guide_text = guide["steps"][0]["output"]
             steps.append({"agent": "recycling", "output": recycling_guide_text})
 
         if "awareness" in needs_list:
-            tip = orchestrator.handle_task("awareness", {"context": f"Image classified as {classification}"})
             steps.append({"agent": "awareness", "output": tip["steps"][0]["output"]})
 
         if "quiz" in needs_list:
-            quiz = orchestrator.handle_task("quiz", {"topic": classification})
             if quiz and isinstance(quiz.get("steps"), list) and len(quiz["steps"]) > 0:
                 steps.append({"agent": "quiz", "output": quiz["steps"][0]["output"]})
             else:
@@ -167,68 +291,80 @@ async def orchestrate_image(
 
         response = {"task": "classify_image", "steps": steps}
 
-        # ✅ Save classification and award points
-        try:
-            users_collection.update_one(
-                {"clerk_id": user["id"]},
-                {
-                    "$push": {
-                        "history": {
-                            "type": "image_classification",
-                            "classification": classification,
-                            "details": response
-                        }
-                    },
-                    "$inc": {"points": 5}
-                },
-                upsert=True
-            )
-        except Exception as e:
-            print("⚠️ MongoDB update failed:", e)
-        # ✅ Save recycling guide to chat memory for Chat Assistant context
-        if recycling_guide_text:
-            try:
-                MemoryManager.save_context(
-                    user_id=user["id"],
-                    user_message=f"Classified waste item: {classification}",
-                    assistant_response=f"Here's how to recycle this item.",
-                    recycling_guide=recycling_guide_text
-                )
-                print(f"✅ Saved recycling guide to chat memory for user {user['id']}")
-            except Exception as mem_err:
-                print(f"⚠️ Failed to save to chat memory: {mem_err}")
-
-        # ✅ Save classification and award points (non-fatal DB ops)
-        try:
-            users_collection.update_one(
-                {"clerk_id": user["id"]},
-                {
-                    "$push": {
-                        "history": {
-                            "type": "image_classification",
-                            "classification": classification,
-                            "details": response
-                        }
-                    },
-                    "$inc": {"points": 5}  # +5 points per image classification
-                },
-                upsert=True
-            )
-        except Exception as db_err:
-            print(f"⚠️ MongoDB update failed in /handle/image: {db_err}")
+        # ✅ Save classification, award points once and keep the guide (in the background)
+        task_queue.enqueue(
+            "image_classification",
+            new_idempotency_key(user["id"], "image_classification", idempotency_key),
+            user_id=user["id"],
+            classification=classification,
+            response=response,
+            recycling_guide=recycling_guide_text
+        )
 
         return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         tb = traceback.format_exc()
         print(f"❌ Exception in /handle/image: {e}\n{tb}")
         raise HTTPException(status_code=500, detail={"error": str(e), "trace": tb[:2000]})
-    finally:
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception:
-                pass
+
+
+# -------------------- BATCH IMAGE HANDLER --------------------
+@router.post("/handle/images")
+async def orchestrate_image_batch(
+    files: List[UploadFile] = File(...),
+    user=Depends(verify_clerk_token)
+):
+    """
+    Classifies a batch of images (e.g. bin-camera snapshots).
+    Images are packed into multi-image Gemini requests; each item gets its own
+    category or error.
+    """
+    if not isinstance(user, dict) or not user.get("id"):
+        raise HTTPException(status_code=401, detail="Invalid or missing user authentication")
+    if len(files) > MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images: {len(files)} (maximum {MAX_BATCH_IMAGES} per batch)"
+        )
+
+    try:
+        results: list = [None] * len(files)
+        images, positions = [], []
+        for index, file in enumerate(files):
+            filename = getattr(file, "filename", None) or f"upload_{index}.jpg"
+            results[index] = {"index": index, "filename": filename}
+            if file.content_type and not file.content_type.startswith("image/"):
+                results[index]["error"] = "File must be an image (JPEG, PNG, etc.)"
+                continue
+            content = await file.read()
+            if not content:
+                results[index]["error"] = "Empty file"
+                continue
+            images.append(content)
+            positions.append(index)
+
+        if images:
+            orchestrator = await registry.aget("orchestrator")
+            classified = await run_blocking(orchestrator.classifier.classify_batch, images)
+            for index, outcome in zip(positions, classified):
+                results[index].update(outcome)
+
+        return {
+            "task": "classify_batch",
+            "count": len(results),
+            "classified": sum(1 for item in results if "category" in item),
+            "results": results
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        tb = traceback.format_exc()
+        print(f"❌ Exception in /handle/images: {e}\n{tb}")
+        raise HTTPException(status_code=500, detail={"error": str(e), "trace": tb[:2000]})
 
 
 # -------------------- QUIZ VALIDATION --------------------
@@ -274,31 +410,25 @@ async def handle_quiz_answer(request: dict, user=Depends(verify_clerk_token)):
         print("──────────────────────────────────────")
 
         # --- Reward points if correct ---
-        from ..db import users_collection
         if is_correct:
             try:
-                users_collection.update_one(
-                    {"clerk_id": user["id"]},
-                    {"$inc": {"points": 10}},
-                    upsert=True
-                )
+                await run_blocking(points_ledger.award, user["id"], 10, "quiz")
             except Exception as db_err:
                 print(f"⚠️ MongoDB update failed in /quiz/answer (points): {db_err}")
 
         # --- Log quiz attempt history ---
-        users_collection.update_one(
-            {"clerk_id": user["id"]},
-            {"$push": {
-                "history": {
-                    "type": "quiz_attempt",
-                    "question": question,
-                    "selected_answer": selected_key,
-                    "correct_answer": correct_key,
-                    "is_correct": is_correct,
-                    "explanation": explanation
-                }
-            }},
-            upsert=True
+        await run_blocking(
+            ActivityLog.log,
+            user["id"],
+            "quiz_attempt",
+            {
+                "question": question,
+                "selected_answer": selected_key,
+                "correct_answer": correct_key,
+                "is_correct": is_correct,
+                "explanation": explanation
+            },
+            summary=f"Quiz answered {'correctly' if is_correct else 'incorrectly'}"
         )
 
         return {
@@ -1,11 +1,15 @@
 # backend/src/api/rewards_router.py
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from bson import ObjectId
 
-from ..db import rewards_collection, redemptions_collection, users_collection, client
+from ..db import rewards_collection, redemptions_collection, users_collection
+from ..utils.rewards_catalog import rewards_catalog
+from ..utils.executor import run_blocking
+from ..utils.redemption import redeem, RedemptionError
 
 
 # Temporary auth function
@@ -45,47 +49,47 @@ class ShippingAddress(BaseModel):
     country: Optional[str] = None
 
 
+# -------------------- CATALOGUE RESPONSES --------------------
+def _catalog_response(content: dict, etag: str, if_none_match: Optional[str]):
+    """JSON response tagged with the catalogue version; 304 if the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+    return JSONResponse(content=content, headers=headers)
+
+
 # -------------------- REWARD MANAGEMENT --------------------
 @router.get("/")
-async def get_available_rewards():
+async def get_available_rewards(if_none_match: Optional[str] = Header(None)):
     """Get all available rewards"""
     try:
-        rewards = list(rewards_collection.find({"active": True}))
-
-        # Convert ObjectId to string for JSON serialization
-        for reward in rewards:
-            reward["_id"] = str(reward["_id"])
-
-        return {"rewards": rewards}
+        catalog = rewards_catalog.snapshot()
+        return _catalog_response({"rewards": catalog.rewards}, catalog.etag, if_none_match)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching rewards: {str(e)}")
 
 
 @router.get("/categories")
-async def get_reward_categories():
+async def get_reward_categories(if_none_match: Optional[str] = Header(None)):
     """Get available reward categories"""
     try:
-        categories = rewards_collection.distinct("category", {"active": True})
-        return {"categories": categories}
+        catalog = rewards_catalog.snapshot()
+        return _catalog_response({"categories": catalog.categories}, catalog.etag, if_none_match)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching categories: {str(e)}")
 
 
 @router.get("/category/{category_name}")
-async def get_rewards_by_category(category_name: str):
+async def get_rewards_by_category(category_name: str, if_none_match: Optional[str] = Header(None)):
     """Get rewards by specific category"""
     try:
-        rewards = list(rewards_collection.find({
-            "category": category_name,
-            "active": True
-        }))
-
-        for reward in rewards:
-            reward["_id"] = str(reward["_id"])
-
-        return {"rewards": rewards}
+        catalog = rewards_catalog.snapshot()
+        rewards = catalog.by_category.get(category_name, [])
+        return _catalog_response({"rewards": rewards}, catalog.etag, if_none_match)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching category rewards: {str(e)}")
@@ -93,98 +97,26 @@ async def get_rewards_by_category(category_name: str):
 
 # -------------------- REWARD REDEMPTION --------------------
 @router.post("/redeem")
-async def redeem_reward(request: RedemptionRequest, user=Depends(verify_clerk_token)):
-    """Redeem a reward using user points"""
+async def redeem_reward(request: RedemptionRequest, user=Depends(verify_clerk_token),
+                        idempotency_key: Optional[str] = Header(None)):
+    """Redeem a reward using user points (a retry with the same Idempotency-Key returns the first result)"""
     try:
-        # Get user data
-        user_data = users_collection.find_one({"clerk_id": user["id"]})
-        if not user_data:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        user_points = user_data.get("points", 0)
-
-        # Get reward data
-        reward = rewards_collection.find_one({"_id": ObjectId(request.reward_id)})
-        if not reward:
-            raise HTTPException(status_code=404, detail="Reward not found")
-
-        if not reward.get("active", False):
-            raise HTTPException(status_code=400, detail="Reward is no longer available")
-
-        points_required = reward.get("points_required", 0)
-        reward_stock = reward.get("stock", 0)
-
-        # Check if user has enough points
-        if user_points < points_required:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient points. You have {user_points}, but need {points_required}"
-            )
-
-        # Check if reward is in stock (if stock is limited)
-        if reward_stock == 0:
-            raise HTTPException(status_code=400, detail="Reward is out of stock")
-
-        # Create redemption record
-        redemption_data = {
-            "user_clerk_id": user["id"],
-            "reward_id": request.reward_id,
-            "reward_name": reward["name"],
-            "points_used": points_required,
-            "shipping_address": request.shipping_address,
-            "status": "pending",  # pending, shipped, delivered
-            "redemption_date": datetime.utcnow(),
-            "tracking_number": None
-        }
-
-        # Start transaction
-        with client.start_session() as session:
-            with session.start_transaction():
-                # Deduct points from user
-                users_collection.update_one(
-                    {"clerk_id": user["id"]},
-                    {"$inc": {"points": -points_required}},
-                    session=session
-                )
-
-                # Decrease reward stock if limited
-                if reward_stock > 0:
-                    rewards_collection.update_one(
-                        {"_id": ObjectId(request.reward_id)},
-                        {"$inc": {"stock": -1}},
-                        session=session
-                    )
-
-                # Create redemption record
-                result = redemptions_collection.insert_one(redemption_data, session=session)
-                redemption_id = str(result.inserted_id)
-
-        # Add to user history
-        users_collection.update_one(
-            {"clerk_id": user["id"]},
-            {"$push": {
-                "history": {
-                    "type": "reward_redemption",
-                    "redemption_id": redemption_id,
-                    "reward_name": reward["name"],
-                    "points_used": points_required,
-                    "date": datetime.utcnow()
-                }
-            }}
-        )
+        # Transaction retries and compensation stay off the event loop
+        result = await run_blocking(redeem, user["id"], request.reward_id, request.shipping_address,
+                                    idempotency_key)
+        reward = result["reward"]
 
         return {
             "success": True,
             "message": f"Successfully redeemed {reward['name']}!",
-            "redemption_id": redemption_id,
-            "points_remaining": user_points - points_required,
-            "reward_details": {
-                "name": reward["name"],
-                "description": reward["description"],
-                "category": reward["category"]
-            }
+            "redemption_id": result["redemption_id"],
+            "points_remaining": result["points_remaining"],
+            "replayed": result["replayed"],
+            "reward_details": reward
         }
 
+    except RedemptionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
     except HTTPException:
         raise
     except Exception as e:
@@ -248,6 +180,7 @@ async def create_reward(request: CreateRewardRequest):
         }
 
         result = rewards_collection.insert_one(reward_data)
+        rewards_catalog.invalidate()
 
         return {
             "success": True,
@@ -273,6 +206,7 @@ async def toggle_reward_status(reward_id: str):
             {"_id": ObjectId(reward_id)},
             {"$set": {"active": new_status}}
         )
+        rewards_catalog.invalidate()
 
         return {
             "success": True,
@@ -298,17 +232,7 @@ async def get_user_points(user=Depends(verify_clerk_token)):
         points = user_data.get("points", 0)
 
         # Get affordable rewards
-        affordable_rewards = list(rewards_collection.find({
-            "points_required": {"$lte": points},
-            "active": True,
-            "$or": [
-                {"stock": {"$gt": 0}},
-                {"stock": -1}
-            ]
-        }))
-
-        for reward in affordable_rewards:
-            reward["_id"] = str(reward["_id"])
+        affordable_rewards = rewards_catalog.snapshot().affordable(points)
 
         return {
             "points": points,
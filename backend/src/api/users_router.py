@@ -1,45 +1,78 @@
 # backend/src/api/users_router.py
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
 from ..db import users_collection
 from ..utils.auth import verify_clerk_token
+from ..utils.leaderboard import leaderboard
+from ..utils.activity import ActivityLog
+from ..utils.points_ledger import points_ledger
 from bson import ObjectId
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+# Largest single award a client may request through /points/add
+MAX_POINTS_PER_ADD = int(os.getenv("MAX_POINTS_PER_ADD", "100"))
+
+# Large embedded fields never returned with the profile (full activity lives in
+# the activity collection, chat turns in chat_history)
+PROFILE_PROJECTION = {"history": 0, "chat_history": 0, "conversation_summary": 0, "latest_recycling_guide": 0,
+                      "applied_keys": 0, "ledger_keys": 0}
+
+
 @router.get("/me")
 async def get_user_profile(user=Depends(verify_clerk_token)):
-    """Get logged-in user's profile"""
-    existing = users_collection.find_one({"clerk_id": user["id"]})
+    """Get logged-in user's profile with a bounded recent-activity summary"""
+    existing = users_collection.find_one({"clerk_id": user["id"]}, PROFILE_PROJECTION)
     if not existing:
         users_collection.insert_one({
             "clerk_id": user["id"],
             "email": user["email"],
             "name": f"{user['first_name']} {user['last_name']}",
             "points": 0,
-            "history": []
+            "recent_activity": []
         })
-        existing = users_collection.find_one({"clerk_id": user["id"]})
+        existing = users_collection.find_one({"clerk_id": user["id"]}, PROFILE_PROJECTION)
+        leaderboard.register_user(user["id"], existing.get("name"), existing.get("avatar"))
     existing["_id"] = str(existing["_id"])
     return existing
 
 
 @router.post("/points/add")
-async def add_points(points: int, user=Depends(verify_clerk_token)):
+async def add_points(points: int = Query(..., ge=1, le=MAX_POINTS_PER_ADD), user=Depends(verify_clerk_token)):
     """Add points to user's account"""
-    result = users_collection.update_one(
-        {"clerk_id": user["id"]},
-        {"$inc": {"points": points}}
-    )
-    if result.modified_count == 0:
+    if not points_ledger.award(user["id"], points, "manual", upsert=False):
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "Points added successfully", "points_added": points}
 
 
+@router.get("/points/daily")
+async def get_daily_points(days: int = Query(30, ge=1, le=365), user=Depends(verify_clerk_token)):
+    """Get the user's points per day, split by source, newest first"""
+    return {"points": points_ledger.balance(user["id"]), "days": points_ledger.daily(user["id"], days)}
+
+
 @router.post("/history")
 async def save_activity(activity: dict, user=Depends(verify_clerk_token)):
     """Save user activity (classification, quiz, etc.)"""
-    users_collection.update_one(
-        {"clerk_id": user["id"]},
-        {"$push": {"history": activity}}
+    activity_id = ActivityLog.log(
+        user["id"],
+        str(activity.get("type", "custom")),
+        activity,
+        summary=activity.get("summary")
     )
-    return {"message": "Activity saved"}
+    return {"message": "Activity saved", "activity_id": activity_id}
+
+
+@router.get("/activity")
+async def get_activity(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = Query(None, description="Cursor from the previous page's next_cursor"),
+    type: Optional[str] = Query(None, description="Only return this activity type"),
+    user=Depends(verify_clerk_token)
+):
+    """Page through the user's activity log, newest first"""
+    try:
+        return ActivityLog.get_page(user["id"], limit=limit, before=before, activity_type=type)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error fetching activity: {str(e)}")
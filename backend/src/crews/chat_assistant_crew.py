@@ -6,9 +6,41 @@ from crewai import Agent, Task, Crew, Process, LLM
 from dotenv import load_dotenv
 from typing import Optional
 import json
+import os
+import threading
+from ..utils.streaming import stream_completion
+from ..utils.token_budget import count_tokens, truncate_to_tokens, allocate_budget
 
 load_dotenv()
 
+# Model for the shared chat LLM client, and whether CrewAI logs every step
+CHAT_MODEL = os.getenv("CHAT_MODEL") or os.getenv("OPENAI_MODEL_NAME") or "gpt-4o-mini"
+CHAT_VERBOSE = os.getenv("CHAT_VERBOSE", "0") == "1"
+
+# Token budget for the per-message parts of the prompt (guide, history, question),
+# split by these shares; a section that needs less leaves the rest to the others
+CHAT_PROMPT_TOKEN_BUDGET = int(os.getenv("CHAT_PROMPT_TOKEN_BUDGET", "1500"))
+CHAT_BUDGET_SHARES = {"user_message": 0.25, "recycling_guide": 0.45, "conversation_history": 0.30}
+
+# Task template; per-message values are filled in by crew.kickoff(inputs=...)
+CHAT_TASK_TEMPLATE = """You are assisting a user with recycling questions.
+
+**Current Recycling Guide:**
+{recycling_guide}
+
+**Waste Item:** {waste_category}
+
+**Previous Conversation:**
+{conversation_history}
+
+**User Question:** {user_message}
+
+Provide a helpful, clear, and accurate response based on the recycling guide and context above.
+If the user is asking about how to recycle, safety concerns, or disposal methods, use the guide information.
+If the question is unclear, ask for clarification politely.
+Keep responses concise (2-4 sentences) unless detailed explanation is needed.
+Always be encouraging and supportive of the user's recycling efforts."""
+
 
 class ChatAssistantCrew:
     """
@@ -17,8 +49,18 @@ class ChatAssistantCrew:
     """
 
     def __init__(self):
-        # Define the Chat Assistant Agent
-        self.chat_agent = Agent(
+        # One LLM client (and its connection pool) shared by every chat crew
+        self.llm = LLM(model=CHAT_MODEL)
+
+        # Agent / task / crew are built once per worker thread and reused
+        self._local = threading.local()
+
+        # Define the Chat Assistant Agent (used from the constructing thread)
+        self.chat_agent = self._build_agent()
+        self._local.crew = self._build_crew(self.chat_agent)
+
+    def _build_agent(self) -> Agent:
+        return Agent(
             role='Recycling Guide Chat Assistant',
             goal='Help users understand recycling guides, answer follow-up questions clearly, and provide actionable recycling advice based on classified waste items.',
             backstory="""You are a friendly and knowledgeable recycling expert assistant. 
@@ -27,9 +69,31 @@ class ChatAssistantCrew:
             You always provide factual, clear, and user-friendly responses based on the 
             recycling guide context provided. You maintain conversation history and can 
             reference previous topics discussed with the user.""",
-            verbose=True
+            llm=self.llm,
+            verbose=CHAT_VERBOSE
+        )
+
+    def _build_crew(self, agent: Agent) -> Crew:
+        chat_task = Task(
+            description=CHAT_TASK_TEMPLATE,
+            agent=agent,
+            expected_output="A clear, helpful response to the user's question about recycling."
+        )
+        return Crew(
+            agents=[agent],
+            tasks=[chat_task],
+            process=Process.sequential,
+            verbose=CHAT_VERBOSE
         )
 
+    def _get_crew(self) -> Crew:
+        """Crew for the calling thread, built on first use (crews are not thread-safe)."""
+        crew = getattr(self._local, "crew", None)
+        if crew is None:
+            crew = self._build_crew(self._build_agent())
+            self._local.crew = crew
+        return crew
+
     def chat(self, user_message: str, recycling_guide: Optional[str] = None,
              conversation_history: Optional[str] = None, waste_category: Optional[str] = None) -> str:
         """
@@ -45,47 +109,11 @@ class ChatAssistantCrew:
             Chat assistant's response as a string
         """
         try:
-            # Build context-aware prompt
-            context_parts = []
-
-            if recycling_guide:
-                context_parts.append(f"**Current Recycling Guide:**\n{recycling_guide}\n")
-
-            if waste_category:
-                context_parts.append(f"**Waste Item:** {waste_category}\n")
-
-            if conversation_history:
-                context_parts.append(f"**Previous Conversation:**\n{conversation_history}\n")
-
-            context_parts.append(f"**User Question:** {user_message}")
-
-            full_context = "\n".join(context_parts)
-
-            # Create the chat task
-            chat_task = Task(
-                description=f"""You are assisting a user with recycling questions. 
-                
-{full_context}
-
-Provide a helpful, clear, and accurate response based on the recycling guide and context above.
-If the user is asking about how to recycle, safety concerns, or disposal methods, use the guide information.
-If the question is unclear, ask for clarification politely.
-Keep responses concise (2-4 sentences) unless detailed explanation is needed.
-Always be encouraging and supportive of the user's recycling efforts.""",
-                agent=self.chat_agent,
-                expected_output="A clear, helpful response to the user's question about recycling."
-            )
-
-            # Create temporary crew for this chat interaction
-            chat_crew = Crew(
-                agents=[self.chat_agent],
-                tasks=[chat_task],
-                process=Process.sequential,
-                verbose=True
-            )
+            # Per-message values fill the reusable task template
+            inputs = self._template_inputs(user_message, recycling_guide, conversation_history, waste_category)
 
             # Execute and get response
-            result = chat_crew.kickoff()
+            result = self._get_crew().kickoff(inputs=inputs)
             response = result.raw if hasattr(result, 'raw') else str(result)
 
             return response.strip()
@@ -94,6 +122,57 @@ Always be encouraging and supportive of the user's recycling efforts.""",
             print(f"❌ Chat Assistant error: {e}")
             return self._get_fallback_response(user_message, waste_category)
 
+    def stream_chat(self, user_message: str, recycling_guide: Optional[str] = None,
+                    conversation_history: Optional[str] = None, waste_category: Optional[str] = None):
+        """
+        Stream the assistant's response as text chunks, using the same prompt as chat().
+
+        Yields:
+            Response text deltas as the LLM produces them
+        """
+        inputs = self._template_inputs(user_message, recycling_guide, conversation_history, waste_category)
+        prompt = CHAT_TASK_TEMPLATE.format(**inputs)
+        system = f"You are a {self.chat_agent.role}. {self.chat_agent.backstory}"
+
+        produced = False
+        try:
+            for text in stream_completion(CHAT_MODEL, prompt, system=system):
+                produced = True
+                yield text
+        except Exception as e:
+            print(f"❌ Chat Assistant streaming error: {e}")
+            if not produced:
+                yield self._get_fallback_response(user_message, waste_category)
+
+    @staticmethod
+    def _template_inputs(user_message: str, recycling_guide: Optional[str] = None,
+                         conversation_history: Optional[str] = None, waste_category: Optional[str] = None) -> dict:
+        """
+        Template values fitted to CHAT_PROMPT_TOKEN_BUDGET.
+        The guide and question keep their beginning; history keeps its newest lines.
+        """
+        sections = {
+            "user_message": user_message or "",
+            "recycling_guide": recycling_guide or "",
+            "conversation_history": conversation_history or ""
+        }
+        limits = allocate_budget(
+            CHAT_PROMPT_TOKEN_BUDGET,
+            {name: count_tokens(text) for name, text in sections.items()},
+            CHAT_BUDGET_SHARES
+        )
+        fitted = {
+            name: truncate_to_tokens(text, limits[name], keep="tail" if name == "conversation_history" else "head")
+            for name, text in sections.items()
+        }
+
+        return {
+            "recycling_guide": fitted["recycling_guide"] or "No recycling guide available.",
+            "waste_category": waste_category or "Not specified",
+            "conversation_history": fitted["conversation_history"] or "No previous conversation.",
+            "user_message": fitted["user_message"]
+        }
+
     def _get_fallback_response(self, user_message: str, waste_category: Optional[str] = None) -> str:
         """
         Provide a fallback response when the AI service fails.
@@ -1,15 +1,48 @@
 # backend/src/crews/classifier_crew.py
 import os
-import requests
+import re
+import json
 import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from PIL import Image
 from dotenv import load_dotenv
 from crewai import Agent, Task, Crew, Process
+from ..utils.cache import TTLCache, CACHE_DB_PATH
+from ..utils.http_client import get_client
+from ..utils.local_classifier import local_classifier
 
 # Load environment variables
 load_dotenv()
 
+# Classification results keyed on normalized text or the exact image bytes
+classification_cache = TTLCache(
+    "classification",
+    maxsize=int(os.getenv("CLASSIFIER_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("CLASSIFIER_CACHE_TTL", str(7 * 24 * 3600))),
+    disk_path=CACHE_DB_PATH
+)
+
+# Also match visually identical images (re-uploads, re-compressions) by perceptual
+# hash. Off by default: similar photos from one camera can share a hash.
+CLASSIFIER_NEAR_DUPLICATE = os.getenv("CLASSIFIER_NEAR_DUPLICATE", "0") == "1"
+
+# Uploads are downscaled so their longest side is at most MAX_IMAGE_DIM pixels;
+# JPEGs already within limits are sent as-is
+MAX_IMAGE_DIM = int(os.getenv("CLASSIFIER_MAX_IMAGE_DIM", "1024"))
+PASSTHROUGH_MAX_BYTES = int(os.getenv("CLASSIFIER_PASSTHROUGH_MAX_BYTES", str(1024 * 1024)))
+JPEG_QUALITY = int(os.getenv("CLASSIFIER_JPEG_QUALITY", "85"))
+
+# Images packed into a single Gemini request by classify_batch
+GEMINI_IMAGES_PER_REQUEST = int(os.getenv("GEMINI_IMAGES_PER_REQUEST", "8"))
+
+# Pool for decoding/encoding batch images and sending batch chunks concurrently
+_batch_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CLASSIFIER_BATCH_WORKERS", "4")),
+    thread_name_prefix="classifier-batch"
+)
+
 
 class ClassifierCrew:
     def __init__(self):
@@ -44,18 +77,93 @@ class ClassifierCrew:
             verbose=True
         )
 
+    # ---------------- Cache Keys ----------------
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace."""
+        return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+    @staticmethod
+    def _image_digest(image) -> str:
+        """SHA-256 of the image bytes (path or raw bytes)."""
+        if not isinstance(image, bytes):
+            with open(image, "rb") as f:
+                image = f.read()
+        return hashlib.sha256(image).hexdigest()
+
+    @staticmethod
+    def _image_hash(image) -> str:
+        """
+        Perceptual difference hash (dHash) of the decoded image (path or raw bytes).
+        Re-uploads and re-compressions of the same photo share a hash, but so
+        can different items photographed against the same background.
+        """
+        source = BytesIO(image) if isinstance(image, bytes) else image
+        with Image.open(source) as img:
+            size = img.size
+            img.draft("L", (64, 64))  # cheap reduced decode for JPEGs
+            small = img.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+            pixels = list(small.getdata())
+
+        bits = 0
+        for row in range(8):
+            for col in range(8):
+                left, right = pixels[row * 9 + col], pixels[row * 9 + col + 1]
+                bits = (bits << 1) | (left > right)
+        return f"{bits:016x}-{size[0]}x{size[1]}"
+
+    def _cache_keys(self, input_data, is_image: bool) -> list:
+        """Exact key first, then (if enabled) the near-duplicate image key."""
+        if not is_image:
+            return [f"text:{self._normalize_text(input_data)}"]
+        keys = [f"image:sha256:{self._image_digest(input_data)}"]
+        if CLASSIFIER_NEAR_DUPLICATE:
+            keys.append(f"image:dhash:{self._image_hash(input_data)}")
+        return keys
+
+    @staticmethod
+    def _cache_lookup(keys: list):
+        for key in keys:
+            cached = classification_cache.get(key)
+            if cached:
+                return cached
+        return None
+
+    @staticmethod
+    def _cache_store(keys: list, category: str):
+        for key in keys:
+            classification_cache.set(key, category)
+
     # ---------------- Gemini API Support ----------------
-    def _encode_image(self, image_path: str) -> str:
-        """Helper: encode image to base64 for Gemini API."""
-        with Image.open(image_path) as img:
-            if img.mode in ('RGBA', 'LA'):
-                img = img.convert('RGB')
+    def _encode_image(self, image) -> str:
+        """
+        Helper: encode image (path or raw bytes) to base64 JPEG for Gemini API.
+        JPEGs already within the size limits pass through untouched; anything else
+        is decoded once in memory, downscaled to MAX_IMAGE_DIM and re-encoded.
+        """
+        if not isinstance(image, bytes):
+            with open(image, "rb") as f:
+                image = f.read()
+
+        with Image.open(BytesIO(image)) as img:
+            if (img.format == "JPEG" and img.mode in ("RGB", "L")
+                    and max(img.size) <= MAX_IMAGE_DIM and len(image) <= PASSTHROUGH_MAX_BYTES):
+                return base64.b64encode(image).decode('utf-8')
+
+            # JPEG draft mode decodes directly at a reduced scale
+            img.draft("RGB", (MAX_IMAGE_DIM, MAX_IMAGE_DIM))
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.thumbnail((MAX_IMAGE_DIM, MAX_IMAGE_DIM))
             buffered = BytesIO()
-            img.save(buffered, format="JPEG")
+            img.save(buffered, format="JPEG", quality=JPEG_QUALITY)
             return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
-    def _call_gemini_api(self, prompt: str, image_data: str = None) -> str:
-        """Call Gemini 2.0 Flash API."""
+    def _call_gemini_api(self, prompt: str, image_data: str = None, parts: list = None) -> str:
+        """
+        Call Gemini 2.0 Flash API.
+        Extra content parts (e.g. labelled images for a batch) are appended after the prompt.
+        """
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not set")
 
@@ -69,8 +177,10 @@ class ClassifierCrew:
             content["contents"][0]["parts"].append({
                 "inline_data": {"mime_type": "image/jpeg", "data": image_data}
             })
+        if parts:
+            content["contents"][0]["parts"].extend(parts)
 
-        response = requests.post(self.api_url, headers=headers, json=content)
+        response = get_client("gemini").post(self.api_url, headers=headers, json=content)
         response.raise_for_status()
         result = response.json()
 
@@ -81,31 +191,33 @@ class ClassifierCrew:
 
     # ---------------- Fallback Classification ----------------
     def _basic_classification(self, text: str) -> str:
-        """Simple keyword fallback classification."""
-        text_lower = text.lower()
-
-        recyclable_keywords = ['plastic', 'glass', 'paper', 'metal', 'can', 'bottle', 'aluminum', 'cardboard', 'tin',
-                               'jar']
-        organic_keywords = ['food', 'fruit', 'vegetable', 'organic', 'compost', 'banana', 'apple', 'peel', 'egg',
-                            'coffee', 'tea']
-        hazardous_keywords = ['battery', 'chemical', 'electronic', 'hazardous', 'toxic', 'medicine', 'paint', 'oil',
-                              'bulb', 'phone']
-
-        if any(word in text_lower for word in recyclable_keywords):
-            return "recyclable"
-        elif any(word in text_lower for word in organic_keywords):
-            return "organic"
-        elif any(word in text_lower for word in hazardous_keywords):
-            return "hazardous"
-        else:
-            return "general"
+        """Best local guess, whatever its confidence (used when the remote tiers fail)."""
+        category, _ = local_classifier.predict(str(text))
+        return category
 
     # ---------------- Public Method ----------------
-    def classify(self, input_data: str, is_image: bool = False) -> str:
+    def classify(self, input_data, is_image: bool = False) -> str:
         """
         Classify waste item using CrewAI + Gemini (with fallback).
+        For images, input_data is the raw upload bytes (or a file path).
         Must return one of: recyclable, organic, hazardous, general
         """
+        cache_keys = []
+        try:
+            cache_keys = self._cache_keys(input_data, is_image)
+            cached = self._cache_lookup(cache_keys)
+            if cached:
+                return cached
+        except Exception as e:
+            print(f"⚠️ Classification cache lookup failed: {e}")
+
+        # Common text items are answered by the local index without a network call
+        if not is_image:
+            local = local_classifier.classify(str(input_data))
+            if local:
+                self._cache_store(cache_keys, local)
+                return local
+
         try:
             # Prefer Gemini API if available
             if self.api_key:
@@ -121,16 +233,111 @@ class ClassifierCrew:
                     response_text = self._call_gemini_api(f"{prompt}\n\nItem: {input_data}")
 
                 classification = response_text.strip().lower().replace('.', '')
-                return classification if classification in self.categories else "general"
+                recognized = classification in self.categories
+                category = classification if recognized else "general"
+            else:
+                # If no Gemini, fall back to CrewAI Agent
+                result = self.crew.kickoff(inputs={"input": input_data})
+                output = result.raw if hasattr(result, 'raw') else str(result)
+                output = output.strip().lower()
+                recognized = output in self.categories
+                category = output if recognized else "general"
 
-            # If no Gemini, fall back to CrewAI Agent
-            result = self.crew.kickoff(inputs={"input": input_data})
-            output = result.raw if hasattr(result, 'raw') else str(result)
-            output = output.strip().lower()
-            return output if output in self.categories else "general"
+            # An unrecognized reply is answered as "general" but not remembered
+            if recognized:
+                self._cache_store(cache_keys, category)
+                if not is_image:
+                    local_classifier.learn(str(input_data), category)
+            return category
 
         except Exception as e:
             print(f"Classification error: {e}")
             if not is_image:
                 return self._basic_classification(input_data)
             return "general"
+
+    # ---------------- Batch Classification ----------------
+    def classify_batch(self, images: list[bytes]) -> list[dict]:
+        """
+        Classify many images, packing up to GEMINI_IMAGES_PER_REQUEST labelled
+        images into each Gemini call. Cached images skip encoding and the API.
+
+        Returns one dict per image, in order: {"category": ...} or {"error": ...}
+        """
+        results: list = [None] * len(images)
+        keys: list = [None] * len(images)
+        pending = []
+
+        for index, image in enumerate(images):
+            try:
+                keys[index] = self._cache_keys(image, is_image=True)
+                cached = self._cache_lookup(keys[index])
+                if cached:
+                    results[index] = {"category": cached, "cached": True}
+                    continue
+            except Exception as e:
+                results[index] = {"error": f"Unreadable image: {e}"}
+                continue
+            pending.append(index)
+
+        if not pending:
+            return results
+        if not self.api_key:
+            for index in pending:
+                results[index] = {"error": "GEMINI_API_KEY not set"}
+            return results
+
+        # Encode all uncached images concurrently
+        encoded = {}
+        for index, future in [(i, _batch_pool.submit(self._encode_image, images[i])) for i in pending]:
+            try:
+                encoded[index] = future.result()
+            except Exception as e:
+                results[index] = {"error": f"Image encoding failed: {e}"}
+
+        indices = [i for i in pending if i in encoded]
+        chunks = [indices[i:i + GEMINI_IMAGES_PER_REQUEST] for i in range(0, len(indices), GEMINI_IMAGES_PER_REQUEST)]
+        futures = [(chunk, _batch_pool.submit(self._classify_chunk, [encoded[i] for i in chunk])) for chunk in chunks]
+
+        for chunk, future in futures:
+            try:
+                categories = future.result()
+            except Exception as e:
+                for index in chunk:
+                    results[index] = {"error": f"Classification failed: {e}"}
+                continue
+
+            for position, index in enumerate(chunk):
+                category = categories.get(str(position + 1))
+                if category in self.categories:
+                    self._cache_store(keys[index], category)
+                    results[index] = {"category": category}
+                else:
+                    results[index] = {"error": "No valid category returned for this image"}
+
+        return results
+
+    def _classify_chunk(self, encoded_images: list[str]) -> dict:
+        """Send one multi-image Gemini request; returns {"1": category, "2": ...}."""
+        prompt = f"""You are a waste classification expert.
+        You will receive {len(encoded_images)} images, each preceded by a label "Image N".
+        Classify every image into exactly one category:
+        recyclable, organic, hazardous, or general.
+        Respond with ONLY a JSON object mapping each image number to its category,
+        for example {{"1": "recyclable", "2": "organic"}}."""
+
+        parts = []
+        for position, data in enumerate(encoded_images, 1):
+            parts.append({"text": f"Image {position}:"})
+            parts.append({"inline_data": {"mime_type": "image/jpeg", "data": data}})
+
+        response_text = self._call_gemini_api(prompt, parts=parts)
+        if '```' in response_text:
+            response_text = response_text.split('```')[1].removeprefix('json').strip()
+
+        parsed = json.loads(response_text)
+        # Accept "1" as well as "Image 1" style labels
+        return {
+            re.sub(r"\D", "", str(label)): str(category).strip().lower().replace('.', '')
+            for label, category in parsed.items()
+        }
@@ -1,7 +1,45 @@
+import os
+import copy
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
 from ..crews.awareness_crew import AwarenessCrew
 from ..crews.classifier_crew import ClassifierCrew
 from ..crews.recycling_crew import RecyclingCrew
 from ..crews.responsibleAICrew import ResponsibleAICrew
+from ..utils.executor import run_blocking
+from ..utils.cache import SingleFlight
+
+# Aliases accepted in the "needs" list of a custom task
+NEED_ALIASES = {
+    "classify": "classifier",
+    "classifier": "classifier",
+    "recycle": "recycling",
+    "recycling": "recycling",
+    "guide": "recycling",
+    "awareness": "awareness",
+    "educate": "awareness",
+    "tip": "awareness",
+    "quiz": "quiz",
+}
+
+# Agents that consume the classifier's category when it is part of the flow
+DEPENDS_ON_CLASSIFIER = {"recycling", "awareness", "quiz"}
+
+# Shared pool for running independent agents of a custom flow concurrently
+_agent_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ORCHESTRATOR_MAX_WORKERS", "8")),
+    thread_name_prefix="orchestrator-agent"
+)
+
+# Identical concurrent tasks share one computation, except flows that include
+# these agents (e.g. quiz questions should differ between users)
+ORCHESTRATOR_SINGLEFLIGHT = os.getenv("ORCHESTRATOR_SINGLEFLIGHT", "1") == "1"
+ORCHESTRATOR_SINGLEFLIGHT_OPTOUT = {
+    agent.strip() for agent in os.getenv("ORCHESTRATOR_SINGLEFLIGHT_OPTOUT", "quiz").split(",") if agent.strip()
+}
+_in_flight = SingleFlight()
 
 
 class OrchestratorCrew:
@@ -20,13 +58,58 @@ class OrchestratorCrew:
         """
         Unified orchestrator for all agent tasks.
         Handles direct and multi-agent "custom" workflows.
+        Concurrent calls with the same (task, payload, needs) share one run;
+        each caller gets its own copy of the result.
         """
+        key = self._flight_key(task, payload, needs)
+        if key is None:
+            return self._handle_task(task, payload, needs)
+        return copy.deepcopy(_in_flight.do(key, self._handle_task, task, dict(payload), needs))
+
+    @staticmethod
+    def _flow_agents(task: str, needs: list[str] = None) -> set:
+        task = task.lower().strip()
+        if task == "custom":
+            return {NEED_ALIASES.get(need.lower().strip(), need) for need in needs or []} | {"responsible_ai"}
+        return {
+            "recycle": {"recycling"},
+            "awareness": {"awareness"},
+            "quiz": {"quiz"},
+        }.get(task, {"classifier"})
+
+    @staticmethod
+    def _flight_key(task: str, payload: dict, needs: list[str] = None):
+        """Canonical key for a task, or None if it must not be shared."""
+        if not ORCHESTRATOR_SINGLEFLIGHT:
+            return None
+        agents = OrchestratorCrew._flow_agents(task, needs)
+        if agents & ORCHESTRATOR_SINGLEFLIGHT_OPTOUT:
+            return None
+
+        def canonical(value):
+            if isinstance(value, (bytes, bytearray)):
+                return "sha256:" + hashlib.sha256(value).hexdigest()
+            if isinstance(value, str):
+                return " ".join(value.lower().split())
+            if isinstance(value, dict):
+                return {str(k): canonical(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [canonical(v) for v in value]
+            return value
+
+        raw = json.dumps(
+            {"task": task.lower().strip(), "agents": sorted(agents), "payload": canonical(payload or {})},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _handle_task(self, task: str, payload: dict, needs: list[str] = None):
         task = task.lower().strip()
 
         # --- Single Agent Handlers ---
         if task in ["classify", "classify_text", "classify_image"]:
-            item = payload.get("item") or payload.get("image_path")
-            category = self.classifier.classify(item, is_image=bool(payload.get("image_path")))
+            image = self._image_input(payload)
+            category = self.classifier.classify(image or payload.get("item"), is_image=bool(image))
             return {"steps": [{"agent": "classifier", "output": category}]}
 
         if task == "recycle":
@@ -48,52 +131,172 @@ class OrchestratorCrew:
         if task == "custom":
             if not needs:
                 return {"error_type": "ValidationError", "detail": "Missing 'needs' list for custom task."}
-
-            results = {"task": "custom", "steps": []}
-            category = None
-            context = payload.get("context")
-
-            for need in needs:
-                need = need.lower().strip()
-
-                # Classification
-                if need in ["classify", "classifier"]:
-                    item = payload.get("item") or payload.get("image_path")
-                    if not item:
-                        return {"error_type": "ValidationError", "detail": "Missing 'item' for classification."}
-                    category = self.classifier.classify(item, is_image=bool(payload.get("image_path")))
-                    results["steps"].append({"agent": "classifier", "output": category})
-                    payload["category"] = category
-
-                #Recycling
-                elif need in ["recycle", "recycling", "guide"]:
-                    category = category or payload.get("category", "general")
-                    guide = self.recycling.get_guide(category, user_location=payload.get("location"))
-                    results["steps"].append({"agent": "recycling", "output": guide})
-                    payload["guide"] = guide
-
-                # quiz
-                elif need in ["awareness", "educate", "tip"]:
-                    context = context or f"Information about {category or 'waste management'}"
-                    tip = self.awareness.get_awareness_tip(context)
-                    results["steps"].append({"agent": "awareness", "output": tip})
-
-                # Quiz
-                elif need in ["quiz"]:
-                    topic = category or payload.get("topic") or "recycling"
-                    quiz = self.awareness.get_quiz_question(topic)
-                    results["steps"].append({"agent": "quiz", "output": quiz})
-
-            #  Responsible AI check always last
-            rai = self.responsible.check(payload, results["steps"])
-            results["steps"].append({"agent": "responsible_ai", "output": rai})
-            return results
+            return self._handle_custom(payload, needs)
 
         # --- Default Fallback ---
         # Any unknown task auto-routes to classifier
-        item = payload.get("item") or payload.get("text") or payload.get("image_path")
+        image = self._image_input(payload)
+        item = image or payload.get("item") or payload.get("text")
         if item:
-            category = self.classifier.classify(item, is_image=bool(payload.get("image_path")))
+            category = self.classifier.classify(item, is_image=bool(image))
             return {"steps": [{"agent": "classifier", "output": category}]}
 
         return {"error_type": "UnknownTask", "detail": f"Unknown task: {task}"}
+
+    def stream_task(self, task: str, payload: dict, needs: list[str] = None):
+        """
+        Streaming variant of handle_task for flows that produce a recycling guide.
+        Yields ("step", step) as each agent finishes, ("token", {...}) for guide text
+        as it is generated, and finally ("result", result) with the same shape
+        handle_task returns. Other tasks are run normally and replayed as steps.
+        """
+        task = task.lower().strip()
+        if task == "recycle":
+            agents = ["recycling"]
+        elif task == "custom" and needs:
+            agents = []
+            for need in needs:
+                agent = NEED_ALIASES.get(need.lower().strip())
+                if agent and agent not in agents:
+                    agents.append(agent)
+        else:
+            agents = []
+
+        if "recycling" not in agents:
+            result = self.handle_task(task, payload, needs)
+            for step in result.get("steps", []):
+                yield "step", step
+            yield "result", result
+            return
+
+        outputs = {}
+        if "classifier" in agents:
+            image = self._image_input(payload)
+            if not (image or payload.get("item")):
+                yield "result", {"error_type": "ValidationError", "detail": "Missing 'item' for classification."}
+                return
+            outputs["classifier"] = self.classifier.classify(image or payload.get("item"), is_image=bool(image))
+            payload["category"] = outputs["classifier"]
+            yield "step", {"agent": "classifier", "output": outputs["classifier"]}
+
+        category = outputs.get("classifier") or payload.get("category") or payload.get("waste_category") or "general"
+
+        # Awareness and quiz run on the agent pool while the guide streams
+        futures = {}
+        if "awareness" in agents:
+            context = payload.get("context") or f"Information about {outputs.get('classifier') or 'waste management'}"
+            futures["awareness"] = _agent_pool.submit(self.awareness.get_awareness_tip, context)
+        if "quiz" in agents:
+            topic = outputs.get("classifier") or payload.get("topic") or "recycling"
+            futures["quiz"] = _agent_pool.submit(self.awareness.get_quiz_question, topic)
+
+        chunks = []
+        for text in self.recycling.stream_guide(category, user_location=payload.get("location")):
+            chunks.append(text)
+            yield "token", {"agent": "recycling", "text": text}
+        outputs["recycling"] = payload["guide"] = "".join(chunks)
+        yield "step", {"agent": "recycling", "output": outputs["recycling"]}
+
+        for agent, future in futures.items():
+            outputs[agent] = future.result()
+            yield "step", {"agent": agent, "output": outputs[agent]}
+
+        steps = [{"agent": agent, "output": outputs[agent]} for agent in agents]
+        if task == "custom":
+            rai = {"agent": "responsible_ai", "output": self.responsible.check(payload, steps)}
+            steps.append(rai)
+            yield "step", rai
+            yield "result", {"task": "custom", "steps": steps}
+        else:
+            yield "result", {"steps": steps}
+
+    @staticmethod
+    def _image_input(payload: dict):
+        """In-memory upload bytes (preferred) or a legacy image file path, if any."""
+        return payload.get("image_bytes") or payload.get("image_path")
+
+    async def handle_task_async(self, task: str, payload: dict, needs: list[str] = None):
+        """
+        Async variant of handle_task for FastAPI endpoints.
+        Agent calls run on the bounded blocking pool so the event loop stays free.
+        """
+        return await run_blocking(self.handle_task, task, payload, needs)
+
+    # ---------------- Custom Flow (dependency graph) ----------------
+    def _handle_custom(self, payload: dict, needs: list[str]):
+        """
+        Run a custom multi-agent flow as a dependency graph.
+        The classifier runs first; recycling, awareness and quiz then fan out
+        concurrently, and the Responsible AI check runs once every step is done.
+        """
+        agents = []
+        for need in needs:
+            agent = NEED_ALIASES.get(need.lower().strip())
+            if agent and agent not in agents:
+                agents.append(agent)
+
+        image = self._image_input(payload)
+        if "classifier" in agents and not (image or payload.get("item")):
+            return {"error_type": "ValidationError", "detail": "Missing 'item' for classification."}
+
+        def classify(results):
+            category = self.classifier.classify(image or payload.get("item"), is_image=bool(image))
+            payload["category"] = category
+            return category
+
+        def recycle(results):
+            category = results.get("classifier") or payload.get("category", "general")
+            guide = self.recycling.get_guide(category, user_location=payload.get("location"))
+            payload["guide"] = guide
+            return guide
+
+        def awareness(results):
+            category = results.get("classifier")
+            context = payload.get("context") or f"Information about {category or 'waste management'}"
+            return self.awareness.get_awareness_tip(context)
+
+        def quiz(results):
+            topic = results.get("classifier") or payload.get("topic") or "recycling"
+            return self.awareness.get_quiz_question(topic)
+
+        handlers = {"classifier": classify, "recycling": recycle, "awareness": awareness, "quiz": quiz}
+        graph = {}
+        for agent in agents:
+            deps = ["classifier"] if agent in DEPENDS_ON_CLASSIFIER and "classifier" in agents else []
+            graph[agent] = (deps, handlers[agent])
+
+        # Responsible AI audits every executed step, so it waits on all of them
+        def responsible_ai(results):
+            steps = [{"agent": agent, "output": results[agent]} for agent in agents]
+            return self.responsible.check(payload, steps)
+
+        graph["responsible_ai"] = (list(agents), responsible_ai)
+
+        outputs = self._run_graph(graph)
+        steps = [{"agent": agent, "output": outputs[agent]} for agent in agents]
+        steps.append({"agent": "responsible_ai", "output": outputs["responsible_ai"]})
+        return {"task": "custom", "steps": steps}
+
+    @staticmethod
+    def _run_graph(graph: dict):
+        """
+        Execute a graph of {name: (dependencies, fn)} on the agent pool.
+        Each node is submitted as soon as all of its dependencies have finished
+        and receives the outputs computed so far.
+        """
+        results, pending, running = {}, dict(graph), {}
+
+        while pending or running:
+            for name, (deps, fn) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    running[_agent_pool.submit(fn, dict(results))] = name
+                    del pending[name]
+
+            if not running:
+                raise ValueError(f"Unresolvable dependencies for: {', '.join(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+        return results
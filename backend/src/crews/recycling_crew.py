@@ -1,11 +1,34 @@
 from crewai import Agent, Task, Crew, Process
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from ..utils.serper_api import search_serper
+from ..utils.cache import TTLCache, CACHE_DB_PATH
+from ..utils.streaming import stream_completion
 
 # Load environment variables
 load_dotenv()
 
+WASTE_CATEGORIES = ["recyclable", "organic", "hazardous", "general"]
+
+# Model used when streaming guides token by token
+GUIDE_MODEL = os.getenv("GUIDE_MODEL") or os.getenv("OPENAI_MODEL_NAME") or "gpt-4o-mini"
+
+# Guides keyed on normalized (category, location); stale entries are served
+# while a background refresh regenerates them
+guide_cache = TTLCache(
+    "recycling_guide",
+    maxsize=int(os.getenv("GUIDE_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("GUIDE_CACHE_TTL", str(24 * 3600))),
+    stale_ttl=float(os.getenv("GUIDE_CACHE_STALE_TTL", str(7 * 24 * 3600))),
+    disk_path=CACHE_DB_PATH
+)
+
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="guide-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
 
 class RecyclingCrew:
     def __init__(self):
@@ -43,12 +66,113 @@ class RecyclingCrew:
             verbose=True
         )
 
+    @staticmethod
+    def _guide_key(waste_category: str, user_location: str = None) -> str:
+        category = " ".join(waste_category.lower().split())
+        location = " ".join(user_location.lower().split()) if user_location else ""
+        return f"{category}|{location}"
+
     def get_guide(self, waste_category: str, user_location: str = None):
+        """
+        Return a recycling guide, served from the guide cache when possible.
+        Stale guides are returned immediately and regenerated in the background.
+        """
+        key = self._guide_key(waste_category, user_location)
+        guide, fresh = guide_cache.get_stale(key)
+        if guide is not None:
+            if not fresh:
+                self._schedule_refresh(key, waste_category, user_location)
+            return guide
+
+        guide = self._generate_guide(waste_category, user_location)
+        guide_cache.set(key, guide)
+        return guide
+
+    def _schedule_refresh(self, key: str, waste_category: str, user_location: str = None):
+        """Regenerate a stale guide once, off the request path."""
+        with _refreshing_lock:
+            if key in _refreshing:
+                return
+            _refreshing.add(key)
+
+        def refresh():
+            try:
+                guide_cache.set(key, self._generate_guide(waste_category, user_location))
+            except Exception as e:
+                print(f"⚠️ Guide refresh failed for {key}: {e}")
+            finally:
+                with _refreshing_lock:
+                    _refreshing.discard(key)
+
+        _refresh_pool.submit(refresh)
+
+    def prewarm(self, locations: list[str] = None):
+        """Generate guides for every category and the given locations unless already fresh."""
+        for location in [None] + list(locations or []):
+            for category in WASTE_CATEGORIES:
+                key = self._guide_key(category, location)
+                if guide_cache.get(key) is not None:
+                    continue
+                try:
+                    guide_cache.set(key, self._generate_guide(category, location))
+                    print(f"✅ Pre-warmed recycling guide: {key}")
+                except Exception as e:
+                    print(f"⚠️ Guide pre-warm failed for {key}: {e}")
+
+    def stream_guide(self, waste_category: str, user_location: str = None):
+        """
+        Yield the recycling guide as text chunks while the LLM generates it.
+        Cached guides are yielded in one piece; new guides are cached once complete.
+        """
+        key = self._guide_key(waste_category, user_location)
+        guide, fresh = guide_cache.get_stale(key)
+        if guide is not None:
+            if not fresh:
+                self._schedule_refresh(key, waste_category, user_location)
+            yield guide
+            return
+
+        snippet = search_serper(self._search_payload(waste_category, user_location)).get("summary", "")
+        prompt = f"""Create a comprehensive recycling guide for {waste_category}.
+        Using this real-world snippet from a recycling source where relevant:
+        ---
+        {snippet}
+        ---
+        Include:
+        1. Preparation steps (cleaning, sorting, etc.)
+        2. Proper disposal methods
+        3. Common mistakes to avoid
+        4. Environmental benefits of proper recycling
+        5. Location-specific considerations ({user_location if user_location else 'if available'})
+        Keep it practical, actionable, and easy to understand."""
+        system = f"You are a {self.guide_agent.role}. {self.guide_agent.backstory}"
+
+        chunks = []
+        try:
+            for text in stream_completion(GUIDE_MODEL, prompt, system=system):
+                chunks.append(text)
+                yield text
+        except Exception as e:
+            if chunks:
+                raise
+            # Streaming unavailable: fall back to the regular CrewAI guide
+            print(f"⚠️ Guide streaming failed, falling back to CrewAI: {e}")
+            chunks = [self._generate_guide(waste_category, user_location)]
+            yield chunks[0]
+
+        guide = "".join(chunks)
+        if guide:
+            guide_cache.set(key, guide)
+
+    @staticmethod
+    def _search_payload(waste_category: str, user_location: str = None) -> dict:
         query = f"How to recycle {waste_category}"
         if user_location:
             query += f" in {user_location}"
+        return {"q": query, "gl": "LK", "hl": "en"}
 
-        payload = {"q": query, "gl": "LK", "hl": "en"}
+    def _generate_guide(self, waste_category: str, user_location: str = None):
+        payload = self._search_payload(waste_category, user_location)
 
         # Call Serper API with proper payload
         snippet  = search_serper(payload)
@@ -1,6 +1,9 @@
 # backend/src/db.py
-from pymongo import MongoClient
+from pymongo import MongoClient, ReadPreference
+from pymongo.monitoring import ConnectionPoolListener
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -8,12 +11,148 @@ load_dotenv()
 
 # Get MongoDB URI (default to localhost)
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "EcoWasteMgmt")
 
-# Connect to MongoDB
-client = MongoClient(MONGO_URI)
+# Connection pool and timeout settings (per worker process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000"))
 
-# Select the database name
-db = client["EcoWasteMgmt"]
+
+class PoolMonitor(ConnectionPoolListener):
+    """Counts open and checked-out connections per server to report pool saturation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = {}
+
+    def _server(self, address):
+        key = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+        return self._servers.setdefault(key, {
+            "open": 0, "checked_out": 0, "waiting": 0, "max_checked_out": 0, "checkout_failures": 0, "cleared": 0
+        })
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            server = self._server(address)
+            for field, delta in deltas.items():
+                server[field] += delta
+            server["max_checked_out"] = max(server["max_checked_out"], server["checked_out"])
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def stats(self, max_pool_size: int) -> dict:
+        with self._lock:
+            return {
+                address: dict(server, saturation=round(server["checked_out"] / max_pool_size, 3))
+                for address, server in self._servers.items()
+            }
+
+
+class MongoConnectionManager:
+    """
+    One MongoClient per worker process, started and stopped by the FastAPI lifespan.
+    The client is created without connecting, so importing this module does no I/O
+    and each uvicorn worker opens its own pool on first use.
+    """
+
+    def __init__(self, uri: str, db_name: str):
+        self.pool_monitor = PoolMonitor()
+        self.client = MongoClient(
+            uri,
+            connect=False,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            retryWrites=True,
+            retryReads=True,
+            appname="eco-ai-waste-manager",
+            event_listeners=[self.pool_monitor]
+        )
+        self.db = self.client[db_name]
+        # Set once indexes are in place; the idempotency guards rely on them
+        self.provisioned = threading.Event()
+
+    def start(self) -> bool:
+        """Verify the deployment is reachable (called at start-up)."""
+        try:
+            latency = self.ping()
+            print(f"✅ MongoDB connected successfully ({latency:.1f}ms ping).")
+            return True
+        except Exception as e:
+            print(f"⚠️ MongoDB not reachable at start-up: {e}")
+            return False
+
+    def ping(self) -> float:
+        """Round-trip a ping command; returns latency in milliseconds."""
+        started = time.perf_counter()
+        self.client.admin.command("ping")
+        return (time.perf_counter() - started) * 1000
+
+    def health(self) -> dict:
+        try:
+            latency = self.ping()
+            status = {"ok": True, "ping_ms": round(latency, 1)}
+        except Exception as e:
+            status = {"ok": False, "error": str(e)}
+        status["provisioned"] = self.provisioned.is_set()
+        status["pool"] = self.pool_monitor.stats(MONGO_MAX_POOL_SIZE)
+        status["max_pool_size"] = MONGO_MAX_POOL_SIZE
+        return status
+
+    def secondary_preferred(self, name: str):
+        """Collection handle whose reads may be served by a secondary (for lag-tolerant reads)."""
+        return self.db.get_collection(name, read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+    def close(self):
+        self.client.close()
+        print("✅ MongoDB connection closed.")
+
+
+mongo = MongoConnectionManager(MONGO_URI, MONGO_DB_NAME)
+
+# Kept for existing imports
+client = mongo.client
+db = mongo.db
 
 # Define your collections
 users_collection = db["users"]
@@ -21,7 +160,9 @@ sessions_collection = db["sessions"]
 rewards_collection = db["rewards"]
 redemptions_collection = db["redemptions"]
 
-print("✅ MongoDB connected successfully.")
+# Lag-tolerant readers: leaderboard snapshots and the rewards catalogue
+users_read_collection = mongo.secondary_preferred("users")
+rewards_read_collection = mongo.secondary_preferred("rewards")
 
 # Initialize sample rewards if collection is empty
 def initialize_sample_rewards():
@@ -76,5 +217,4 @@ def initialize_sample_rewards():
         rewards_collection.insert_many(sample_rewards)
         print("Sample rewards initialized")
 
-# Call this function to initialize rewards
-initialize_sample_rewards()
\ No newline at end of file
+# Called at application start-up (see main.lifespan), not at import time
\ No newline at end of file
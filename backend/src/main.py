@@ -1,10 +1,20 @@
 import os
 import sys
-import litellm
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from .utils.auth import verify_clerk_token
+from .utils.executor import get_executor, shutdown_executor
+from .utils.cache import cache_stats
+from .utils.http_client import http_stats, close_clients
+from .utils.task_queue import task_queue
+from .utils.registry import registry
+from .utils.rewards_catalog import rewards_catalog
+from .schema import ensure_indexes, check_query_plans
+from .db import mongo, initialize_sample_rewards
 
 
 
@@ -19,10 +29,12 @@ from .api.chat_assistant import router as chat_assistant_router
 
 load_dotenv()
 
-# Configure OpenAI / LiteLLM key
+# Longest wait between attempts to provision MongoDB at start-up
+MONGO_PROVISION_MAX_BACKOFF_SECONDS = float(os.getenv("MONGO_PROVISION_MAX_BACKOFF_SECONDS", "60"))
+
+# Configure OpenAI / LiteLLM key (LiteLLM reads it from the environment when first imported)
 openai_key = os.getenv("OPENAI_API_KEY")
 if openai_key:
-    litellm.openai_key = openai_key
     os.environ["OPENAI_API_KEY"] = openai_key
     print("OpenAI API key configured for LiteLLM")
 else:
@@ -35,11 +47,63 @@ for name in ["Mapping", "MutableMapping", "Sequence"]:
     if not hasattr(collections, name):
         setattr(collections, name, getattr(collections.abc, name))
 
+# --- Lifespan: start / stop shared resources ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor = get_executor()
+
+    # Provision MongoDB indexes (idempotent) and seed rewards without delaying startup.
+    # Retried with backoff until the indexes exist: the unique indexes back the
+    # idempotency, redemption and ledger guards. /health reports 503 until then.
+    stop_provisioning = threading.Event()
+
+    def provision_database():
+        delay = 1.0
+        while not stop_provisioning.is_set():
+            if mongo.start() and all(ensure_indexes().values()):
+                break
+            print(f"⚠️ MongoDB provisioning incomplete, retrying in {delay:.0f}s")
+            stop_provisioning.wait(delay)
+            delay = min(delay * 2, MONGO_PROVISION_MAX_BACKOFF_SECONDS)
+        else:
+            return
+
+        mongo.provisioned.set()
+        initialize_sample_rewards()
+        rewards_catalog.invalidate()
+        rewards_catalog.start_watching()
+        if os.getenv("MONGO_CHECK_QUERY_PLANS", "0") == "1":
+            check_query_plans()
+
+    threading.Thread(target=provision_database, name="mongo-provision", daemon=True).start()
+
+    # Build the crews in parallel ahead of traffic (COMPONENT_WARMUP=0 builds on first use)
+    if os.getenv("COMPONENT_WARMUP", "1") == "1":
+        executor.submit(registry.warm_up)
+
+    # Optionally pre-generate recycling guides in the background
+    if os.getenv("GUIDE_PREWARM", "0") == "1":
+        locations = [loc.strip() for loc in os.getenv("GUIDE_PREWARM_LOCATIONS", "").split(",") if loc.strip()]
+        executor.submit(lambda: registry.get("orchestrator").recycling.prewarm(locations))
+
+    # Background worker for request side effects (also retries unfinished jobs)
+    task_queue.start()
+
+    yield
+    stop_provisioning.set()
+    rewards_catalog.stop_watching()
+    task_queue.stop()
+    shutdown_executor()
+    close_clients()
+    mongo.close()
+
+
 # --- FastAPI App ---
 app = FastAPI(
     title="Eco AI Waste Manager API",
     description="API for AI-powered waste classification, recycling, and awareness.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # --- CORS Middleware (React + Clerk) ---
@@ -72,7 +136,16 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "eco-ai-waste-manager"}
+    """Readiness probe: pings MongoDB and reports provisioning and connection pool saturation"""
+    database = mongo.health()
+    if not database["ok"]:
+        status = "unhealthy"
+    elif not database["provisioned"]:
+        status = "degraded"  # reachable, but indexes not created yet
+    else:
+        status = "healthy"
+    body = {"status": status, "service": "eco-ai-waste-manager", "database": database}
+    return body if status == "healthy" else JSONResponse(status_code=503, content=body)
 
 # --- Run locally ---
 # Add to your main.py
@@ -97,6 +170,27 @@ async def debug_rewards():
         reward["_id"] = str(reward["_id"])
     return {"rewards": rewards}
 
+# --- Debug endpoint to inspect cache effectiveness ---
+@app.get("/debug/cache")
+async def debug_cache():
+    """Hit/miss counters for the in-process caches"""
+    return {"caches": cache_stats(), "rewards_catalog": rewards_catalog.stats()}
+
+@app.get("/debug/http")
+async def debug_http():
+    """Request counts, in-flight requests and latency per outbound service"""
+    return {"services": http_stats()}
+
+@app.get("/debug/components")
+async def debug_components():
+    """Which lazily built components exist yet, and how long each took to build"""
+    return registry.stats()
+
+@app.get("/debug/queue")
+async def debug_queue():
+    """Background job counters for this worker"""
+    return task_queue.stats()
+
 # --- Run locally ---
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,150 @@
+# backend/src/schema.py
+"""
+MongoDB schema: required indexes and query-plan checks.
+
+Indexes are created idempotently at startup. The check mode runs explain()
+on every hot query issued by the routers and flags collection scans:
+
+    python -m src.schema            # create indexes
+    python -m src.schema --check    # create indexes, then explain hot queries
+"""
+import sys
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from .db import db
+
+# Indexes required by the routers, per collection
+INDEXES = {
+    "users": [
+        IndexModel([("clerk_id", ASCENDING)], name="clerk_id_unique", unique=True),
+        IndexModel([("points", DESCENDING)], name="points_desc"),
+    ],
+    "chat_history": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_timestamp"),
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True,
+                   partialFilterExpression={"idempotency_key": {"$exists": True}}),
+    ],
+    "redemptions": [
+        IndexModel([("user_clerk_id", ASCENDING), ("redemption_date", DESCENDING)], name="user_redemption_date"),
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True,
+                   partialFilterExpression={"idempotency_key": {"$exists": True}}),
+    ],
+    "rewards": [
+        IndexModel([("active", ASCENDING), ("category", ASCENDING), ("points_required", ASCENDING)],
+                   name="active_category_points"),
+        IndexModel([("active", ASCENDING), ("points_required", ASCENDING)], name="active_points"),
+    ],
+    "activity": [
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)], name="user_newest"),
+        IndexModel([("user_id", ASCENDING), ("type", ASCENDING), ("_id", DESCENDING)], name="user_type_newest"),
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True,
+                   partialFilterExpression={"idempotency_key": {"$exists": True}}),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "points_ledger": [
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)], name="user_newest"),
+        IndexModel([("day", ASCENDING), ("source", ASCENDING)], name="day_source"),
+    ],
+    "points_daily": [
+        IndexModel([("user_id", ASCENDING), ("day", DESCENDING)], name="user_day", unique=True),
+        IndexModel([("day", ASCENDING), ("total", DESCENDING)], name="day_total"),
+    ],
+    "leaderboard_windows": [
+        IndexModel([("window", ASCENDING), ("clerk_id", ASCENDING)], name="window_user", unique=True),
+        IndexModel([("window", ASCENDING), ("points", DESCENDING)], name="window_points"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Hot queries issued by the routers: (description, collection, filter, sort)
+HOT_QUERIES = [
+    ("user by clerk_id", "users", {"clerk_id": "__probe__"}, None),
+    ("top users by points", "users", {}, [("points", DESCENDING)]),
+    ("users above a score", "users", {"points": {"$gt": 0}}, None),
+    ("recent chat history", "chat_history", {"user_id": "__probe__"}, [("timestamp", DESCENDING)]),
+    ("latest recycling guide", "chat_history",
+     {"user_id": "__probe__", "recycling_guide": {"$exists": True, "$ne": None}}, [("timestamp", DESCENDING)]),
+    ("user redemptions", "redemptions", {"user_clerk_id": "__probe__"}, [("redemption_date", DESCENDING)]),
+    ("active rewards", "rewards", {"active": True}, None),
+    ("rewards by category", "rewards", {"category": "__probe__", "active": True}, None),
+    ("affordable rewards", "rewards",
+     {"points_required": {"$lte": 100}, "active": True, "$or": [{"stock": {"$gt": 0}}, {"stock": -1}]}, None),
+    ("user activity page", "activity", {"user_id": "__probe__"}, [("_id", DESCENDING)]),
+    ("leaderboard window", "leaderboard_windows", {"window": "__probe__"}, None),
+    ("user ledger entries", "points_ledger", {"user_id": "__probe__"}, [("timestamp", DESCENDING)]),
+    ("user daily points", "points_daily", {"user_id": "__probe__"}, [("day", DESCENDING)]),
+    ("expired job leases", "jobs", {"status": "pending", "lease_until": {"$lt": datetime(2000, 1, 1)}}, None),
+]
+
+
+def ensure_indexes() -> dict:
+    """
+    Create all declared indexes; existing ones are left untouched.
+    Returns the index names per collection (an empty list where creation failed).
+    """
+    created = {}
+    for collection_name, models in INDEXES.items():
+        try:
+            created[collection_name] = db[collection_name].create_indexes(models)
+        except Exception as e:
+            print(f"⚠️ Index creation failed on '{collection_name}': {e}")
+            created[collection_name] = []
+    if all(created.values()):
+        print("✅ MongoDB indexes ensured")
+    return created
+
+
+def _plan_stages(plan: dict) -> list:
+    """Flatten the stage names of a winning plan tree."""
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(child_key), dict):
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return [stage for stage in stages if stage]
+
+
+def check_query_plans() -> list:
+    """
+    Explain every hot query and flag those whose winning plan is a COLLSCAN.
+    Returns one report per query.
+    """
+    reports = []
+    for description, collection_name, query, sort in HOT_QUERIES:
+        try:
+            cursor = db[collection_name].find(query).limit(10)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+            stages = _plan_stages(plan)
+            report = {
+                "query": description,
+                "collection": collection_name,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages
+            }
+        except Exception as e:
+            report = {"query": description, "collection": collection_name, "error": str(e)}
+
+        if report.get("collscan"):
+            print(f"⚠️ COLLSCAN: {description} on '{collection_name}' ({' <- '.join(report['stages'])})")
+        elif "error" in report:
+            print(f"⚠️ Could not explain {description} on '{collection_name}': {report['error']}")
+        else:
+            print(f"✅ {description}: {' <- '.join(report['stages'])}")
+        reports.append(report)
+
+    return reports
+
+
+if __name__ == "__main__":
+    ensure_indexes()
+    if "--check" in sys.argv:
+        reports = check_query_plans()
+        sys.exit(1 if any(r.get("collscan") for r in reports) else 0)
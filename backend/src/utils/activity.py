@@ -0,0 +1,195 @@
+"""
+Activity Log
+Append-only user activity (classifications, quiz attempts, redemptions, ...)
+stored in its own collection, with a small bounded summary on the user document.
+
+Existing embedded users.history arrays can be moved over with:
+
+    python -m src.utils.activity --migrate
+"""
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Optional, Dict
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from ..db import db, users_collection
+from .points_ledger import points_ledger
+
+# Full activity entries, one document per event
+activity_collection = db["activity"]
+
+# Number of compact entries kept in users.recent_activity
+RECENT_ACTIVITY_LIMIT = int(os.getenv("RECENT_ACTIVITY_LIMIT", "20"))
+
+# Idempotency keys remembered per user to reject replayed point awards
+APPLIED_KEYS_LIMIT = int(os.getenv("APPLIED_KEYS_LIMIT", "200"))
+
+
+class ActivityLog:
+    """
+    Records user activity outside the user document so it stays small.
+    """
+
+    @staticmethod
+    def log(user_id: str, activity_type: str, details: Optional[Dict] = None,
+            summary: Optional[str] = None, points: int = 0,
+            idempotency_key: Optional[str] = None, session=None) -> Optional[str]:
+        """
+        Append an activity entry and update the user's recent-activity summary.
+
+        Args:
+            user_id: Clerk user ID
+            activity_type: Kind of activity (e.g. "image_classification")
+            details: Full activity payload, stored only in the activity collection
+            summary: Short human-readable description kept on the user document
+            points: Points to award through the points ledger (0 for none)
+            idempotency_key: Optional key; logging again with the same key is a no-op
+            session: Optional client session, to log inside the caller's transaction
+
+        Returns:
+            The activity ID, or None if this key was already applied
+        """
+        timestamp = datetime.utcnow()
+        summary = summary or activity_type.replace("_", " ")
+
+        entry = {
+            "user_id": user_id,
+            "type": activity_type,
+            "summary": summary,
+            "details": details or {},
+            "points": points,
+            "timestamp": timestamp
+        }
+        if idempotency_key:
+            entry["idempotency_key"] = idempotency_key
+
+        try:
+            activity_id = str(activity_collection.insert_one(entry, session=session).inserted_id)
+        except DuplicateKeyError:
+            # Entry recorded by an earlier attempt; the user update below may still be missing
+            existing = activity_collection.find_one({"idempotency_key": idempotency_key}, {"_id": 1},
+                                                    session=session)
+            activity_id = str(existing["_id"]) if existing else None
+
+        update = {
+            "$push": {
+                "recent_activity": {
+                    "$each": [{
+                        "activity_id": activity_id,
+                        "type": activity_type,
+                        "summary": summary,
+                        "points": points,
+                        "timestamp": timestamp
+                    }],
+                    "$slice": -RECENT_ACTIVITY_LIMIT
+                }
+            }
+        }
+        if points:
+            # The ledger applies the award once per key, even if this entry was already logged
+            points_ledger.award(user_id, points, activity_type, idempotency_key, reference=activity_id)
+
+        if not idempotency_key:
+            users_collection.update_one({"clerk_id": user_id}, update, upsert=True, session=session)
+            return activity_id
+
+        # Apply the user update only if this key has not been applied yet
+        update["$push"]["applied_keys"] = {"$each": [idempotency_key], "$slice": -APPLIED_KEYS_LIMIT}
+        result = users_collection.update_one({"clerk_id": user_id, "applied_keys": {"$ne": idempotency_key}}, update,
+                                             session=session)
+        if result.matched_count:
+            return activity_id
+        if users_collection.count_documents({"clerk_id": user_id}, limit=1, session=session):
+            return None  # already applied
+
+        users_collection.update_one({"clerk_id": user_id}, update, upsert=True, session=session)
+        return activity_id
+
+    @staticmethod
+    def get_page(user_id: str, limit: int = 20, before: Optional[str] = None,
+                 activity_type: Optional[str] = None) -> Dict:
+        """
+        Page through a user's activity, newest first.
+
+        Args:
+            user_id: Clerk user ID
+            limit: Page size
+            before: Cursor (activity ID) returned by the previous page
+            activity_type: Optional filter on the activity type
+
+        Returns:
+            {"items": [...], "next_cursor": str | None}
+        """
+        query = {"user_id": user_id}
+        if activity_type:
+            query["type"] = activity_type
+        if before:
+            query["_id"] = {"$lt": ObjectId(before)}
+
+        items = list(activity_collection.find(query).sort("_id", -1).limit(limit))
+        for item in items:
+            item["_id"] = str(item["_id"])
+            item["timestamp"] = item["timestamp"].isoformat()
+
+        next_cursor = items[-1]["_id"] if len(items) == limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    @staticmethod
+    def _legacy_timestamp(entry: Any, fallback: datetime) -> datetime:
+        """When a legacy history entry happened: its own timestamp/date field if it has one."""
+        for field in ("timestamp", "date", "created_at"):
+            value = entry.get(field) if isinstance(entry, dict) else None
+            if isinstance(value, str):
+                try:
+                    value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+                except ValueError:
+                    continue
+            if isinstance(value, datetime):
+                if value.tzinfo:
+                    value = value.astimezone(timezone.utc).replace(tzinfo=None)
+                return value
+        return fallback
+
+    @staticmethod
+    def migrate_embedded_history() -> int:
+        """
+        Move legacy users.history arrays into the activity collection and drop them
+        from the user documents. Returns the number of entries moved.
+
+        Each entry gets the key migrated:<user _id>:<index>, so rerunning after
+        an interruption (entries inserted, history not yet dropped) skips the
+        entries already moved.
+        """
+        moved = 0
+        for user in users_collection.find({"history": {"$exists": True}}, {"clerk_id": 1, "history": 1}):
+            # Entries without a time of their own fall back to the user's creation
+            created = user["_id"].generation_time.replace(tzinfo=None)
+            entries = [
+                {
+                    "user_id": user.get("clerk_id"),
+                    "type": str(entry.get("type", "custom")) if isinstance(entry, dict) else "custom",
+                    "summary": "migrated history entry",
+                    "details": entry if isinstance(entry, dict) else {"value": entry},
+                    "points": 0,
+                    "idempotency_key": f"migrated:{user['_id']}:{index}",
+                    "timestamp": ActivityLog._legacy_timestamp(entry, created)
+                }
+                for index, entry in enumerate(user.get("history") or [])
+            ]
+            if entries:
+                try:
+                    moved += len(activity_collection.insert_many(entries, ordered=False).inserted_ids)
+                except BulkWriteError as e:
+                    if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                        raise
+                    moved += e.details.get("nInserted", 0)
+            users_collection.update_one({"_id": user["_id"]}, {"$unset": {"history": ""}})
+
+        print(f"✅ Migrated {moved} history entries to the activity collection")
+        return moved
+
+if __name__ == "__main__" and "--migrate" in sys.argv:
+    ActivityLog.migrate_embedded_history()
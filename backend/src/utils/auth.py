@@ -1,19 +1,194 @@
 import os
+import re
 import jwt
+import time
+import hashlib
 import requests
 import json
+import threading
 from fastapi import HTTPException, Header
 from dotenv import load_dotenv
 from jwt.algorithms import RSAAlgorithm
+from .cache import TTLCache
+from .executor import run_blocking
+from .http_client import get_client
 
 load_dotenv()
 
-# Read CLERK_ISSUER from environment if set; otherwise we'll derive issuer from the token at runtime.
+# Read CLERK_ISSUER from environment if set; otherwise the token's issuer is used,
+# but only if it is a Clerk development instance or listed in CLERK_ALLOWED_ISSUERS.
 CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
 CLERK_ISSUER = os.getenv("CLERK_ISSUER") or os.getenv("CLERK_ISSUER_URL")  # try both variable names
+CLERK_ALLOWED_ISSUERS = {
+    issuer.strip().rstrip("/") for issuer in os.getenv("CLERK_ALLOWED_ISSUERS", "").split(",") if issuer.strip()
+}
+CLERK_DEV_ISSUER = re.compile(r"^https://[a-z0-9-]+\.clerk\.accounts\.dev$")
 # If true (1), allow skipping full verification in local dev by decoding token without signature check.
 SKIP_CLERK_VERIFY = os.getenv("SKIP_CLERK_VERIFY", "0") == "1"
 
+# JWKS caching: default lifetime when the response has no Cache-Control max-age,
+# how early to refresh in the background (at most half the entry's lifetime),
+# and the minimum gap between refetches
+JWKS_CACHE_TTL = int(os.getenv("JWKS_CACHE_TTL", "3600"))
+JWKS_REFRESH_AHEAD = int(os.getenv("JWKS_REFRESH_AHEAD", "300"))
+JWKS_MIN_REFETCH_INTERVAL = int(os.getenv("JWKS_MIN_REFETCH_INTERVAL", "30"))
+# Issuers whose keys are kept (a safety net; only trusted issuers are fetched)
+JWKS_MAX_ISSUERS = int(os.getenv("JWKS_MAX_ISSUERS", "8"))
+# Upper bound on how long a verified token result is reused
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "60"))
+
+
+class JWKSCache:
+    """
+    Parsed signing keys per issuer and kid.
+    Honours Cache-Control max-age, refreshes ahead of expiry in the background
+    and refetches on an unknown kid (key rotation); either way an issuer is
+    fetched at most once per JWKS_MIN_REFETCH_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._issuers = {}  # issuer -> {"keys": {kid: key}, "expires_at": float, "ttl": int}
+        self._last_attempt = {}  # issuer -> time of last fetch attempt
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    @staticmethod
+    def _ttl_from_headers(headers) -> int:
+        cache_control = (headers.get("Cache-Control") or "").lower()
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return JWKS_MIN_REFETCH_INTERVAL
+        match = re.search(r"max-age=(\d+)", cache_control)
+        return int(match.group(1)) if match else JWKS_CACHE_TTL
+
+    def _may_fetch(self, issuer: str) -> bool:
+        """Whether JWKS_MIN_REFETCH_INTERVAL has passed since the issuer's last fetch attempt."""
+        with self._lock:
+            return time.time() - self._last_attempt.get(issuer, 0) >= JWKS_MIN_REFETCH_INTERVAL
+
+    def _fetch(self, issuer: str) -> dict:
+        with self._lock:
+            self._last_attempt[issuer] = time.time()
+        response = get_client("jwks").get(f"{issuer}/.well-known/jwks.json")
+        response.raise_for_status()
+
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            if not jwk.get("kid"):
+                continue
+            try:
+                keys[jwk["kid"]] = RSAAlgorithm.from_jwk(json.dumps(jwk))
+            except Exception as e:
+                print(f"⚠️ Skipping unparsable JWK kid={jwk.get('kid')}: {e}")
+
+        ttl = self._ttl_from_headers(response.headers)
+        entry = {"keys": keys, "expires_at": time.time() + ttl, "ttl": ttl}
+        with self._lock:
+            self._issuers[issuer] = entry
+            while len(self._issuers) > JWKS_MAX_ISSUERS:
+                oldest = min(self._issuers, key=lambda name: self._issuers[name]["expires_at"])
+                del self._issuers[oldest]
+                self._last_attempt.pop(oldest, None)
+        return entry
+
+    def _refresh_in_background(self, issuer: str):
+        if not self._may_fetch(issuer):
+            return
+        with self._lock:
+            if issuer in self._refreshing:
+                return
+            self._refreshing.add(issuer)
+
+        def refresh():
+            try:
+                self._fetch(issuer)
+            except Exception as e:
+                print(f"⚠️ Background JWKS refresh failed for {issuer}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(issuer)
+
+        threading.Thread(target=refresh, name="jwks-refresh", daemon=True).start()
+
+    def cached_key(self, issuer: str, kid: str):
+        """Non-blocking lookup; returns a key only if it is cached and unexpired."""
+        entry = self._issuers.get(issuer)
+        if not entry:
+            return None
+        key = entry["keys"].get(kid)
+        remaining = entry["expires_at"] - time.time()
+        if key is None or remaining <= 0:
+            return None
+        # Short-lived entries (no-cache, small max-age) would otherwise be
+        # inside the refresh window as soon as they are fetched
+        if remaining < min(JWKS_REFRESH_AHEAD, entry["ttl"] / 2):
+            self._refresh_in_background(issuer)
+        return key
+
+    def get_key(self, issuer: str, kid: str):
+        """Blocking lookup that fetches the JWKS when needed (rate limited)."""
+        key = self.cached_key(issuer, kid)
+        if key:
+            return key
+
+        with self._fetch_lock:
+            # Another request may have fetched while we waited
+            key = self.cached_key(issuer, kid)
+            if key:
+                return key
+
+            entry = self._issuers.get(issuer)
+            stale_key = entry["keys"].get(kid) if entry else None
+            if not self._may_fetch(issuer):
+                return stale_key
+
+            try:
+                return self._fetch(issuer)["keys"].get(kid)
+            except Exception as e:
+                print(f"⚠️ Could not fetch JWKS for {issuer}: {e}")
+                return stale_key
+
+    def known_kids(self, issuer: str) -> list:
+        entry = self._issuers.get(issuer)
+        return list(entry["keys"]) if entry else []
+
+
+jwks_cache = JWKSCache()
+
+# Short-lived cache of verified tokens: sha256(token) -> user dict
+verified_tokens = TTLCache("verified_tokens", maxsize=10000, ttl=TOKEN_CACHE_TTL)
+
+
+def trusted_issuer(token_issuer: str = None):
+    """
+    Issuer whose JWKS may be fetched for a token, or None. The token's own
+    (unverified) iss claim is only trusted when CLERK_ISSUER is not configured,
+    and then only for Clerk development instances or CLERK_ALLOWED_ISSUERS.
+    """
+    if CLERK_ISSUER:
+        return CLERK_ISSUER.rstrip("/")
+    issuer = (token_issuer or "").rstrip("/")
+    if issuer and (issuer in CLERK_ALLOWED_ISSUERS or CLERK_DEV_ISSUER.match(issuer)):
+        return issuer
+    return None
+
+
+async def _get_signing_key(issuer: str, kid: str):
+    """Cached key lookup; only leaves the event loop when a JWKS fetch is needed."""
+    key = jwks_cache.cached_key(issuer, kid)
+    if key:
+        return key
+    return await run_blocking(jwks_cache.get_key, issuer, kid)
+
+
+def _remember_token(token_hash: str, payload: dict, user: dict):
+    """Cache a verified result until TOKEN_CACHE_TTL or the token's expiry, whichever is sooner."""
+    ttl = TOKEN_CACHE_TTL
+    if payload.get("exp"):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        verified_tokens.set(token_hash, user, ttl=ttl)
+
 
 async def verify_clerk_token(authorization: str = Header(None)):
     if not authorization or not authorization.startswith("Bearer "):
@@ -21,6 +196,11 @@ async def verify_clerk_token(authorization: str = Header(None)):
 
     token = authorization.split("Bearer ")[-1].strip()
 
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    cached_user = verified_tokens.get(token_hash)
+    if cached_user:
+        return dict(cached_user)
+
     try:
         # Extract unverified pieces first so we can locate the correct JWKS endpoint.
         try:
@@ -38,32 +218,20 @@ async def verify_clerk_token(authorization: str = Header(None)):
             print(f"❌ Failed to parse token claims: {e}")
             raise HTTPException(status_code=401, detail="Invalid token format")
 
-        # Decide which issuer to use for JWKS. Prefer configured CLERK_ISSUER; if not set, use token's issuer.
-        issuer_to_use = CLERK_ISSUER if CLERK_ISSUER else token_issuer
+        # Decide which issuer to use for JWKS. The unverified iss claim never selects an arbitrary host.
+        issuer_to_use = trusted_issuer(token_issuer)
         if not issuer_to_use and not CLERK_SECRET_KEY and not SKIP_CLERK_VERIFY:
-            raise HTTPException(status_code=401, detail="Unable to determine token issuer for JWKS lookup")
+            raise HTTPException(status_code=401, detail="Untrusted token issuer")
 
         key = None
-        jwks = {"keys": []}
         jwks_url = None
 
-        # Try JWKS verification if we have an issuer
+        # Try JWKS verification if we have an issuer (keys come from the JWKS cache)
         if issuer_to_use:
             # Normalize issuer to avoid double slashes when building JWKS URL
             issuer_to_use = issuer_to_use.rstrip('/')
             jwks_url = f"{issuer_to_use}/.well-known/jwks.json"
-            try:
-                jwks_response = requests.get(jwks_url, timeout=5)
-                jwks_response.raise_for_status()
-                jwks = jwks_response.json()
-
-                # Find the correct key from JWKS
-                for jwk in jwks.get('keys', []):
-                    if jwk.get('kid') == kid:
-                        key = RSAAlgorithm.from_jwk(json.dumps(jwk))
-                        break
-            except Exception as e:
-                print(f"⚠️ Could not fetch JWKS from {jwks_url}: {e}")
+            key = await _get_signing_key(issuer_to_use, kid)
 
         # If no key and a CLERK_SECRET_KEY is provided (development), try HS256 decode with that secret
         if not key and CLERK_SECRET_KEY:
@@ -71,37 +239,16 @@ async def verify_clerk_token(authorization: str = Header(None)):
                 payload = jwt.decode(token, CLERK_SECRET_KEY, algorithms=["HS256"], options={"verify_aud": False})
                 user_id = payload.get("sub")
                 print(f"✅ Clerk user verified via CLERK_SECRET_KEY: {user_id}")
-                return {"id": user_id, "email": payload.get("email")}
+                user = {"id": user_id, "email": payload.get("email")}
+                _remember_token(token_hash, payload, user)
+                return user
             except Exception as e:
                 print(f"⚠️ HS256 decode with CLERK_SECRET_KEY failed: {e}")
 
-        # If still no key and token issuer differs from configured issuer, attempt fallback to token's issuer JWKS
-        if not key and token_issuer and issuer_to_use and token_issuer.rstrip('/') != issuer_to_use:
-            try:
-                fallback_jwks_url = f"{token_issuer.rstrip('/')}/.well-known/jwks.json"
-                print(f"ℹ️ Trying fallback JWKS from token issuer: {fallback_jwks_url}")
-                fallback_resp = requests.get(fallback_jwks_url, timeout=5)
-                fallback_resp.raise_for_status()
-                fallback_jwks = fallback_resp.json()
-                for jwk in fallback_jwks.get('keys', []):
-                    if jwk.get('kid') == kid:
-                        key = RSAAlgorithm.from_jwk(json.dumps(jwk))
-                        jwks = fallback_jwks
-                        jwks_url = fallback_jwks_url
-                        issuer_to_use = token_issuer.rstrip('/')
-                        print(f"✅ Found matching JWK in fallback JWKS for kid={kid}")
-                        break
-            except Exception as e:
-                print(f"❌ Fallback JWKS fetch failed: {e}")
-
         if not key and not CLERK_SECRET_KEY and not SKIP_CLERK_VERIFY:
             # No matching key found — likely using the wrong issuer/JWKS endpoint
             print(f"❌ No matching JWK found for kid={kid} at {jwks_url}")
-            try:
-                available_kids = [k.get('kid') for k in jwks.get('keys', [])]
-                print(f"Available JWKS kids at {jwks_url}: {available_kids}")
-            except Exception:
-                pass
+            print(f"Available JWKS kids at {jwks_url}: {jwks_cache.known_kids(issuer_to_use or '')}")
             raise HTTPException(status_code=401, detail="Invalid token key")
 
         # If we have a key, verify the token properly
@@ -130,7 +277,9 @@ async def verify_clerk_token(authorization: str = Header(None)):
 
             user_id = payload.get("sub")
             print(f"✅ Clerk user verified: {user_id}")
-            return {"id": user_id, "email": payload.get("email")}
+            user = {"id": user_id, "email": payload.get("email")}
+            _remember_token(token_hash, payload, user)
+            return user
 
         # As a last resort for local development, optionally skip verification and decode without signature
         if SKIP_CLERK_VERIFY:
@@ -146,6 +295,8 @@ async def verify_clerk_token(authorization: str = Header(None)):
         # Shouldn't reach here; defensive
         raise HTTPException(status_code=401, detail="Token verification failed")
 
+    except HTTPException:
+        raise
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError as e:
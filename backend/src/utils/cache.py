@@ -0,0 +1,262 @@
+"""
+In-process caches for expensive agent and API results.
+TTLCache is a thread-safe LRU with per-entry expiry and hit/miss counters,
+optionally backed by a shared SQLite tier that survives restarts and can be
+read by every worker on the host. SingleFlight coalesces concurrent misses
+for the same key into one call.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Default location of the shared on-disk tier (unset = memory only)
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH")
+
+# All caches created in this process, for stats reporting
+_registry: Dict[str, "TTLCache"] = {}
+
+
+class SQLiteTier:
+    """
+    Shared on-disk cache tier.
+    Values are stored as JSON, namespaced per cache.
+    """
+
+    def __init__(self, path: str, namespace: str):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Return (value, stored_at, expires_at) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at, expires_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key: str, value: Any, stored_at: float, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), stored_at, expires_at)
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+            self._conn.commit()
+
+    def purge_expired(self, now: float):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND expires_at <= ?", (self.namespace, now))
+            self._conn.commit()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a time-to-live per entry.
+
+    Args:
+        name: Cache name, used for stats and as the on-disk namespace
+        maxsize: Maximum number of entries kept in memory
+        ttl: Seconds an entry stays valid
+        disk_path: Optional SQLite file for the shared tier
+        stale_ttl: Extra seconds an expired entry may still be served by get_stale
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600, disk_path: Optional[str] = None,
+                 stale_ttl: float = 0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, stored_at, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+
+        self._disk = None
+        if disk_path:
+            try:
+                self._disk = SQLiteTier(disk_path, name)
+                self._disk.purge_expired(time.time() - stale_ttl)
+            except Exception as e:
+                print(f"⚠️ Cache '{name}' disk tier unavailable ({disk_path}): {e}")
+
+        _registry[name] = self
+
+    def _store(self, key: str, value: Any, stored_at: float, expires_at: float):
+        self._data[key] = (value, stored_at, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _lookup(self, key: str):
+        """Return the (value, stored_at, expires_at) entry from memory or disk, or None."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                return entry
+
+        if self._disk:
+            try:
+                entry = self._disk.get(key)
+            except Exception as e:
+                print(f"⚠️ Cache '{self.name}' disk read failed: {e}")
+                entry = None
+            if entry is not None:
+                with self._lock:
+                    self._store(key, *entry)
+                    self.disk_hits += 1
+                return entry
+
+        return None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value if present and not expired."""
+        entry = self._lookup(key)
+        if entry is not None and entry[2] > time.time():
+            with self._lock:
+                self.hits += 1
+            return entry[0]
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def get_stale(self, key: str):
+        """
+        Stale-while-revalidate lookup.
+        Returns (value, is_fresh); expired entries inside the stale window come
+        back with is_fresh=False so the caller can refresh them in the background.
+        """
+        entry = self._lookup(key)
+        now = time.time()
+        if entry is not None and entry[2] + self.stale_ttl > now:
+            fresh = entry[2] > now
+            with self._lock:
+                self.hits += 1
+                if not fresh:
+                    self.stale_hits += 1
+            return entry[0], fresh
+
+        with self._lock:
+            self.misses += 1
+        return None, False
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value; ttl overrides the cache default."""
+        stored_at = time.time()
+        expires_at = stored_at + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, stored_at, expires_at)
+
+        if self._disk:
+            try:
+                self._disk.set(key, value, stored_at, expires_at)
+            except Exception as e:
+                print(f"⚠️ Cache '{self.name}' disk write failed: {e}")
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+        if self._disk:
+            try:
+                self._disk.delete(key)
+            except Exception as e:
+                print(f"⚠️ Cache '{self.name}' disk delete failed: {e}")
+
+    def clear(self):
+        """Drop all in-memory entries (the disk tier is left untouched)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "stale_hits": self.stale_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "disk_tier": self._disk is not None
+            }
+
+
+def cache_stats() -> List[Dict]:
+    """Stats for every cache created in this process."""
+    return [cache.stats() for cache in _registry.values()]
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving while it is in
+    flight wait for it and share its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
@@ -0,0 +1,65 @@
+"""
+Bounded worker pool for blocking work.
+Runs CrewAI kickoffs, outbound HTTP calls and pymongo operations off the
+event loop so one slow LLM call no longer stalls every other request.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+# Threads available for blocking calls, and how many calls may wait for one
+BLOCKING_MAX_WORKERS = int(os.getenv("BLOCKING_MAX_WORKERS", "64"))
+BLOCKING_MAX_PENDING = int(os.getenv("BLOCKING_MAX_PENDING", "512"))
+
+# Seconds a call waits for one of those slots before it is refused with a 503
+BLOCKING_QUEUE_TIMEOUT = float(os.getenv("BLOCKING_QUEUE_TIMEOUT", "10"))
+
+_executor = None
+_slots = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_MAX_WORKERS, thread_name_prefix="blocking")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking callable on the worker pool and await its result.
+    At most BLOCKING_MAX_PENDING calls are submitted at once; a caller that
+    cannot get a slot within BLOCKING_QUEUE_TIMEOUT seconds gets a 503, so
+    overload fails fast instead of piling up waiting requests.
+
+    Raises:
+        HTTPException: 503 if no slot freed up in time
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(BLOCKING_MAX_PENDING)
+
+    try:
+        await asyncio.wait_for(_slots.acquire(), BLOCKING_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"⚠️ Blocking pool saturated; refusing {getattr(func, '__name__', func)}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly",
+                            headers={"Retry-After": str(max(int(BLOCKING_QUEUE_TIMEOUT), 1))})
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+    finally:
+        _slots.release()
+
+
+def shutdown_executor():
+    """Stop the pool at application shutdown."""
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    _slots = None
@@ -0,0 +1,161 @@
+"""
+Shared outbound HTTP clients.
+One pooled keep-alive session per external service (Gemini, Serper, Clerk JWKS)
+with its own timeouts and retry policy, plus simple in-flight / latency metrics.
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connections kept open per host, and seconds allowed to establish one
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+
+# Per-service read timeout (seconds), retry count, and whether its requests are
+# safe to repeat once the server may have started on them
+SERVICE_CONFIG = {
+    "gemini": {
+        "read_timeout": float(os.getenv("GEMINI_HTTP_TIMEOUT", "30")),
+        "retries": int(os.getenv("GEMINI_HTTP_RETRIES", "2")),
+        "idempotent": False,  # each POST is a paid generation
+    },
+    "serper": {
+        "read_timeout": float(os.getenv("SERPER_HTTP_TIMEOUT", "10")),
+        "retries": int(os.getenv("SERPER_HTTP_RETRIES", "2")),
+        "idempotent": False,  # each POST is a billed search
+    },
+    "jwks": {
+        "read_timeout": float(os.getenv("JWKS_HTTP_TIMEOUT", "5")),
+        "retries": int(os.getenv("JWKS_HTTP_RETRIES", "1")),
+        "idempotent": True,
+    },
+}
+
+# Statuses worth retrying for idempotent requests
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Non-idempotent requests are retried only when the server certainly did no
+# work: connection failures, or an explicit "try again later"
+NON_IDEMPOTENT_RETRY_STATUSES = (429, 503)
+
+
+def _retry_policy(retries: int, idempotent: bool = True) -> Retry:
+    options = dict(
+        total=retries,
+        connect=retries,
+        # A read timeout means the request may already be running upstream
+        read=retries if idempotent else 0,
+        status=retries,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES if idempotent else NON_IDEMPOTENT_RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        # Jitter spreads retries from concurrent workers (urllib3 >= 2.0)
+        return Retry(backoff_jitter=0.3, **options)
+    except TypeError:
+        return Retry(**options)
+
+
+class ServiceClient:
+    """
+    Keep-alive HTTP session for one external service.
+    Every request gets the service's timeout unless the caller passes one.
+    """
+
+    def __init__(self, name: str, read_timeout: float, retries: int, idempotent: bool = True):
+        self.name = name
+        self.timeout = (HTTP_CONNECT_TIMEOUT, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+            max_retries=_retry_policy(retries, idempotent)
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_seconds = 0.0
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        started = time.perf_counter()
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.total_seconds += time.perf_counter() - started
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "avg_latency_ms": round(1000 * self.total_seconds / self.requests, 1) if self.requests else None,
+                "timeout": {"connect": self.timeout[0], "read": self.timeout[1]},
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_clients: Dict[str, ServiceClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service: str) -> ServiceClient:
+    """Shared client for a service listed in SERVICE_CONFIG (created on first use)."""
+    client = _clients.get(service)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(service)
+            if client is None:
+                client = ServiceClient(service, **SERVICE_CONFIG[service])
+                _clients[service] = client
+    return client
+
+
+def http_stats() -> Dict:
+    """Metrics for every client created so far."""
+    return {name: client.stats() for name, client in _clients.items()}
+
+
+def close_clients():
+    """Close all pooled connections (called on application shutdown)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,280 @@
+"""
+Leaderboard Service
+Keeps ranked in-memory boards (all-time, daily, weekly) up to date as points
+change, so top-N and per-user rank lookups never scan the users collection.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from ..db import db, mongo, users_collection, users_read_collection
+
+# Per-user point deltas for the time-windowed boards
+leaderboard_windows_collection = db["leaderboard_windows"]
+
+# How often each worker reloads its boards from MongoDB, picking up points
+# awarded by other workers
+LEADERBOARD_RESYNC_SECONDS = int(os.getenv("LEADERBOARD_RESYNC_SECONDS", "30"))
+
+WINDOWS = ("all", "daily", "weekly")
+
+
+class RankedBoard:
+    """
+    Scores per user with O(log n) rank lookups.
+    Rank is 1 + the number of users with strictly more points, matching the
+    previous count_documents({"points": {"$gt": ...}}) semantics. Ranks come
+    from a sorted list of every user's score, so memory grows with the number
+    of users, never with the size of a score, and negative scores rank normally.
+    """
+
+    def __init__(self):
+        self._scores: Dict[str, int] = {}
+        self._members: Dict[int, set] = {}
+        self._distinct: List[int] = []  # sorted distinct scores, ascending
+        self._sorted: List[int] = []  # every user's score, ascending
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, clerk_id: str):
+        return clerk_id in self._scores
+
+    def _remove(self, clerk_id: str):
+        score = self._scores.pop(clerk_id)
+        members = self._members[score]
+        members.discard(clerk_id)
+        if not members:
+            del self._members[score]
+            self._distinct.pop(bisect_left(self._distinct, score))
+        self._sorted.pop(bisect_left(self._sorted, score))
+
+    def set_score(self, clerk_id: str, score: int):
+        if clerk_id in self._scores:
+            self._remove(clerk_id)
+        self._scores[clerk_id] = score
+        if score not in self._members:
+            self._members[score] = set()
+            insort(self._distinct, score)
+        self._members[score].add(clerk_id)
+        insort(self._sorted, score)
+
+    def add(self, clerk_id: str, delta: int):
+        self.set_score(clerk_id, self._scores.get(clerk_id, 0) + delta)
+
+    def score(self, clerk_id: str) -> Optional[int]:
+        return self._scores.get(clerk_id)
+
+    def rank_of_score(self, score: int) -> int:
+        return len(self._sorted) - bisect_right(self._sorted, score) + 1
+
+    def top(self, n: int) -> List[tuple]:
+        """Highest (clerk_id, score) pairs, ties ordered by clerk_id."""
+        result = []
+        for score in reversed(self._distinct):
+            for clerk_id in sorted(self._members[score]):
+                result.append((clerk_id, score))
+                if len(result) >= n:
+                    return result
+        return result
+
+
+class LeaderboardService:
+    """
+    Ranked boards for all-time and windowed points.
+    Point changes are applied in memory immediately; boards are reloaded from
+    MongoDB every LEADERBOARD_RESYNC_SECONDS in the background. Reloads read
+    MongoDB without holding the board lock and swap the new boards in, so
+    lookups are never blocked by a scan.
+    """
+
+    def __init__(self, users, windows, users_reader=None, windows_reader=None):
+        self._users = users
+        self._windows = windows
+        # Full reloads tolerate replication lag, so they may read from secondaries
+        self._users_reader = users_reader if users_reader is not None else users
+        self._windows_reader = windows_reader if windows_reader is not None else windows
+        self._boards: Dict[str, RankedBoard] = {}
+        self._window_keys: Dict[str, str] = {}
+        self._profiles: Dict[str, Dict] = {}
+        self._loaded_at = 0.0
+        self._reloading = False
+        self._lock = threading.RLock()
+        # Serializes synchronous loads (first use, window rollover) without blocking readers
+        self._load_lock = threading.Lock()
+
+    # ---------------- Window helpers ----------------
+    @staticmethod
+    def _window_key(window: str, now: datetime) -> str:
+        if window == "daily":
+            return f"daily:{now.strftime('%Y-%m-%d')}"
+        year, week, _ = now.isocalendar()
+        return f"weekly:{year}-W{week:02d}"
+
+    @staticmethod
+    def _window_expiry(window: str, now: datetime) -> datetime:
+        return now + (timedelta(days=2) if window == "daily" else timedelta(days=14))
+
+    # ---------------- Loading ----------------
+    def _load(self):
+        """Rebuild every board from MongoDB."""
+        now = datetime.utcnow()
+        boards = {"all": RankedBoard()}
+        profiles = {}
+
+        for user in self._users_reader.find({}, {"_id": 0, "clerk_id": 1, "points": 1, "name": 1, "avatar": 1}):
+            clerk_id = user.get("clerk_id")
+            if not clerk_id:
+                continue
+            boards["all"].set_score(clerk_id, int(user.get("points", 0) or 0))
+            profiles[clerk_id] = {"name": user.get("name"), "avatar": user.get("avatar")}
+
+        window_keys = {}
+        for window in ("daily", "weekly"):
+            key = self._window_key(window, now)
+            window_keys[window] = key
+            boards[window] = RankedBoard()
+            for entry in self._windows_reader.find({"window": key}, {"_id": 0, "clerk_id": 1, "points": 1}):
+                boards[window].set_score(entry["clerk_id"], int(entry.get("points", 0)))
+
+        with self._lock:
+            self._boards = boards
+            self._profiles = profiles
+            self._window_keys = window_keys
+            self._loaded_at = time.time()
+
+    def _background_reload(self):
+        try:
+            self._load()
+        except Exception as e:
+            print(f"⚠️ Leaderboard reload failed: {e}")
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def _needs_load(self) -> bool:
+        if not self._boards:
+            return True
+        now = datetime.utcnow()
+        return any(self._window_key(w, now) != key for w, key in self._window_keys.items())
+
+    def _ensure_loaded(self):
+        """
+        Load on first use or window rollover (callers wait for one load);
+        afterwards refresh stale boards in the background. Never called with
+        self._lock held.
+        """
+        if self._needs_load():
+            with self._load_lock:
+                if self._needs_load():
+                    self._load()
+            return
+
+        if time.time() - self._loaded_at > LEADERBOARD_RESYNC_SECONDS:
+            with self._lock:
+                if self._reloading:
+                    return
+                self._reloading = True
+            threading.Thread(target=self._background_reload, name="leaderboard-reload", daemon=True).start()
+
+    # ---------------- Writes ----------------
+    def record_points(self, clerk_id: str, delta: int):
+        """
+        Apply a point change that has already been written to users.points.
+        Persists the windowed deltas and updates the in-memory boards.
+        """
+        if not clerk_id or not delta:
+            return
+
+        now = datetime.utcnow()
+        try:
+            self._windows.bulk_write([
+                UpdateOne(
+                    {"window": self._window_key(window, now), "clerk_id": clerk_id},
+                    {"$inc": {"points": delta}, "$set": {"expires_at": self._window_expiry(window, now)}},
+                    upsert=True
+                )
+                for window in ("daily", "weekly")
+            ], ordered=False)
+        except Exception as e:
+            print(f"⚠️ Leaderboard window update failed: {e}")
+
+        with self._lock:
+            if not self._boards:
+                return
+            for window, board in self._boards.items():
+                if window == "all" or self._window_keys.get(window) == self._window_key(window, now):
+                    board.add(clerk_id, delta)
+
+    def register_user(self, clerk_id: str, name: Optional[str] = None, avatar: Optional[str] = None,
+                      points: int = 0):
+        """Add a newly created user (or refresh their profile) without waiting for a resync."""
+        with self._lock:
+            self._profiles[clerk_id] = {"name": name, "avatar": avatar}
+            board = self._boards.get("all")
+            if board is not None and clerk_id not in board:
+                board.set_score(clerk_id, points)
+
+    # ---------------- Reads ----------------
+    def _board(self, window: str) -> RankedBoard:
+        """Board for a window; call _check_window() first, then this with self._lock held."""
+        return self._boards[window]
+
+    def _check_window(self, window: str):
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown leaderboard window: {window}")
+        self._ensure_loaded()
+
+    def top(self, n: int = 10, window: str = "all") -> List[Dict]:
+        self._check_window(window)
+        with self._lock:
+            board = self._board(window)
+            entries = []
+            for rank, (clerk_id, score) in enumerate(board.top(n), 1):
+                profile = self._profiles.get(clerk_id, {})
+                entries.append({
+                    "rank": rank,
+                    "username": profile.get("name") or "Anonymous",
+                    "points": score,
+                    "avatar": profile.get("avatar"),
+                    "clerk_id": clerk_id
+                })
+            return entries
+
+    def rank(self, clerk_id: str, window: str = "all") -> Optional[Dict]:
+        """
+        Rank and points of a user, or None if they are not on the all-time board.
+        Users without points in a window rank after everyone who has some.
+        """
+        self._check_window(window)
+        with self._lock:
+            board = self._board(window)
+            if window == "all" and clerk_id not in board:
+                return None
+            score = board.score(clerk_id)
+            rank = board.rank_of_score(score) if score is not None else len(board) + 1
+            profile = self._profiles.get(clerk_id, {})
+            return {
+                "username": profile.get("name"),
+                "points": score or 0,
+                "rank": rank,
+                "avatar": profile.get("avatar")
+            }
+
+    def total_users(self, window: str = "all") -> int:
+        self._check_window(window)
+        with self._lock:
+            return len(self._board(window))
+
+
+leaderboard = LeaderboardService(
+    users_collection,
+    leaderboard_windows_collection,
+    users_reader=users_read_collection,
+    windows_reader=mongo.secondary_preferred("leaderboard_windows")
+)
@@ -0,0 +1,167 @@
+"""
+Local Text Classifier
+First tier for text classification: a compiled token/phrase index that answers
+common household items in microseconds with a confidence score, so only
+ambiguous items are sent to Gemini / CrewAI. Items the remote tier classifies
+are learned, so repeated lookups stay local.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Items below this confidence are escalated to the remote classifier
+LOCAL_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv("LOCAL_CLASSIFIER_MIN_CONFIDENCE", "0.6"))
+
+# Share of content words that must match the index before an item is answered
+# locally; one known word next to an unknown one ("oil painting") is escalated
+LOCAL_CLASSIFIER_MIN_COVERAGE = float(os.getenv("LOCAL_CLASSIFIER_MIN_COVERAGE", "1.0"))
+
+# Learned item phrases kept in memory (least recently learned dropped first)
+LOCAL_CLASSIFIER_MAX_LEARNED = int(os.getenv("LOCAL_CLASSIFIER_MAX_LEARNED", "10000"))
+
+# Longest phrase (in tokens) the index matches
+MAX_PHRASE_TOKENS = 4
+
+# Seed vocabulary; multi-word phrases win over the words they contain
+SEED_LEXICON = {
+    "recyclable": [
+        "plastic", "glass", "paper", "metal", "can", "bottle", "aluminum", "aluminium", "cardboard", "tin",
+        "jar", "newspaper", "magazine", "carton", "steel", "foil", "envelope", "tin can", "soda can",
+        "beer can", "plastic bottle", "glass bottle", "water bottle", "milk jug", "cereal box", "shoe box",
+        "paper bag", "office paper", "junk mail",
+    ],
+    "organic": [
+        "food", "fruit", "vegetable", "organic", "compost", "banana", "apple", "peel", "egg", "coffee", "tea",
+        "leftovers", "bread", "rice", "leaves", "grass", "eggshell", "orange", "potato", "onion", "bones",
+        "coffee grounds", "tea bag", "egg shells", "banana peel", "apple core", "grass clippings",
+        "garden waste", "food scraps",
+    ],
+    "hazardous": [
+        "battery", "chemical", "electronic", "electronics", "hazardous", "toxic", "medicine", "paint", "oil",
+        "bulb", "phone", "pesticide", "solvent", "syringe", "needle", "thermometer", "bleach", "laptop",
+        "charger", "light bulb", "motor oil", "aerosol can", "paint can", "spray can", "fluorescent tube",
+        "mobile phone", "nail polish", "car battery",
+    ],
+    "general": [
+        "diaper", "nappy", "styrofoam", "polystyrene", "tissue", "napkin", "wrapper", "sponge", "cigarette",
+        "ceramic", "chip bag", "crisp packet", "coffee cup", "pizza box", "plastic bag", "cling film",
+        "paper towel", "straw",
+    ],
+}
+
+# Words that carry no category signal
+STOPWORDS = {
+    "a", "an", "the", "of", "and", "or", "with", "in", "on", "for", "my", "some", "this", "that", "it", "is",
+    "empty", "old", "used", "broken", "dirty", "clean", "small", "large", "big", "little", "piece", "pieces",
+    "half", "bit", "bits", "item", "items", "waste", "trash", "rubbish", "garbage",
+}
+
+CATEGORIES = ("recyclable", "organic", "hazardous", "general")
+
+
+def _stem(token: str) -> str:
+    """Reduce simple English plurals: batteries -> battery, bottles -> bottle, boxes -> box."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "xes", "sses")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    return tuple(_stem(token) for token in re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+class LocalClassifier:
+    """
+    Phrase index mapping token sequences to per-category weights.
+    Matching is whole-token and longest-phrase-first, so "cancer" never
+    matches "can" and "paint can" is hazardous rather than recyclable.
+    """
+
+    def __init__(self, lexicon: Dict[str, list] = SEED_LEXICON):
+        self._seed: Dict[Tuple[str, ...], Dict[str, float]] = {}
+        self._learned: "OrderedDict[Tuple[str, ...], Dict[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        for category, terms in lexicon.items():
+            for term in terms:
+                phrase = tokenize(term)
+                if phrase:
+                    self._seed.setdefault(phrase, {})[category] = 1.0
+
+    def _weights(self, phrase: Tuple[str, ...]) -> Optional[Dict[str, float]]:
+        return self._learned.get(phrase) or self._seed.get(phrase)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Best category and a confidence in [0, 1].
+
+        Confidence is the square of the winning category's share of the
+        matched weight (conflicting words weigh heavily), scaled by the share
+        of content words that matched anything (unknown words make the answer
+        less certain).
+        """
+        category, purity, coverage = self._score(text)
+        return category, round(purity ** 2 * coverage, 4)
+
+    def _score(self, text: str) -> Tuple[str, float, float]:
+        """Best category, its share of the matched weight, and the share of content words matched."""
+        tokens = [token for token in tokenize(text) if token not in STOPWORDS] or list(tokenize(text))
+        if not tokens:
+            return "general", 0.0, 0.0
+
+        # An item seen before as a whole is answered from what was learned
+        learned = self._learned.get(tuple(tokens))
+        if learned:
+            best = max(learned, key=learned.get)
+            return best, learned[best] / sum(learned.values()), 1.0
+
+        scores = {category: 0.0 for category in CATEGORIES}
+        matched = 0
+        i = 0
+        while i < len(tokens):
+            for length in range(min(MAX_PHRASE_TOKENS, len(tokens) - i), 0, -1):
+                weights = self._weights(tuple(tokens[i:i + length]))
+                if weights:
+                    for category, weight in weights.items():
+                        scores[category] += weight
+                    matched += length
+                    i += length
+                    break
+            else:
+                i += 1
+
+        total = sum(scores.values())
+        if not total:
+            return "general", 0.0, 0.0
+        best = max(CATEGORIES, key=lambda category: scores[category])
+        return best, scores[best] / total, matched / len(tokens)
+
+    def classify(self, text: str, min_confidence: float = LOCAL_CLASSIFIER_MIN_CONFIDENCE,
+                 min_coverage: float = LOCAL_CLASSIFIER_MIN_COVERAGE) -> Optional[str]:
+        """Category if the local index knows (almost) every word and is confident enough, else None."""
+        category, purity, coverage = self._score(text)
+        if coverage < min_coverage or purity ** 2 * coverage < min_confidence:
+            return None
+        return category
+
+    def learn(self, text: str, category: str):
+        """Record a remote classification so the same item is answered locally next time."""
+        if category not in CATEGORIES:
+            return
+        phrase = tuple(token for token in tokenize(text) if token not in STOPWORDS)
+        if not phrase or len(phrase) > MAX_PHRASE_TOKENS:
+            return
+        with self._lock:
+            weights = self._learned.pop(phrase, {})
+            weights[category] = weights.get(category, 0.0) + 1.0
+            self._learned[phrase] = weights
+            while len(self._learned) > LOCAL_CLASSIFIER_MAX_LEARNED:
+                self._learned.popitem(last=False)
+
+
+local_classifier = LocalClassifier()
@@ -3,13 +3,29 @@ Memory Manager for Chat Assistant
 Handles persistent conversation history and context management.
 """
 import json
+import os
+import re
 from datetime import datetime
 from typing import Optional, List, Dict
-from ..db import db
+from pymongo.errors import DuplicateKeyError
+
+from ..db import db, users_collection
+from .token_budget import truncate_to_tokens
+from .points_ledger import points_ledger
+from .activity import APPLIED_KEYS_LIMIT
+from .task_queue import task_queue, new_idempotency_key
 
 # Use MongoDB collection for chat history
 chat_history_collection = db["chat_history"]
 
+# Number of interactions kept in users.chat_history for fast context loading
+EMBEDDED_HISTORY_LIMIT = 50
+
+# Rolling summary: one compressed line per interaction, bounded in count and size
+SUMMARY_MAX_LINES = int(os.getenv("CHAT_SUMMARY_MAX_LINES", "20"))
+SUMMARY_USER_TOKENS = 30
+SUMMARY_ASSISTANT_TOKENS = 40
+
 
 class MemoryManager:
     """
@@ -18,47 +34,163 @@ class MemoryManager:
     """
 
     @staticmethod
-    def save_context(user_id: str, user_message: str, assistant_response: str, recycling_guide: Optional[str] = None):
+    def save_context(user_id: str, user_message: str, assistant_response: str,
+                     recycling_guide: Optional[str] = None, points: int = 0,
+                     idempotency_key: Optional[str] = None) -> bool:
         """
         Save a chat interaction to the database.
 
+        On the request path a single update on the user document appends a
+        compact copy to users.chat_history, adds a compressed line to the
+        rolling users.conversation_summary, keeps users.latest_recycling_guide
+        current and applies any engagement points, which are recorded in the
+        points ledger first: one round trip, two with points.
+
+        The full interaction (chat_history collection) and the views derived
+        from the ledger (points_daily, leaderboard windows) are written by a
+        "chat_archive" job on the task queue after the response.
+
         Args:
             user_id: Clerk user ID
             user_message: User's input message
             assistant_response: Chat assistant's response
             recycling_guide: Optional recycling guide context
+            points: Points to award (0 for none), recorded in the points ledger
+            idempotency_key: Optional key; saving again with the same key finishes
+                any writes an interrupted attempt left undone, and nothing else
+
+        Returns:
+            True if the interaction was saved (or already had been)
         """
         try:
+            timestamp = datetime.utcnow()
+            archive_key = f"chat_archive:{idempotency_key}" if idempotency_key else \
+                new_idempotency_key(user_id, "chat_archive")
             interaction = {
                 "user_id": user_id,
-                "timestamp": datetime.utcnow(),
+                "timestamp": timestamp,
                 "user_message": user_message,
                 "assistant_response": assistant_response,
-                "recycling_guide": recycling_guide
+                "recycling_guide": recycling_guide,
+                # Also set without a client key, so a rerun archive job inserts it once
+                "idempotency_key": idempotency_key or archive_key
             }
 
-            # Insert into chat history
-            chat_history_collection.insert_one(interaction)
-
-            # Also update user's chat history array (for quick access)
-            from ..db import users_collection
-            users_collection.update_one(
-                {"clerk_id": user_id},
-                {
-                    "$push": {
-                        "chat_history": {
-                            "$each": [interaction],
-                            "$slice": -50  # Keep only last 50 messages
-                        }
+            # Embedded copy without the guide; the guide is stored once per user
+            update = {
+                "$push": {
+                    "chat_history": {
+                        "$each": [{
+                            "timestamp": timestamp,
+                            "user_message": user_message,
+                            "assistant_response": assistant_response
+                        }],
+                        "$slice": -EMBEDDED_HISTORY_LIMIT
+                    },
+                    "conversation_summary": {
+                        "$each": [{
+                            "timestamp": timestamp,
+                            "text": MemoryManager._summarize_turn(user_message, assistant_response)
+                        }],
+                        "$slice": -SUMMARY_MAX_LINES
                     }
-                },
-                upsert=True
+                }
+            }
+            if recycling_guide:
+                update["$set"] = {"latest_recycling_guide": recycling_guide}
+
+            # The ledger entry's balance change rides along in the same user update
+            ledger_entry = None
+            if points:
+                ledger_entry = points_ledger.prepare(user_id, points, "chat",
+                                                     f"chat:{idempotency_key}" if idempotency_key else None)
+                if ledger_entry:
+                    update["$inc"] = {"points": ledger_entry["delta"]}
+                else:
+                    # Entry neither recorded nor found; save the context without the points
+                    print(f"⚠️ No ledger entry for chat points of user {user_id}; saving without them")
+
+            applied = True
+            if idempotency_key:
+                # Apply the user update only once per key. A user that already
+                # has the marker does not match, and the upsert then collides
+                # with the unique clerk_id index instead of adding a second user
+                marker = f"chat:{idempotency_key}"
+                update["$push"]["applied_keys"] = {"$each": [marker], "$slice": -APPLIED_KEYS_LIMIT}
+                try:
+                    users_collection.update_one(
+                        {"clerk_id": user_id, "applied_keys": {"$ne": marker}}, update, upsert=True
+                    )
+                except DuplicateKeyError:
+                    applied = False
+                    print(f"ℹ️ Chat context {idempotency_key} already saved, completing it")
+            else:
+                users_collection.update_one({"clerk_id": user_id}, update, upsert=True)
+
+            task_queue.enqueue(
+                "chat_archive",
+                archive_key,
+                interaction=interaction,
+                ledger_entry=ledger_entry if applied else None
             )
 
             print(f"✅ Saved chat context for user {user_id}")
+            return True
 
         except Exception as e:
             print(f"⚠️ Failed to save chat context: {e}")
+            return False
+
+    @staticmethod
+    def load_context(user_id: str, limit: int = 5) -> Dict:
+        """
+        Load conversation history and the latest recycling guide in one read.
+
+        Both come from the user document: the last `limit` interactions verbatim,
+        preceded by rolling-summary lines for the older ones, plus
+        users.latest_recycling_guide. Users saved before latest_recycling_guide
+        existed fall back to the chat_history collection once and are backfilled.
+
+        Args:
+            user_id: Clerk user ID
+            limit: Number of recent messages to include (0 to skip history)
+
+        Returns:
+            {"conversation_history": str, "recycling_guide": str | None}
+        """
+        try:
+            projection = {"_id": 0, "latest_recycling_guide": 1}
+            if limit > 0:
+                projection["chat_history"] = {"$slice": -limit}
+                projection["conversation_summary"] = 1
+            user = users_collection.find_one({"clerk_id": user_id}, projection) or {}
+
+            if "latest_recycling_guide" in user:
+                recycling_guide = user["latest_recycling_guide"]
+            else:
+                recycling_guide = MemoryManager.get_latest_recycling_guide(user_id)
+                if user:
+                    users_collection.update_one(
+                        {"clerk_id": user_id},
+                        {"$set": {"latest_recycling_guide": recycling_guide}}
+                    )
+
+            history = user.get("chat_history", []) if limit > 0 else []
+            summary = user.get("conversation_summary", []) if limit > 0 else []
+
+            # Summary lines for interactions older than the verbatim ones
+            cutoff = history[0].get("timestamp") if history else None
+            earlier = [line["text"] for line in summary
+                       if cutoff is None or line.get("timestamp") is None or line["timestamp"] < cutoff]
+
+            return {
+                "conversation_history": "\n".join(earlier + ([MemoryManager._format_history(history)] if history else [])),
+                "recycling_guide": recycling_guide
+            }
+
+        except Exception as e:
+            print(f"⚠️ Failed to load chat context: {e}")
+            return {"conversation_history": "", "recycling_guide": None}
 
     @staticmethod
     def get_recent_context(user_id: str, limit: int = 10) -> List[Dict]:
@@ -109,14 +241,27 @@ class MemoryManager:
             Formatted conversation history string
         """
         history = MemoryManager.get_recent_context(user_id, limit)
+        return MemoryManager._format_history(history)
+
+    @staticmethod
+    def _summarize_turn(user_message: str, assistant_response: str) -> str:
+        """Compress an interaction to one line: the first sentence of each side, token-capped."""
+        def first_sentence(text: str) -> str:
+            text = " ".join((text or "").split())
+            return re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
 
-        if not history:
-            return ""
+        return (
+            f"Earlier: user asked \"{truncate_to_tokens(first_sentence(user_message), SUMMARY_USER_TOKENS)}\"; "
+            f"assistant said \"{truncate_to_tokens(first_sentence(assistant_response), SUMMARY_ASSISTANT_TOKENS)}\""
+        )
 
+    @staticmethod
+    def _format_history(history: List[Dict]) -> str:
+        """Format interactions (oldest first) as alternating User/Assistant lines."""
         summary_parts = []
         for item in history:
-            summary_parts.append(f"User: {item['user_message']}")
-            summary_parts.append(f"Assistant: {item['assistant_response']}")
+            summary_parts.append(f"User: {item.get('user_message', '')}")
+            summary_parts.append(f"Assistant: {item.get('assistant_response', '')}")
 
         return "\n".join(summary_parts)
 
@@ -154,10 +299,9 @@ class MemoryManager:
         try:
             chat_history_collection.delete_many({"user_id": user_id})
 
-            from ..db import users_collection
             users_collection.update_one(
                 {"clerk_id": user_id},
-                {"$set": {"chat_history": []}}
+                {"$set": {"chat_history": [], "conversation_summary": [], "latest_recycling_guide": None}}
             )
 
             print(f"✅ Cleared chat history for user {user_id}")
@@ -188,3 +332,18 @@ class MemoryManager:
             print(f"⚠️ Failed to get chat stats: {e}")
             return {"total_messages": 0, "has_history": False}
 
+
+@task_queue.handler("chat_archive")
+def _archive_chat(key: str, interaction: dict, ledger_entry: Optional[dict] = None):
+    """
+    Write what save_context leaves off the request path: the full interaction
+    and the ledger entry's daily aggregate and leaderboard windows. The
+    interaction is keyed, so a rerun inserts it once; the derived views can
+    be rebuilt from the ledger (python -m src.utils.points_ledger --rebuild).
+    """
+    try:
+        chat_history_collection.insert_one(interaction)
+    except DuplicateKeyError:
+        pass
+    if ledger_entry:
+        points_ledger.applied(ledger_entry)
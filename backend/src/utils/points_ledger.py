@@ -0,0 +1,335 @@
+"""
+Points Ledger
+Every point change is appended to the points_ledger collection before it
+touches a balance, so balances can be audited, windowed and rebuilt:
+
+- users.points stays the materialized balance (O(1) reads), updated with $inc
+  as each entry is appended,
+- points_daily keeps one document per user and day with totals per source
+  (chat, quiz, image_classification, redemption, ...) for reports,
+- the in-memory leaderboard is updated last.
+
+An entry's idempotency key is unique, and keyed balance updates are guarded by
+users.ledger_keys, so a retried award is applied once.
+
+Balances and daily aggregates can be checked against (or rebuilt from) the ledger:
+
+    python -m src.utils.points_ledger --opening-balances   # record pre-ledger points once
+    python -m src.utils.points_ledger --rebuild            # report drift only
+    python -m src.utils.points_ledger --rebuild --apply    # rewrite balances and aggregates
+
+--apply refuses to run before --opening-balances has recorded the points
+awarded before the ledger existed (pass --force on a deployment that never
+had any).
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from ..db import db, users_collection
+from ..schema import INDEXES
+from .leaderboard import leaderboard
+
+# Append-only point changes, one document per award or deduction
+points_ledger_collection = db["points_ledger"]
+
+# Per-user, per-day totals by source
+points_daily_collection = db["points_daily"]
+
+# Idempotency keys remembered per user to reject replayed balance updates
+LEDGER_KEYS_LIMIT = int(os.getenv("LEDGER_KEYS_LIMIT", "200"))
+
+# Allowance for clock differences between the workers stamping ledger entries;
+# rebuilds treat entries this close to their start as possibly still in flight
+LEDGER_CLOCK_SKEW = timedelta(seconds=int(os.getenv("LEDGER_CLOCK_SKEW_SECONDS", "300")))
+
+
+class PointsLedger:
+    """
+    Writes point changes through the ledger and keeps the balances and daily
+    aggregates derived from it up to date.
+    """
+
+    def __init__(self, ledger, daily, users):
+        self._ledger = ledger
+        self._daily = daily
+        self._users = users
+
+    # ---------------- Writes ----------------
+    def record(self, user_id: str, delta: int, source: str, idempotency_key: Optional[str] = None,
+               reference: Optional[str] = None, session=None) -> Optional[Dict]:
+        """
+        Append a ledger entry without touching the balance (for callers that
+        change users.points themselves, e.g. a conditional deduction).
+
+        Returns:
+            The entry, or None if an entry with this key already exists
+        """
+        timestamp = datetime.utcnow()
+        entry = {
+            "user_id": user_id,
+            "delta": delta,
+            "source": source,
+            "reference": reference,
+            "idempotency_key": idempotency_key or f"{source}:{user_id}:{uuid.uuid4().hex}",
+            "day": timestamp.strftime("%Y-%m-%d"),
+            "timestamp": timestamp
+        }
+        try:
+            self._ledger.insert_one(entry, session=session)
+        except DuplicateKeyError:
+            return None
+        return entry
+
+    def award(self, user_id: str, delta: int, source: str, idempotency_key: Optional[str] = None,
+              reference: Optional[str] = None, upsert: bool = True) -> bool:
+        """
+        Record a point change and apply it to the balance, aggregates and leaderboard.
+
+        Args:
+            user_id: Clerk user ID
+            delta: Points to add (negative to deduct)
+            source: What the points are for (e.g. "chat", "quiz", "image_classification")
+            idempotency_key: Optional key; awarding again with the same key is a no-op
+            reference: Optional ID of the activity / redemption behind the change
+            upsert: Create the user document if it does not exist
+
+        Returns:
+            True if the balance changed, False if the key was already applied
+            (or the user does not exist and upsert is False)
+        """
+        if not delta:
+            return False
+
+        entry = self.prepare(user_id, delta, source, idempotency_key, reference)
+        if entry is None:
+            return False
+        if not self._apply_balance(entry, keyed=bool(idempotency_key), upsert=upsert):
+            return False
+        self.applied(entry)
+        return True
+
+    def prepare(self, user_id: str, delta: int, source: str, idempotency_key: Optional[str] = None,
+                reference: Optional[str] = None) -> Optional[Dict]:
+        """
+        Record an entry whose balance change the caller folds into its own user
+        update ({"$inc": {"points": entry["delta"]}}), guarded by the same key.
+        Call applied(entry) once that update has gone through.
+
+        Returns:
+            The new entry, or the one an earlier attempt with this key recorded
+        """
+        entry = self.record(user_id, delta, source, idempotency_key, reference)
+        if entry is None:
+            # Recorded by an earlier attempt; its balance update may still be missing
+            entry = self._ledger.find_one({"idempotency_key": idempotency_key})
+        return entry
+
+    def applied(self, entry: Dict):
+        """Update the derived views once an entry's delta is in users.points."""
+        self.update_aggregates(entry)
+        leaderboard.record_points(entry["user_id"], entry["delta"])
+
+    def _apply_balance(self, entry: Dict, keyed: bool, upsert: bool) -> bool:
+        user_id = entry["user_id"]
+        update = {"$inc": {"points": entry["delta"]}}
+
+        if not keyed:
+            result = self._users.update_one({"clerk_id": user_id}, update, upsert=upsert)
+            return bool(result.matched_count or result.upserted_id)
+
+        # Apply only if this key has not been applied to the balance yet
+        key = entry["idempotency_key"]
+        update["$push"] = {"ledger_keys": {"$each": [key], "$slice": -LEDGER_KEYS_LIMIT}}
+        result = self._users.update_one({"clerk_id": user_id, "ledger_keys": {"$ne": key}}, update)
+        if result.matched_count:
+            return True
+        if not upsert or self._users.count_documents({"clerk_id": user_id}, limit=1):
+            return False
+        self._users.update_one({"clerk_id": user_id}, update, upsert=True)
+        return True
+
+    def update_aggregates(self, entry: Dict):
+        """Add an entry to its user's daily totals."""
+        try:
+            self._daily.update_one(
+                {"day": entry["day"], "user_id": entry["user_id"]},
+                {"$inc": {
+                    "total": entry["delta"],
+                    "earned": max(entry["delta"], 0),
+                    "spent": max(-entry["delta"], 0),
+                    "events": 1,
+                    f"by_source.{entry['source']}": entry["delta"]
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            # Derived data; --rebuild restores it from the ledger
+            print(f"⚠️ Daily points aggregate update failed: {e}")
+
+    # ---------------- Reads ----------------
+    def balance(self, user_id: str) -> int:
+        user = self._users.find_one({"clerk_id": user_id}, {"_id": 0, "points": 1}) or {}
+        return user.get("points", 0)
+
+    def daily(self, user_id: str, days: int = 30) -> List[Dict]:
+        """A user's daily totals, newest first."""
+        return list(self._daily.find({"user_id": user_id}, {"_id": 0}).sort("day", -1).limit(days))
+
+    def entries(self, user_id: str, limit: int = 50) -> List[Dict]:
+        """A user's most recent ledger entries, newest first."""
+        return list(self._ledger.find({"user_id": user_id}, {"_id": 0}).sort("timestamp", -1).limit(limit))
+
+    # ---------------- Maintenance ----------------
+    def record_opening_balances(self) -> int:
+        """
+        Record each user's points not yet covered by the ledger (awarded before
+        it existed) as an "opening_balance" entry. Safe to run more than once.
+        """
+        totals = {row["_id"]: row["total"] for row in self._ledger.aggregate([
+            {"$group": {"_id": "$user_id", "total": {"$sum": "$delta"}}}
+        ])}
+        recorded = 0
+        for user in self._users.find({"clerk_id": {"$exists": True}}, {"_id": 0, "clerk_id": 1, "points": 1}):
+            missing = (user.get("points") or 0) - totals.get(user["clerk_id"], 0)
+            if missing and self.record(user["clerk_id"], missing, "opening_balance",
+                                       f"opening_balance:{user['clerk_id']}") is not None:
+                recorded += 1
+        print(f"✅ Recorded opening balances for {recorded} users")
+        return recorded
+
+    def _daily_totals(self, match: Dict) -> Dict[tuple, Dict]:
+        """Daily aggregate documents for the ledger entries matching `match`, keyed by (day, user_id)."""
+        daily = {}
+        for row in self._ledger.aggregate([
+            {"$match": match},
+            {"$group": {
+                "_id": {"day": "$day", "user_id": "$user_id", "source": "$source"},
+                "total": {"$sum": "$delta"},
+                "earned": {"$sum": {"$max": ["$delta", 0]}},
+                "spent": {"$sum": {"$max": [{"$multiply": ["$delta", -1]}, 0]}},
+                "events": {"$sum": 1}
+            }}
+        ], allowDiskUse=True):
+            key = (row["_id"]["day"], row["_id"]["user_id"])
+            doc = daily.setdefault(key, {"day": key[0], "user_id": key[1], "total": 0, "earned": 0, "spent": 0,
+                                         "events": 0, "by_source": {}})
+            for field in ("total", "earned", "spent", "events"):
+                doc[field] += row[field]
+            doc["by_source"][row["_id"]["source"]] = row["total"]
+        return daily
+
+    def _rebuild_daily(self) -> int:
+        """
+        Rebuild points_daily into a staging collection and rename it over the
+        live one, so readers never see it empty or half-built. Entries written
+        while the rebuild ran may have updated the replaced collection; their
+        days are recomputed from the ledger afterwards.
+        """
+        started = datetime.utcnow()
+        daily = self._daily_totals({"timestamp": {"$lt": started}})
+
+        name = self._daily.name
+        staging = self._daily.database[f"{name}_rebuild"]
+        staging.drop()
+        staging.create_indexes(INDEXES[name])
+        if daily:
+            staging.insert_many(list(daily.values()), ordered=False)
+        staging.rename(name, dropTarget=True)
+
+        # Timestamps come from each writer's clock, so look back past `started`
+        late = {(entry["day"], entry["user_id"]) for entry in self._ledger.find(
+            {"timestamp": {"$gte": started - LEDGER_CLOCK_SKEW}}, {"_id": 0, "day": 1, "user_id": 1}
+        )}
+        if late:
+            recomputed = self._daily_totals({"$or": [{"day": day, "user_id": user_id} for day, user_id in late]})
+            self._daily.bulk_write([
+                ReplaceOne({"day": day, "user_id": user_id}, doc, upsert=True)
+                for (day, user_id), doc in recomputed.items()
+            ], ordered=False)
+        return len(daily.keys() | late)
+
+    def _correct_balance(self, user_id: str, since: datetime) -> Optional[bool]:
+        """
+        Set one user's balance to their ledger total.
+
+        The user is read before their ledger, and users with entries newer than
+        `since` are skipped: an award appends its entry before its $inc, so a
+        recent entry may still be on its way to the balance. The update is
+        conditional on the balance that was read.
+
+        Returns:
+            True if corrected, False if it already matched, None if skipped
+        """
+        user = self._users.find_one({"clerk_id": user_id}, {"_id": 0, "points": 1})
+        if user is None:
+            return False
+        expected = next(iter(self._ledger.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$group": {"_id": None, "total": {"$sum": "$delta"}}}
+        ])), {}).get("total", 0)
+        if self._ledger.count_documents({"user_id": user_id, "timestamp": {"$gte": since}}, limit=1):
+            return None
+        if (user.get("points") or 0) == expected:
+            return False
+        result = self._users.update_one({"clerk_id": user_id, "points": user.get("points")},
+                                        {"$set": {"points": expected}})
+        return True if result.modified_count else None
+
+    def rebuild(self, apply: bool = False, force: bool = False) -> Dict:
+        """
+        Replay the ledger: recompute every balance and the daily aggregates.
+        Without apply, only reports users whose balance drifted from the ledger.
+
+        Args:
+            apply: Correct drifted balances and rebuild points_daily
+            force: Apply even though no opening balances were recorded
+
+        Returns:
+            {"users", "drifted"} plus "corrected", "skipped" and "daily" when applied
+        """
+        started = datetime.utcnow()
+        balances = {row["_id"]: row["total"] for row in self._ledger.aggregate([
+            {"$group": {"_id": "$user_id", "total": {"$sum": "$delta"}}}
+        ])}
+        drifted = {}
+        for user in self._users.find({"clerk_id": {"$exists": True}}, {"_id": 0, "clerk_id": 1, "points": 1}):
+            expected = balances.get(user["clerk_id"], 0)
+            if (user.get("points") or 0) != expected:
+                drifted[user["clerk_id"]] = {"balance": user.get("points") or 0, "ledger": expected}
+
+        print(f"{'⚠️' if drifted else '✅'} {len(drifted)} of {len(balances)} ledger balances drifted")
+        if not apply:
+            return {"users": len(balances), "drifted": drifted}
+
+        if not force and not self._ledger.count_documents({"source": "opening_balance"}, limit=1):
+            # Would reset every balance earned before the ledger existed
+            print("❌ No opening balances recorded; run --opening-balances first (or pass --force)")
+            return {"users": len(balances), "drifted": drifted, "applied": False}
+
+        # Each drifted user is re-read at apply time; the scan above may be stale
+        since = started - LEDGER_CLOCK_SKEW
+        outcomes = [self._correct_balance(user_id, since) for user_id in drifted]
+        corrected = outcomes.count(True)
+        skipped = outcomes.count(None)
+
+        daily = self._rebuild_daily()
+
+        print(f"✅ Rebuilt {corrected} balances ({skipped} with recent activity skipped, rerun later) "
+              f"and {daily} daily aggregates from the ledger")
+        return {"users": len(balances), "drifted": drifted, "corrected": corrected, "skipped": skipped,
+                "daily": daily, "applied": True}
+
+points_ledger = PointsLedger(points_ledger_collection, points_daily_collection, users_collection)
+
+
+if __name__ == "__main__":
+    if "--opening-balances" in sys.argv:
+        points_ledger.record_opening_balances()
+    if "--rebuild" in sys.argv:
+        points_ledger.rebuild(apply="--apply" in sys.argv, force="--force" in sys.argv)
@@ -0,0 +1,245 @@
+"""
+Reward Redemption
+Redeems a reward with conditional updates, so concurrent requests can neither
+oversell limited stock nor overdraw a user's points:
+
+- the stock is decremented only while `stock > 0` (-1 means unlimited),
+- the points are deducted only while `points >= points_required`,
+- the redemption record, the points-ledger entry and the activity entry are
+  written alongside.
+
+All of it runs in one transaction (retried on transient errors such as write
+conflicts). Deployments without transaction support (standalone servers) run
+the same conditional steps and undo the earlier ones if a later one fails.
+
+A client-supplied idempotency key makes retries return the original redemption.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from ..db import client, rewards_collection, redemptions_collection, users_collection
+from .activity import ActivityLog
+from .leaderboard import leaderboard
+from .points_ledger import points_ledger, points_ledger_collection
+from .rewards_catalog import rewards_catalog
+
+# Server error code for "transactions need a replica set or mongos"
+_TRANSACTIONS_UNSUPPORTED = 20
+
+
+class RedemptionError(Exception):
+    """A redemption the user cannot make (unknown reward, out of stock, too few points)."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class _Compensation:
+    """Undo steps for the non-transactional path, applied in reverse order."""
+
+    def __init__(self):
+        self.steps = []
+
+    def add(self, func, *args, **kwargs):
+        self.steps.append((func, args, kwargs))
+
+    def run(self):
+        for func, args, kwargs in reversed(self.steps):
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                print(f"❌ Redemption rollback step failed: {e}")
+
+
+def redemption_key(user_id: str, client_key: Optional[str]) -> Optional[str]:
+    """Idempotency key for a redemption, scoped to the user (None without a client key)."""
+    if not client_key:
+        return None
+    return f"redeem:{user_id}:{client_key.strip()[:128]}"
+
+
+def _reward_id(reward_id: str) -> ObjectId:
+    try:
+        return ObjectId(reward_id)
+    except (InvalidId, TypeError):
+        raise RedemptionError(404, "Reward not found")
+
+
+def _replay(existing: Dict) -> Dict:
+    """Result for a request whose idempotency key was already redeemed."""
+    user = users_collection.find_one({"clerk_id": existing["user_clerk_id"]}, {"_id": 0, "points": 1}) or {}
+    reward = existing.get("reward_details") or {"name": existing.get("reward_name")}
+    return {
+        "redemption_id": str(existing["_id"]),
+        "reward": reward,
+        "points_used": existing.get("points_used", 0),
+        "points_remaining": user.get("points", 0),
+        "limited_stock": existing.get("limited_stock", False),
+        "replayed": True
+    }
+
+
+def _redeem_steps(user_id: str, reward_oid: ObjectId, shipping_address: Optional[Dict[str, Any]],
+                  key: Optional[str], session=None, undo: Optional[_Compensation] = None) -> Dict:
+    """The conditional writes of one redemption, inside `session`'s transaction if given."""
+    reward = rewards_collection.find_one({"_id": reward_oid}, session=session)
+    if not reward:
+        raise RedemptionError(404, "Reward not found")
+    if not reward.get("active", False):
+        raise RedemptionError(400, "Reward is no longer available")
+
+    points_required = reward.get("points_required", 0)
+    limited_stock = reward.get("stock", 0) != -1
+
+    # 1. Take one unit of stock, only if there is one left
+    if limited_stock:
+        taken = rewards_collection.find_one_and_update(
+            {"_id": reward_oid, "active": True, "stock": {"$gt": 0}},
+            {"$inc": {"stock": -1}},
+            projection={"_id": 1},
+            session=session
+        )
+        if not taken:
+            raise RedemptionError(400, "Reward is out of stock")
+        if undo:
+            undo.add(rewards_collection.update_one, {"_id": reward_oid}, {"$inc": {"stock": 1}})
+
+    # 2. Deduct the points, only if the user still has enough
+    user = users_collection.find_one_and_update(
+        {"clerk_id": user_id, "points": {"$gte": points_required}},
+        {"$inc": {"points": -points_required}},
+        projection={"_id": 0, "points": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if not user:
+        current = users_collection.find_one({"clerk_id": user_id}, {"_id": 0, "points": 1}, session=session)
+        if not current:
+            raise RedemptionError(404, "User not found")
+        raise RedemptionError(
+            400, f"Insufficient points. You have {current.get('points', 0)}, but need {points_required}"
+        )
+    if undo:
+        undo.add(users_collection.update_one, {"clerk_id": user_id}, {"$inc": {"points": points_required}})
+
+    # 3. Record the redemption (the unique idempotency key rejects a concurrent retry)
+    reward_details = {
+        "name": reward["name"],
+        "description": reward.get("description"),
+        "category": reward.get("category")
+    }
+    redemption_data = {
+        "user_clerk_id": user_id,
+        "reward_id": str(reward_oid),
+        "reward_name": reward["name"],
+        "reward_details": reward_details,
+        "points_used": points_required,
+        "limited_stock": limited_stock,
+        "shipping_address": shipping_address,
+        "status": "pending",  # pending, shipped, delivered
+        "redemption_date": datetime.utcnow(),
+        "tracking_number": None
+    }
+    if key:
+        redemption_data["idempotency_key"] = key
+    redemption_id = str(redemptions_collection.insert_one(redemption_data, session=session).inserted_id)
+    if undo:
+        undo.add(redemptions_collection.delete_one, {"_id": ObjectId(redemption_id)})
+
+    # 4. Ledger entry for the deduction already applied to the balance above
+    ledger_entry = points_ledger.record(user_id, -points_required, "redemption", key, redemption_id,
+                                        session=session)
+    if undo and ledger_entry:
+        undo.add(points_ledger_collection.delete_one, {"idempotency_key": ledger_entry["idempotency_key"]})
+
+    # 5. Activity entry, committed together with the points it describes
+    ActivityLog.log(
+        user_id,
+        "reward_redemption",
+        {
+            "redemption_id": redemption_id,
+            "reward_name": reward["name"],
+            "points_used": points_required,
+            "date": redemption_data["redemption_date"]
+        },
+        summary=f"Redeemed {reward['name']} for {points_required} points",
+        session=session
+    )
+
+    return {
+        "redemption_id": redemption_id,
+        "reward": reward_details,
+        "points_used": points_required,
+        "points_remaining": user.get("points", 0),
+        "limited_stock": limited_stock,
+        "ledger_entry": ledger_entry,
+        "replayed": False
+    }
+
+
+def _redeem_without_transaction(user_id: str, reward_oid: ObjectId, shipping_address, key) -> Dict:
+    undo = _Compensation()
+    try:
+        return _redeem_steps(user_id, reward_oid, shipping_address, key, undo=undo)
+    except BaseException:
+        undo.run()
+        raise
+
+
+def redeem(user_id: str, reward_id: str, shipping_address: Optional[Dict[str, Any]] = None,
+           idempotency_key: Optional[str] = None) -> Dict:
+    """
+    Redeem a reward for a user.
+
+    Args:
+        user_id: Clerk user ID
+        reward_id: Reward ObjectId as a string
+        shipping_address: Optional shipping details stored on the redemption
+        idempotency_key: Optional client key; repeating it returns the first result
+
+    Returns:
+        {"redemption_id", "reward", "points_used", "points_remaining", "limited_stock", "replayed"}
+
+    Raises:
+        RedemptionError: The reward or user does not exist, the reward is
+            inactive or out of stock, or the user has too few points
+    """
+    reward_oid = _reward_id(reward_id)
+    key = redemption_key(user_id, idempotency_key)
+
+    if key:
+        existing = redemptions_collection.find_one({"idempotency_key": key})
+        if existing:
+            return _replay(existing)
+
+    try:
+        try:
+            with client.start_session() as session:
+                result = session.with_transaction(
+                    lambda s: _redeem_steps(user_id, reward_oid, shipping_address, key, session=s)
+                )
+        except OperationFailure as e:
+            if e.code != _TRANSACTIONS_UNSUPPORTED:
+                raise
+            result = _redeem_without_transaction(user_id, reward_oid, shipping_address, key)
+    except DuplicateKeyError:
+        # A concurrent request with the same key won the race
+        existing = redemptions_collection.find_one({"idempotency_key": key}) if key else None
+        if not existing:
+            raise
+        return _replay(existing)
+
+    ledger_entry = result.pop("ledger_entry", None)
+    if ledger_entry:
+        points_ledger.update_aggregates(ledger_entry)
+    leaderboard.record_points(user_id, -result["points_used"])
+    if result["limited_stock"]:
+        rewards_catalog.invalidate()
+    return result
@@ -0,0 +1,89 @@
+"""
+Component Registry
+Builds expensive components (CrewAI crews and their imports) on first use
+instead of at import time, or ahead of traffic in a parallel warm-up.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .executor import run_blocking
+
+# Components built by warm_up() at the same time
+COMPONENT_WARMUP_WORKERS = int(os.getenv("COMPONENT_WARMUP_WORKERS", "4"))
+
+
+class ComponentRegistry:
+    """
+    Named factories whose products are built once, on first get().
+    Concurrent first calls wait for a single build.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._build_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register a zero-argument factory; nothing is built yet."""
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str) -> Any:
+        """Return the component, building it on first use (blocking)."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        if name not in self._factories:
+            raise KeyError(f"Unknown component: {name}")
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                instance = self._factories[name]()
+                self._build_seconds[name] = time.perf_counter() - started
+                self._instances[name] = instance
+                print(f"✅ Built component '{name}' in {self._build_seconds[name]:.2f}s")
+        return instance
+
+    async def aget(self, name: str) -> Any:
+        """Async get(): a first build runs on the worker pool, not the event loop."""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await run_blocking(self.get, name)
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Build the given (default: all) components in parallel; returns build times."""
+        names = list(names or self._factories)
+        started = time.perf_counter()
+
+        def build(name):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"❌ Component '{name}' failed to build: {e}")
+
+        with ThreadPoolExecutor(max_workers=COMPONENT_WARMUP_WORKERS, thread_name_prefix="warmup") as pool:
+            list(pool.map(build, names))
+
+        print(f"✅ Warm-up finished in {time.perf_counter() - started:.2f}s ({', '.join(names)})")
+        return {name: self._build_seconds.get(name) for name in names}
+
+    def stats(self) -> Dict:
+        return {
+            name: {"built": name in self._instances, "build_seconds": self._build_seconds.get(name)}
+            for name in self._factories
+        }
+
+
+registry = ComponentRegistry()
@@ -0,0 +1,147 @@
+"""
+Rewards Catalogue
+In-process snapshot of the active rewards, sorted by points_required, so the
+catalogue endpoints and the affordability check in /my-points never query
+MongoDB. The snapshot carries a version (used as the HTTP ETag) and is rebuilt
+after admin writes and redemptions, on change-stream events when enabled, and
+every REWARDS_CATALOG_TTL_SECONDS to pick up writes made by other workers.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import OperationFailure
+
+from ..db import rewards_collection, rewards_read_collection
+
+# Upper bound on how stale a worker's catalogue can be without an invalidation
+REWARDS_CATALOG_TTL_SECONDS = int(os.getenv("REWARDS_CATALOG_TTL_SECONDS", "60"))
+
+# Watch the rewards collection for changes (requires a replica set)
+REWARDS_CHANGE_STREAM = os.getenv("REWARDS_CHANGE_STREAM", "0") == "1"
+
+
+class CatalogSnapshot:
+    """Immutable view of the active rewards, JSON-ready, sorted by points_required."""
+
+    def __init__(self, rewards: List[Dict]):
+        self.rewards = rewards
+        self.points = [reward.get("points_required", 0) for reward in rewards]
+        self.by_category: Dict[str, List[Dict]] = {}
+        for reward in rewards:
+            self.by_category.setdefault(reward.get("category"), []).append(reward)
+        self.categories = sorted(category for category in self.by_category if category is not None)
+
+        digest = hashlib.sha1(json.dumps(rewards, sort_keys=True).encode("utf-8")).hexdigest()
+        self.etag = f'"{digest[:16]}"'
+        self.loaded_at = time.time()
+
+    def affordable(self, points: int) -> List[Dict]:
+        """In-stock rewards costing at most `points` (binary search on the sorted costs)."""
+        return [
+            reward for reward in self.rewards[:bisect_right(self.points, points)]
+            if reward.get("stock", 0) > 0 or reward.get("stock") == -1
+        ]
+
+
+class RewardsCatalog:
+    """
+    Read-through cache of the rewards catalogue.
+
+    Args:
+        collection: Primary collection, read after an explicit invalidation so
+            a worker always sees its own writes.
+        reader: Collection used for periodic refreshes (may read from a secondary).
+    """
+
+    def __init__(self, collection, reader=None):
+        self._collection = collection
+        self._reader = reader if reader is not None else collection
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._dirty = True
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.loads = 0
+
+    def _load(self, source) -> CatalogSnapshot:
+        rewards = list(source.find({"active": True}).sort("points_required", 1))
+        for reward in rewards:
+            reward["_id"] = str(reward["_id"])
+        return CatalogSnapshot(jsonable_encoder(rewards))
+
+    def snapshot(self) -> CatalogSnapshot:
+        """Current catalogue, reloaded first if it was invalidated or has expired."""
+        snapshot = self._snapshot
+        if snapshot and not self._dirty and time.time() - snapshot.loaded_at < REWARDS_CATALOG_TTL_SECONDS:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot and not self._dirty and time.time() - snapshot.loaded_at < REWARDS_CATALOG_TTL_SECONDS:
+                self.hits += 1
+                return snapshot
+            dirty = self._dirty
+            self._dirty = False
+            try:
+                self._snapshot = self._load(self._collection if dirty else self._reader)
+            except Exception:
+                self._dirty = dirty
+                raise
+            self.loads += 1
+            return self._snapshot
+
+    def invalidate(self):
+        """Drop the snapshot after a catalogue write (create, toggle, stock change)."""
+        self._dirty = True
+
+    # ---------------- Change stream ----------------
+    def start_watching(self):
+        """Invalidate on every change to the rewards collection, from any worker."""
+        if not REWARDS_CHANGE_STREAM or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="rewards-catalog-watch", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                with self._collection.watch(max_await_time_ms=1000) as stream:
+                    print("✅ Watching rewards collection for catalogue changes")
+                    while not self._stop.is_set() and stream.alive:
+                        if stream.try_next() is not None:
+                            self.invalidate()
+            except OperationFailure as e:
+                # Standalone servers have no change streams: fall back to the TTL
+                print(f"⚠️ Rewards change stream unavailable, using {REWARDS_CATALOG_TTL_SECONDS}s refresh: {e}")
+                return
+            except Exception as e:
+                # Events may have been missed while disconnected
+                self.invalidate()
+                print(f"⚠️ Rewards change stream interrupted, reconnecting: {e}")
+                self._stop.wait(5.0)
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            "rewards": len(snapshot.rewards) if snapshot else 0,
+            "etag": snapshot.etag if snapshot else None,
+            "age_seconds": round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+            "hits": self.hits,
+            "loads": self.loads,
+            "watching": bool(self._watcher and self._watcher.is_alive())
+        }
+
+
+rewards_catalog = RewardsCatalog(rewards_collection, rewards_read_collection)
@@ -0,0 +1,35 @@
+"""
+Safety Rules
+Term lists and compiled patterns behind the Responsible AI crew's rule-based
+checks, kept free of CrewAI so they are cheap to import and test.
+"""
+import re
+
+# Blocked outright, without an LLM audit
+FORBIDDEN_TERMS = ["kill", "hack", "bomb", "burn waste with acid", "rm -rf /"]
+
+# Not blocked, but sent to the LLM auditor before the response is returned
+REVIEW_TERMS = ["acid", "explosive", "poison", "weapon", "burn", "toxic fumes", "inject"]
+
+
+def compile_terms(terms: list) -> re.Pattern:
+    """
+    One case-insensitive pattern matching any of `terms` as whole words.
+
+    A term must start and end at a word boundary, so "skill", "hacksaw",
+    "killer whale" and "bombay" do not match; a plural "s" is allowed
+    ("bombs"). Terms ending in punctuation ("rm -rf /") are only anchored
+    at the start.
+    """
+    def alternative(term: str) -> str:
+        if term[-1].isalnum() or term[-1] == "_":
+            return rf"{re.escape(term)}s?(?!\w)"
+        return re.escape(term)
+
+    # Longest terms first, so a phrase wins over a word it starts with
+    alternatives = "|".join(alternative(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternatives})", re.IGNORECASE)
+
+
+FORBIDDEN_PATTERN = compile_terms(FORBIDDEN_TERMS)
+REVIEW_PATTERN = compile_terms(REVIEW_TERMS)
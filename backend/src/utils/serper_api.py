@@ -1,46 +1,89 @@
-import requests
 import os
+import json
+from .http_client import get_client
+from .cache import TTLCache, SingleFlight, CACHE_DB_PATH
+
+# Search results keyed on the normalized payload; identical concurrent
+# queries share one outbound call
+search_cache = TTLCache(
+    "serper_search",
+    maxsize=int(os.getenv("SERPER_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("SERPER_CACHE_TTL", str(24 * 3600))),
+    disk_path=CACHE_DB_PATH
+)
+_inflight = SingleFlight()
+
+# Empty results may be a transient hiccup, so they are only remembered briefly
+SERPER_NEGATIVE_CACHE_TTL = int(os.getenv("SERPER_NEGATIVE_CACHE_TTL", "300"))
+
+
+def _cache_key(payload) -> str:
+    normalized = {
+        key: " ".join(value.lower().split()) if isinstance(value, str) else value
+        for key, value in (payload or {}).items()
+    }
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def cached_search(payload):
+    """Cached result for a payload, or None; never calls the API."""
+    return search_cache.get(_cache_key(payload))
+
 
 def search_serper(payload):
-    API_KEY = os.getenv("SERPER_API_KEY")
-    headers = {"X-API-KEY": API_KEY, "Content-Type": "application/json"}
+    key = _cache_key(payload)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
 
     try:
-        response = requests.post("https://google.serper.dev/search", headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-
-        sources = []
-
-        # Organic results
-        for item in data.get("organic", [])[:3]:  # take top 3
-            sources.append({
-                "title": item.get("title"),
-                "link": item.get("link"),
-                "snippet": item.get("snippet")
-            })
-
-        # Related questions
-        for item in data.get("related_questions", [])[:2]:
-            sources.append({
-                "title": item.get("question"),
-                "link": item.get("link", "N/A"),
-                "snippet": item.get("snippet", "")
-            })
-
-        # Knowledge graph
-        if data.get("knowledge_graph"):
-            kg = data["knowledge_graph"]
-            sources.append({
-                "title": kg.get("title"),
-                "link": kg.get("website", "N/A"),
-                "snippet": kg.get("description", "")
-            })
-
-        if not sources:
-            return {"summary": "No results found from Serper API.", "sources": []}
-
-        return {"summary": sources[0]["snippet"], "sources": sources}
-
+        return _inflight.do(key, _search_and_cache, key, payload)
     except Exception as e:
         return {"summary": f"Error querying Serper API: {e}", "sources": []}
+
+
+def _search_and_cache(key, payload):
+    result = _search(payload)
+    search_cache.set(key, result, ttl=None if result.get("sources") else SERPER_NEGATIVE_CACHE_TTL)
+    return result
+
+
+def _search(payload):
+    API_KEY = os.getenv("SERPER_API_KEY")
+    headers = {"X-API-KEY": API_KEY, "Content-Type": "application/json"}
+
+    response = get_client("serper").post("https://google.serper.dev/search", headers=headers, json=payload)
+    response.raise_for_status()
+    data = response.json()
+
+    sources = []
+
+    # Organic results
+    for item in data.get("organic", [])[:3]:  # take top 3
+        sources.append({
+            "title": item.get("title"),
+            "link": item.get("link"),
+            "snippet": item.get("snippet")
+        })
+
+    # Related questions
+    for item in data.get("related_questions", [])[:2]:
+        sources.append({
+            "title": item.get("question"),
+            "link": item.get("link", "N/A"),
+            "snippet": item.get("snippet", "")
+        })
+
+    # Knowledge graph
+    if data.get("knowledge_graph"):
+        kg = data["knowledge_graph"]
+        sources.append({
+            "title": kg.get("title"),
+            "link": kg.get("website", "N/A"),
+            "snippet": kg.get("description", "")
+        })
+
+    if not sources:
+        return {"summary": "No results found from Serper API.", "sources": []}
+
+    return {"summary": sources[0]["snippet"], "sources": sources}
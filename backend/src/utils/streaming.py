@@ -0,0 +1,40 @@
+"""
+Token streaming helpers.
+Streams completions straight from LiteLLM (the client CrewAI uses underneath)
+and formats Server-Sent Events for FastAPI StreamingResponse.
+"""
+import json
+from typing import Iterator, Optional
+
+
+def stream_completion(model: str, prompt: str, system: Optional[str] = None) -> Iterator[str]:
+    """
+    Yield text deltas from a streaming chat completion.
+
+    Args:
+        model: LiteLLM model name (e.g. "gpt-4o-mini")
+        prompt: User prompt
+        system: Optional system prompt (agent role / backstory)
+    """
+    import litellm
+
+    messages = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+
+    for chunk in litellm.completion(model=model, messages=messages, stream=True):
+        choices = getattr(chunk, "choices", None) or []
+        delta = getattr(choices[0], "delta", None) if choices else None
+        text = getattr(delta, "content", None) if delta else None
+        if text:
+            yield text
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Headers that stop proxies from buffering an event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
@@ -0,0 +1,252 @@
+"""
+Background Task Queue
+Runs request side effects (chat memory, activity logging, point awards) after
+the response has been sent.
+
+Jobs are recorded in the jobs collection (in batches) before they run and are
+marked done afterwards, so a job interrupted by a crash or an error is picked
+up again by any worker once its lease expires (at-least-once). Every job has
+an idempotency key; handlers pass it down to their writes so a job that runs
+twice, or two requests sharing a key, never award points twice.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import BulkWriteError
+
+from ..db import db
+
+jobs_collection = db["jobs"]
+
+# Jobs written / marked done per round trip, and how long to wait to fill a batch
+TASK_QUEUE_BATCH_SIZE = int(os.getenv("TASK_QUEUE_BATCH_SIZE", "50"))
+TASK_QUEUE_FLUSH_SECONDS = float(os.getenv("TASK_QUEUE_FLUSH_SECONDS", "0.05"))
+
+# A claimed job not finished within the lease is retried by any worker
+TASK_QUEUE_LEASE_SECONDS = int(os.getenv("TASK_QUEUE_LEASE_SECONDS", "60"))
+TASK_QUEUE_RECOVERY_SECONDS = int(os.getenv("TASK_QUEUE_RECOVERY_SECONDS", "30"))
+TASK_QUEUE_MAX_ATTEMPTS = int(os.getenv("TASK_QUEUE_MAX_ATTEMPTS", "5"))
+
+
+def new_idempotency_key(user_id: str, kind: str, client_key: Optional[str] = None) -> str:
+    """
+    Idempotency key for a job. A client-supplied key (e.g. the Idempotency-Key
+    header) is scoped to the user and job kind; otherwise a random one is used.
+    """
+    if client_key:
+        return f"{kind}:{user_id}:{client_key.strip()[:128]}"
+    return f"{kind}:{user_id}:{uuid.uuid4().hex}"
+
+
+class TaskQueue:
+    """
+    In-process worker that persists, runs and acknowledges jobs in batches.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._handlers: Dict[str, Callable] = {}
+        self._queue: "queue.Queue[dict]" = queue.Queue()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.processed = 0
+        self.duplicates = 0
+        self.failures = 0
+
+    # ---------------- Registration ----------------
+    def handler(self, kind: str):
+        """Decorator registering the function that runs jobs of this kind."""
+        def register(func: Callable):
+            self._handlers[kind] = func
+            return func
+        return register
+
+    # ---------------- Producer side ----------------
+    def enqueue(self, kind: str, key: str, **payload) -> str:
+        """
+        Queue a job; returns immediately. The handler is called as
+        handler(key, **payload) on the worker thread.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        self.start()
+        self._queue.put({
+            "_id": key,
+            "kind": kind,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": datetime.utcnow()
+        })
+        return key
+
+    # ---------------- Lifecycle ----------------
+    def start(self):
+        if self._worker and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker and self._worker.is_alive():
+                return
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name="task-queue", daemon=True)
+            self._worker.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Finish queued jobs (up to timeout) and stop the worker."""
+        self._stop.set()
+        if self._worker:
+            self._worker.join(timeout)
+
+    def stats(self) -> Dict:
+        return {
+            "queued": self._queue.qsize(),
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+            "failures": self.failures
+        }
+
+    # ---------------- Worker ----------------
+    def _run(self):
+        next_recovery = 0.0
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                try:
+                    jobs = self._persist(batch)
+                except Exception as e:
+                    if self._stop.is_set():
+                        print(f"❌ Task queue dropping {len(batch)} job(s) at shutdown: {e}")
+                        continue
+                    # Not recorded yet: keep the jobs in memory and try again shortly
+                    print(f"⚠️ Task queue could not record {len(batch)} job(s), retrying: {e}")
+                    for job in batch:
+                        self._queue.put(job)
+                    self._stop.wait(1.0)
+                    continue
+                try:
+                    self._process(jobs)
+                except Exception as e:
+                    print(f"❌ Task queue batch failed: {e}")
+
+            if time.time() >= next_recovery and not self._stop.is_set():
+                next_recovery = time.time() + TASK_QUEUE_RECOVERY_SECONDS
+                try:
+                    self._process(self._claim_expired())
+                except Exception as e:
+                    print(f"⚠️ Task queue recovery failed: {e}")
+
+    def _next_batch(self) -> List[dict]:
+        try:
+            batch = [self._queue.get(timeout=1.0)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + TASK_QUEUE_FLUSH_SECONDS
+        while len(batch) < TASK_QUEUE_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _persist(self, jobs: List[dict]) -> List[dict]:
+        """
+        Record new jobs with a lease held by this worker, in one insert.
+        Jobs whose key is already recorded are dropped as duplicates; jobs
+        that failed to insert for any other reason are queued again (up to
+        TASK_QUEUE_MAX_ATTEMPTS times), so only recorded jobs are returned.
+        """
+        lease_until = datetime.utcnow() + timedelta(seconds=TASK_QUEUE_LEASE_SECONDS)
+        unique = {}
+        for job in jobs:
+            job["lease_until"] = lease_until
+            unique.setdefault(job["_id"], job)
+        self.duplicates += len(jobs) - len(unique)
+        jobs = list(unique.values())
+
+        try:
+            self._collection.insert_many(jobs, ordered=False)
+            return jobs
+        except BulkWriteError as e:
+            errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+            recorded = []
+            for index, job in enumerate(jobs):
+                err = errors.get(index)
+                if err is None:
+                    recorded.append(job)
+                elif err.get("code") == 11000:
+                    self.duplicates += 1
+                else:
+                    self._requeue_unrecorded(job, err.get("errmsg"))
+            return recorded
+
+    def _requeue_unrecorded(self, job: dict, error: str):
+        attempts = job.pop("persist_attempts", 0) + 1
+        if attempts >= TASK_QUEUE_MAX_ATTEMPTS or self._stop.is_set():
+            self.failures += 1
+            print(f"❌ Job {job['_id']} ({job['kind']}) could not be recorded, dropping: {error}")
+            return
+        print(f"⚠️ Job {job['_id']} ({job['kind']}) could not be recorded, retrying: {error}")
+        job["persist_attempts"] = attempts
+        self._queue.put(job)
+
+    def _claim_expired(self) -> List[dict]:
+        """Claim pending jobs whose lease has expired (crashed or failed runs)."""
+        claimed = []
+        now = datetime.utcnow()
+        while len(claimed) < TASK_QUEUE_BATCH_SIZE:
+            job = self._collection.find_one_and_update(
+                {"status": "pending", "lease_until": {"$lt": now}},
+                {"$set": {"lease_until": now + timedelta(seconds=TASK_QUEUE_LEASE_SECONDS)}}
+            )
+            if not job:
+                break
+            claimed.append(job)
+        if claimed:
+            print(f"🔁 Task queue retrying {len(claimed)} job(s)")
+        return claimed
+
+    def _process(self, jobs: List[dict]):
+        if not jobs:
+            return
+
+        done, updates = [], []
+        for job in jobs:
+            try:
+                self._handlers[job["kind"]](job["_id"], **job.get("payload", {}))
+                done.append(job["_id"])
+            except Exception as e:
+                self.failures += 1
+                attempts = job.get("attempts", 0) + 1
+                status = "failed" if attempts >= TASK_QUEUE_MAX_ATTEMPTS else "pending"
+                print(f"⚠️ Job {job['_id']} ({job['kind']}) failed, attempt {attempts}: {e}")
+                updates.append(UpdateOne(
+                    {"_id": job["_id"]},
+                    {"$set": {
+                        "status": status,
+                        "attempts": attempts,
+                        "error": str(e)[:500],
+                        # Exponential backoff before another worker may retry it
+                        "lease_until": datetime.utcnow() + timedelta(seconds=min(2 ** attempts * 5, 3600))
+                    }}
+                ))
+
+        if done:
+            updates.append(UpdateMany(
+                {"_id": {"$in": done}},
+                {"$set": {"status": "done", "finished_at": datetime.utcnow()}}
+            ))
+            self.processed += len(done)
+        self._collection.bulk_write(updates, ordered=False)
+
+
+task_queue = TaskQueue(jobs_collection)
@@ -0,0 +1,123 @@
+"""
+Token counting and prompt budgeting.
+Uses tiktoken when it is installed (it ships with LiteLLM / CrewAI) and falls
+back to a ~4 characters per token estimate otherwise. All truncation is
+deterministic, so the same inputs always produce the same prompt.
+"""
+from typing import Dict
+
+ELLIPSIS = " …"
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (estimated when tiktoken is unavailable)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """
+    Shorten text to at most max_tokens.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token limit
+        keep: "head" keeps the beginning, "tail" keeps the end (whole lines
+              are dropped from the start first, so the newest lines survive)
+
+    Returns:
+        The text, or a truncated copy marked with an ellipsis
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    if keep == "tail":
+        lines = text.splitlines()
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+            lines.pop(0)
+        text = "\n".join(lines)
+        if count_tokens(text) <= max_tokens:
+            return text
+
+    # Longest prefix / suffix (in characters) that fits alongside the ellipsis
+    limit = max_tokens - count_tokens(ELLIPSIS)
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        piece = text[:mid] if keep == "head" else text[-mid:]
+        if count_tokens(piece) <= limit:
+            low = mid
+        else:
+            high = mid - 1
+
+    if keep == "head":
+        piece = text[:low]
+        # Cut at a word boundary rather than mid-word
+        if low < len(text) and " " in piece:
+            piece = piece.rsplit(" ", 1)[0]
+        return piece.rstrip() + ELLIPSIS if piece.strip() else ""
+
+    piece = text[len(text) - low:] if low else ""
+    if low < len(text) and " " in piece:
+        piece = piece.split(" ", 1)[1]
+    return ELLIPSIS.strip() + " " + piece.lstrip() if piece.strip() else ""
+
+
+def allocate_budget(budget: int, demands: Dict[str, int], shares: Dict[str, float]) -> Dict[str, int]:
+    """
+    Split a token budget across prompt sections.
+
+    Each section gets up to its share of the budget; whatever a section does
+    not need is handed to the sections that still want more, in proportion
+    to their shares.
+
+    Args:
+        budget: Total tokens available
+        demands: Tokens each section would use untruncated
+        shares: Relative weight of each section (1.0 if missing)
+
+    Returns:
+        Tokens allotted to each section (never more than its demand)
+    """
+    allotted = {name: 0 for name in demands}
+    remaining = max(budget, 0)
+
+    while remaining > 0:
+        wanting = [name for name in demands if allotted[name] < demands[name]]
+        if not wanting:
+            break
+        total_share = sum(shares.get(name, 1.0) for name in wanting)
+        given = 0
+        for name in wanting:
+            portion = max(int(remaining * shares.get(name, 1.0) / total_share), 1)
+            portion = min(portion, demands[name] - allotted[name], remaining - given)
+            allotted[name] += portion
+            given += portion
+            if given >= remaining:
+                break
+        if given == 0:
+            break
+        remaining -= given
+
+    return allotted
@@ -0,0 +1,59 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from src.utils import activity
+from src.utils.activity import ActivityLog
+
+
+class MigrateEmbeddedHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.user_oid = ObjectId()
+        self.users = mock.Mock()
+        self.users.find.return_value = [{"_id": self.user_oid, "clerk_id": "u1", "history": [
+            {"type": "reward_redemption", "date": datetime(2024, 3, 1, 12, 0)},
+            {"type": "quiz_attempt", "timestamp": "2024-03-02T08:30:00Z"},
+            "legacy",
+        ]}]
+        self.activity = mock.Mock()
+        for name, value in (("users_collection", self.users), ("activity_collection", self.activity)):
+            patcher = mock.patch.object(activity, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_entries_keep_their_time_and_get_deterministic_keys(self):
+        self.activity.insert_many.return_value = mock.Mock(inserted_ids=[1, 2, 3])
+
+        self.assertEqual(ActivityLog.migrate_embedded_history(), 3)
+        entries = self.activity.insert_many.call_args[0][0]
+        self.assertEqual([entry["idempotency_key"] for entry in entries],
+                         [f"migrated:{self.user_oid}:{index}" for index in range(3)])
+        self.assertEqual(entries[0]["timestamp"], datetime(2024, 3, 1, 12, 0))
+        self.assertEqual(entries[1]["timestamp"], datetime(2024, 3, 2, 8, 30))
+        self.assertEqual(entries[2]["timestamp"], self.user_oid.generation_time.replace(tzinfo=None))
+        self.users.update_one.assert_called_once_with({"_id": self.user_oid}, {"$unset": {"history": ""}})
+
+    def test_rerun_skips_entries_already_moved(self):
+        self.activity.insert_many.side_effect = BulkWriteError({
+            "nInserted": 1,
+            "writeErrors": [{"index": 0, "code": 11000}, {"index": 1, "code": 11000}]
+        })
+
+        self.assertEqual(ActivityLog.migrate_embedded_history(), 1)
+        self.users.update_one.assert_called_once()
+
+    def test_other_write_errors_keep_the_history(self):
+        self.activity.insert_many.side_effect = BulkWriteError({
+            "nInserted": 0, "writeErrors": [{"index": 0, "code": 121}]
+        })
+
+        with self.assertRaises(BulkWriteError):
+            ActivityLog.migrate_embedded_history()
+        self.users.update_one.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
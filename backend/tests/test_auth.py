@@ -0,0 +1,38 @@
+import time
+import unittest
+from unittest import mock
+
+from src.utils.auth import JWKS_MIN_REFETCH_INTERVAL, JWKSCache
+
+
+class JWKSCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = JWKSCache()
+        patcher = mock.patch("src.utils.auth.threading.Thread")
+        self.thread = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _cache_entry(self, ttl, remaining):
+        self.cache._issuers["https://issuer"] = {"keys": {"kid": "key"}, "expires_at": time.time() + remaining,
+                                                 "ttl": ttl}
+
+    def test_short_lived_entries_are_not_refreshed_right_away(self):
+        self._cache_entry(ttl=JWKS_MIN_REFETCH_INTERVAL, remaining=JWKS_MIN_REFETCH_INTERVAL - 1)
+
+        self.assertEqual(self.cache.cached_key("https://issuer", "kid"), "key")
+        self.thread.assert_not_called()
+
+    def test_background_refresh_is_rate_limited(self):
+        self._cache_entry(ttl=3600, remaining=60)
+        self.cache._last_attempt["https://issuer"] = time.time()
+
+        self.assertEqual(self.cache.cached_key("https://issuer", "kid"), "key")
+        self.thread.assert_not_called()
+
+        self.cache._last_attempt["https://issuer"] = time.time() - JWKS_MIN_REFETCH_INTERVAL
+        self.cache.cached_key("https://issuer", "kid")
+        self.thread.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from src.utils.cache import SingleFlight, TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+    def test_hit_miss_and_expiry(self):
+        cache = TTLCache("test-expiry", maxsize=4, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=0)  # per-entry ttl overrides the default
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("missing", "default"), "default")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache("test-lru", maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_stale_entries_are_served_inside_the_stale_window(self):
+        cache = TTLCache("test-stale", ttl=60, stale_ttl=60)
+        cache.set("fresh", "new")
+        cache.set("expired", "old", ttl=-1)
+        cache.set("gone", "older", ttl=-120)
+
+        self.assertEqual(cache.get_stale("fresh"), ("new", True))
+        self.assertEqual(cache.get_stale("expired"), ("old", False))
+        self.assertEqual(cache.get_stale("gone"), (None, False))
+
+    def test_disk_tier_is_shared_between_caches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            TTLCache("test-disk", ttl=60, disk_path=path).set("key", {"category": "recyclable"})
+
+            reader = TTLCache("test-disk", ttl=60, disk_path=path)
+            self.assertEqual(reader.get("key"), {"category": "recyclable"})
+            self.assertEqual(reader.stats()["disk_hits"], 1)
+
+            reader.delete("key")
+            self.assertIsNone(TTLCache("test-disk", ttl=60, disk_path=path).get("key"))
+
+
+class SingleFlightTest(unittest.TestCase):
+    def _run_concurrently(self, flight, func, callers=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flight.do("key", func))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def search():
+            calls.append(1)
+            release.wait(1)
+            return "result"
+
+        threads, results, _ = self._run_concurrently(flight, search)
+        while flight.coalesced < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["result"] * 5)
+
+    def test_waiters_get_the_exception_and_the_key_is_released(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(1)
+            raise ValueError("quota exceeded")
+
+        threads, results, errors = self._run_concurrently(flight, failing, callers=3)
+        while flight.coalesced < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ["quota exceeded"] * 3)
+        self.assertEqual(flight.do("key", lambda: "retried"), "retried")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+
+from src.utils import executor
+
+
+class RunBlockingTest(unittest.TestCase):
+    def tearDown(self):
+        executor.shutdown_executor()
+
+    def test_result_is_returned(self):
+        self.assertEqual(asyncio.run(executor.run_blocking(sum, [1, 2, 3])), 6)
+
+    def test_saturated_pool_fails_fast_with_503(self):
+        release = threading.Event()
+
+        async def scenario():
+            executor._slots = asyncio.Semaphore(1)
+            busy = asyncio.ensure_future(executor.run_blocking(release.wait, 2))
+            await asyncio.sleep(0.05)
+            try:
+                with self.assertRaises(HTTPException) as raised:
+                    await executor.run_blocking(sum, [1])
+            finally:
+                release.set()
+                await busy
+            # The slot is free again once the first call is done
+            self.assertEqual(await executor.run_blocking(sum, [1]), 1)
+            return raised.exception
+
+        with mock.patch.object(executor, "BLOCKING_QUEUE_TIMEOUT", 0.1):
+            error = asyncio.run(scenario())
+        self.assertEqual(error.status_code, 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
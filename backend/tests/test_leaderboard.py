@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+
+from src.utils.leaderboard import LeaderboardService, RankedBoard
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for LeaderboardService."""
+
+    def __init__(self, docs=None, delay: float = 0.0):
+        self.docs = list(docs or [])
+        self.delay = delay
+
+    def find(self, query=None, projection=None):
+        time.sleep(self.delay)
+        query = query or {}
+        return [dict(doc) for doc in self.docs if all(doc.get(k) == v for k, v in query.items())]
+
+    def bulk_write(self, requests, ordered=True):
+        pass
+
+
+class RankedBoardTest(unittest.TestCase):
+    def test_rank_counts_users_with_strictly_more_points(self):
+        board = RankedBoard()
+        for clerk_id, score in {"a": 50, "b": 30, "c": 30, "d": 10}.items():
+            board.set_score(clerk_id, score)
+
+        self.assertEqual(board.rank_of_score(50), 1)
+        self.assertEqual(board.rank_of_score(30), 2)
+        self.assertEqual(board.rank_of_score(10), 4)
+        self.assertEqual(board.top(3), [("a", 50), ("b", 30), ("c", 30)])
+
+    def test_negative_scores_rank_by_value(self):
+        board = RankedBoard()
+        for clerk_id, score in {"a": 0, "b": -5, "c": -20}.items():
+            board.set_score(clerk_id, score)
+
+        self.assertEqual(board.rank_of_score(0), 1)
+        self.assertEqual(board.rank_of_score(-5), 2)
+        self.assertEqual(board.rank_of_score(-20), 3)
+
+    def test_huge_scores_do_not_allocate_per_point(self):
+        board = RankedBoard()
+        board.set_score("whale", 10 ** 12)
+        board.set_score("minnow", 1)
+
+        self.assertEqual(board.rank_of_score(10 ** 12), 1)
+        self.assertEqual(board.rank_of_score(1), 2)
+        self.assertEqual(len(board._sorted), 2)
+
+    def test_score_changes_move_the_user(self):
+        board = RankedBoard()
+        board.set_score("a", 10)
+        board.set_score("b", 20)
+        board.add("a", 15)
+
+        self.assertEqual(board.score("a"), 25)
+        self.assertEqual(board.top(1), [("a", 25)])
+        self.assertEqual(board.rank_of_score(board.score("b")), 2)
+        self.assertEqual(len(board), 2)
+
+
+class LeaderboardServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.users = FakeCollection([
+            {"clerk_id": "a", "points": 40, "name": "Ann"},
+            {"clerk_id": "b", "points": 10, "name": "Ben"},
+        ])
+        self.service = LeaderboardService(self.users, FakeCollection())
+
+    def test_top_and_rank(self):
+        self.assertEqual([entry["clerk_id"] for entry in self.service.top(2)], ["a", "b"])
+        self.assertEqual(self.service.rank("b")["rank"], 2)
+        self.assertIsNone(self.service.rank("missing"))
+
+    def test_record_points_updates_boards(self):
+        self.service.top(1)
+        self.service.record_points("b", 100)
+
+        self.assertEqual(self.service.rank("b")["rank"], 1)
+        self.assertEqual(self.service.rank("b", window="daily")["points"], 100)
+
+    def test_reload_does_not_hold_the_board_lock(self):
+        self.service.top(1)
+        self.users.delay = 0.5
+        self.service._loaded_at = 0
+        self.service.top(1)  # starts a background reload
+
+        started = time.perf_counter()
+        acquired = threading.Event()
+
+        def lookup():
+            self.service.rank("a")
+            acquired.set()
+
+        threading.Thread(target=lookup).start()
+        self.assertTrue(acquired.wait(0.3))
+        self.assertLess(time.perf_counter() - started, 0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
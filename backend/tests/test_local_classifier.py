@@ -0,0 +1,39 @@
+import unittest
+
+from src.utils.local_classifier import LocalClassifier
+
+
+class LocalClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.classifier = LocalClassifier()
+
+    def test_known_items_are_answered_locally(self):
+        self.assertEqual(self.classifier.classify("plastic bottle"), "recyclable")
+        self.assertEqual(self.classifier.classify("Banana peels"), "organic")
+        self.assertEqual(self.classifier.classify("old batteries"), "hazardous")
+        self.assertEqual(self.classifier.classify("empty paint can"), "hazardous")
+
+    def test_one_known_word_next_to_an_unknown_one_is_escalated(self):
+        for item in ("oil painting", "phone case", "cooking oil", "glass cleaner spray"):
+            with self.subTest(item=item):
+                self.assertIsNone(self.classifier.classify(item))
+
+    def test_conflicting_words_are_escalated(self):
+        self.assertIsNone(self.classifier.classify("battery and banana"))
+
+    def test_whole_token_matching(self):
+        category, confidence = self.classifier.predict("cancer")
+        self.assertEqual(confidence, 0.0)
+
+    def test_learned_items_are_answered_locally(self):
+        self.assertIsNone(self.classifier.classify("oil painting"))
+        self.classifier.learn("oil painting", "general")
+        self.assertEqual(self.classifier.classify("an oil painting"), "general")
+
+    def test_unknown_categories_are_not_learned(self):
+        self.classifier.learn("phone case", "compostable")
+        self.assertIsNone(self.classifier.classify("phone case"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+
+from pymongo.errors import DuplicateKeyError
+
+from src.utils import memory_manager
+from src.utils.memory_manager import MemoryManager
+
+
+class SaveContextTest(unittest.TestCase):
+    def setUp(self):
+        self.users = mock.Mock()
+        self.ledger = mock.Mock()
+        self.ledger.prepare.return_value = {"user_id": "u1", "delta": 1, "source": "chat"}
+        self.queue = mock.Mock()
+        for name, value in (("users_collection", self.users), ("points_ledger", self.ledger),
+                            ("task_queue", self.queue), ("chat_history_collection", mock.Mock())):
+            patcher = mock.patch.object(memory_manager, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _job(self):
+        self.queue.enqueue.assert_called_once()
+        return self.queue.enqueue.call_args
+
+    def test_points_ride_along_in_the_single_user_update(self):
+        self.assertTrue(MemoryManager.save_context("u1", "hi", "hello", points=1, idempotency_key="k1"))
+
+        self.users.update_one.assert_called_once()
+        update = self.users.update_one.call_args[0][1]
+        self.assertEqual(update["$inc"], {"points": 1})
+        self.assertEqual(update["$push"]["applied_keys"]["$each"], ["chat:k1"])
+        self.ledger.applied.assert_not_called()  # derived views are left to the job
+
+        job = self._job()
+        self.assertEqual(job[0][:2], ("chat_archive", "chat_archive:k1"))
+        self.assertEqual(job[1]["ledger_entry"], self.ledger.prepare.return_value)
+        self.assertEqual(job[1]["interaction"]["idempotency_key"], "k1")
+
+    def test_repeated_key_does_not_reapply_the_points(self):
+        self.users.update_one.side_effect = DuplicateKeyError("clerk_id_unique")
+
+        self.assertTrue(MemoryManager.save_context("u1", "hi", "hello", points=1, idempotency_key="k1"))
+        self.assertIsNone(self._job()[1]["ledger_entry"])
+
+    def test_missing_ledger_entry_still_saves_the_context(self):
+        self.ledger.prepare.return_value = None
+
+        self.assertTrue(MemoryManager.save_context("u1", "hi", "hello", points=1))
+        self.assertNotIn("$inc", self.users.update_one.call_args[0][1])
+        self.assertIsNone(self._job()[1]["ledger_entry"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from src.utils.points_ledger import PointsLedger
+
+
+class RebuildTest(unittest.TestCase):
+    def setUp(self):
+        self.ledger = mock.Mock()
+        self.users = mock.Mock()
+        self.points = PointsLedger(self.ledger, mock.Mock(), self.users)
+        self.points._rebuild_daily = mock.Mock(return_value=0)
+
+    def test_apply_refuses_without_opening_balances(self):
+        self.ledger.aggregate.return_value = [{"_id": "a", "total": 10}]
+        self.users.find.return_value = [{"clerk_id": "a", "points": 500}]
+        self.ledger.count_documents.return_value = 0
+
+        result = self.points.rebuild(apply=True)
+
+        self.assertFalse(result["applied"])
+        self.users.update_one.assert_not_called()
+        self.points._rebuild_daily.assert_not_called()
+
+    def test_balance_is_compared_with_the_ledger_read_after_the_user(self):
+        # An award landed between the scan and the correction: both now agree
+        self.users.find_one.return_value = {"points": 15}
+        self.ledger.aggregate.return_value = [{"_id": None, "total": 15}]
+        self.ledger.count_documents.return_value = 0
+
+        self.assertFalse(self.points._correct_balance("a", datetime.utcnow()))
+        self.users.update_one.assert_not_called()
+
+    def test_users_with_recent_entries_are_skipped(self):
+        self.users.find_one.return_value = {"points": 10}
+        self.ledger.aggregate.return_value = [{"_id": None, "total": 15}]
+        self.ledger.count_documents.return_value = 1
+
+        self.assertIsNone(self.points._correct_balance("a", datetime.utcnow()))
+        self.users.update_one.assert_not_called()
+
+    def test_drift_is_corrected_conditionally(self):
+        self.users.find_one.return_value = {"points": 10}
+        self.ledger.aggregate.return_value = [{"_id": None, "total": 15}]
+        self.ledger.count_documents.return_value = 0
+        self.users.update_one.return_value = mock.Mock(modified_count=1)
+
+        self.assertTrue(self.points._correct_balance("a", datetime.utcnow()))
+        self.users.update_one.assert_called_once_with({"clerk_id": "a", "points": 10}, {"$set": {"points": 15}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from unittest import mock
+
+from bson import ObjectId
+
+from src.utils import redemption
+from src.utils.redemption import RedemptionError, _Compensation, _reward_id, redemption_key
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$gt" in condition and not (value is not None and value > condition["$gt"]):
+                return False
+            if "$gte" in condition and not (value is not None and value >= condition["$gte"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for the redemption steps."""
+
+    def __init__(self, docs=None):
+        self.docs = [dict(doc) for doc in docs or []]
+
+    def find_one(self, query, projection=None, session=None):
+        return next((dict(doc) for doc in self.docs if _matches(doc, query)), None)
+
+    def find_one_and_update(self, query, update, projection=None, return_document=None, session=None):
+        doc = next((doc for doc in self.docs if _matches(doc, query)), None)
+        if doc is None:
+            return None
+        for field, delta in update["$inc"].items():
+            doc[field] = doc.get(field, 0) + delta
+        return dict(doc)
+
+    def update_one(self, query, update, session=None):
+        self.find_one_and_update(query, update)
+
+    def insert_one(self, doc, session=None):
+        doc = dict(doc, _id=ObjectId())
+        self.docs.append(doc)
+        return mock.Mock(inserted_id=doc["_id"])
+
+    def delete_one(self, query, session=None):
+        self.docs = [doc for doc in self.docs if not _matches(doc, query)]
+
+
+class RedemptionHelpersTest(unittest.TestCase):
+    def test_redemption_key_is_scoped_to_the_user(self):
+        self.assertIsNone(redemption_key("user_1", None))
+        self.assertEqual(redemption_key("user_1", " abc "), "redeem:user_1:abc")
+        self.assertEqual(len(redemption_key("user_1", "x" * 500)), len("redeem:user_1:") + 128)
+
+    def test_invalid_reward_id_is_not_found(self):
+        with self.assertRaises(RedemptionError) as raised:
+            _reward_id("not-an-object-id")
+        self.assertEqual(raised.exception.status_code, 404)
+
+    def test_compensation_runs_in_reverse_and_survives_failures(self):
+        calls = []
+        undo = _Compensation()
+        undo.add(calls.append, "first")
+        undo.add(mock.Mock(side_effect=RuntimeError("lost connection")))
+        undo.add(calls.append, "last")
+
+        undo.run()
+        self.assertEqual(calls, ["last", "first"])
+
+
+class RedeemStepsTest(unittest.TestCase):
+    def setUp(self):
+        self.reward_oid = ObjectId()
+        self.rewards = FakeCollection([
+            {"_id": self.reward_oid, "name": "Keytag", "points_required": 100, "stock": 1, "active": True}
+        ])
+        self.users = FakeCollection([
+            {"clerk_id": "rich", "points": 250},
+            {"clerk_id": "poor", "points": 50},
+        ])
+        self.redemptions = FakeCollection()
+        self.ledger = mock.Mock()
+        self.ledger.record.return_value = {"idempotency_key": "redeem:rich:k1"}
+
+        for name, value in (("rewards_collection", self.rewards), ("users_collection", self.users),
+                            ("redemptions_collection", self.redemptions), ("points_ledger", self.ledger),
+                            ("points_ledger_collection", FakeCollection()), ("ActivityLog", mock.Mock())):
+            patcher = mock.patch.object(redemption, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_redeem_takes_stock_and_points(self):
+        result = redemption._redeem_steps("rich", self.reward_oid, None, "redeem:rich:k1")
+
+        self.assertEqual(result["points_remaining"], 150)
+        self.assertEqual(self.rewards.docs[0]["stock"], 0)
+        self.assertEqual(len(self.redemptions.docs), 1)
+        self.assertEqual(self.redemptions.docs[0]["idempotency_key"], "redeem:rich:k1")
+        self.ledger.record.assert_called_once_with("rich", -100, "redemption", "redeem:rich:k1",
+                                                   result["redemption_id"], session=None)
+
+    def test_out_of_stock_leaves_points_alone(self):
+        self.rewards.docs[0]["stock"] = 0
+
+        with self.assertRaises(RedemptionError) as raised:
+            redemption._redeem_steps("rich", self.reward_oid, None, None)
+        self.assertEqual(raised.exception.message, "Reward is out of stock")
+        self.assertEqual(self.users.find_one({"clerk_id": "rich"})["points"], 250)
+
+    def test_insufficient_points_returns_the_stock(self):
+        with self.assertRaises(RedemptionError) as raised:
+            redemption._redeem_without_transaction("poor", self.reward_oid, None, None)
+
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertIn("Insufficient points", raised.exception.message)
+        self.assertEqual(self.rewards.docs[0]["stock"], 1)
+        self.assertEqual(self.users.find_one({"clerk_id": "poor"})["points"], 50)
+        self.assertEqual(self.redemptions.docs, [])
+
+    def test_failed_later_step_undoes_the_earlier_ones(self):
+        self.ledger.record.side_effect = RuntimeError("write concern timeout")
+
+        with self.assertRaises(RuntimeError):
+            redemption._redeem_without_transaction("rich", self.reward_oid, None, None)
+        self.assertEqual(self.rewards.docs[0]["stock"], 1)
+        self.assertEqual(self.users.find_one({"clerk_id": "rich"})["points"], 250)
+        self.assertEqual(self.redemptions.docs, [])
+
+    def test_unlimited_stock_is_not_decremented(self):
+        self.rewards.docs[0]["stock"] = -1
+
+        redemption._redeem_steps("rich", self.reward_oid, None, None)
+        redemption._redeem_steps("rich", self.reward_oid, None, None)
+        self.assertEqual(self.rewards.docs[0]["stock"], -1)
+        self.assertEqual(self.users.find_one({"clerk_id": "rich"})["points"], 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
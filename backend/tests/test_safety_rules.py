@@ -0,0 +1,22 @@
+import unittest
+
+from src.utils.safety_rules import FORBIDDEN_PATTERN, REVIEW_PATTERN
+
+
+class SafetyRulesTest(unittest.TestCase):
+    def test_forbidden_terms_match_whole_words(self):
+        for text in ("kill", "how do I kill weeds", "KILL!", "bombs", "hack the bin", "rm -rf / please"):
+            self.assertIsNotNone(FORBIDDEN_PATTERN.search(text), text)
+
+    def test_words_containing_a_term_do_not_match(self):
+        for text in ("skill", "hacksaw", "killer whale", "bombay mix", "shacks"):
+            self.assertIsNone(FORBIDDEN_PATTERN.search(text), text)
+
+    def test_phrases_and_review_terms(self):
+        self.assertIsNotNone(FORBIDDEN_PATTERN.search("can I burn waste with acid?"))
+        self.assertIsNotNone(REVIEW_PATTERN.search("toxic fumes from the bin"))
+        self.assertIsNone(REVIEW_PATTERN.search("acidic soil and burnt toast"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from pymongo.errors import BulkWriteError
+
+from src.utils.task_queue import TaskQueue, TASK_QUEUE_MAX_ATTEMPTS
+
+
+class FailingCollection:
+    """insert_many fails with the given per-index error codes."""
+
+    def __init__(self, codes):
+        self.codes = codes
+        self.inserted = []
+
+    def insert_many(self, docs, ordered=True):
+        errors = []
+        for index, doc in enumerate(docs):
+            code = self.codes.get(doc["_id"])
+            if code:
+                errors.append({"index": index, "code": code, "errmsg": f"error {code}"})
+            else:
+                self.inserted.append(doc)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def job(key):
+    return {"_id": key, "kind": "test", "payload": {}, "status": "pending", "attempts": 0}
+
+
+class PersistTest(unittest.TestCase):
+    def test_only_recorded_jobs_are_returned(self):
+        collection = FailingCollection({"dup": 11000, "too-big": 10334})
+        queue = TaskQueue(collection)
+
+        recorded = queue._persist([job("ok"), job("dup"), job("too-big"), job("ok")])
+
+        self.assertEqual([j["_id"] for j in recorded], ["ok"])
+        self.assertEqual(queue.duplicates, 2)  # one within the batch, one already stored
+        self.assertEqual(queue._queue.get_nowait()["_id"], "too-big")
+        self.assertTrue(queue._queue.empty())
+
+    def test_unrecordable_jobs_are_dropped_after_max_attempts(self):
+        queue = TaskQueue(FailingCollection({"too-big": 10334}))
+        pending = job("too-big")
+        for _ in range(TASK_QUEUE_MAX_ATTEMPTS):
+            queue._persist([pending])
+            if queue._queue.empty():
+                break
+            pending = queue._queue.get_nowait()
+
+        self.assertTrue(queue._queue.empty())
+        self.assertEqual(queue.failures, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from src.utils.token_budget import ELLIPSIS, allocate_budget, count_tokens, truncate_to_tokens
+
+
+class TruncateToTokensTest(unittest.TestCase):
+    def setUp(self):
+        self.text = " ".join(f"word{i}" for i in range(200))
+
+    def test_short_text_is_unchanged(self):
+        self.assertEqual(truncate_to_tokens("rinse the bottle", 50), "rinse the bottle")
+        self.assertEqual(truncate_to_tokens("anything", 0), "")
+        self.assertEqual(count_tokens(""), 0)
+
+    def test_head_keeps_whole_words_from_the_start(self):
+        result = truncate_to_tokens(self.text, 20)
+
+        self.assertLessEqual(count_tokens(result), 20)
+        self.assertTrue(result.endswith(ELLIPSIS))
+        self.assertTrue(self.text.startswith(result[:-len(ELLIPSIS)]))
+        self.assertTrue(result[:-len(ELLIPSIS)].split()[-1] in self.text.split())
+
+    def test_tail_keeps_the_newest_lines(self):
+        history = "\n".join(f"User: question {i}\nAssistant: answer {i}" for i in range(50))
+        result = truncate_to_tokens(history, 30, keep="tail")
+
+        self.assertLessEqual(count_tokens(result), 30)
+        self.assertTrue(result.endswith("Assistant: answer 49"))
+        self.assertTrue(history.endswith(result))
+
+    def test_truncation_is_deterministic(self):
+        self.assertEqual(truncate_to_tokens(self.text, 25), truncate_to_tokens(self.text, 25))
+
+
+class AllocateBudgetTest(unittest.TestCase):
+    def test_everything_fits(self):
+        self.assertEqual(allocate_budget(100, {"guide": 30, "history": 20}, {}), {"guide": 30, "history": 20})
+
+    def test_split_follows_shares(self):
+        limits = allocate_budget(100, {"guide": 500, "history": 500}, {"guide": 3, "history": 1})
+
+        self.assertEqual(sum(limits.values()), 100)
+        self.assertEqual(limits, {"guide": 75, "history": 25})
+
+    def test_unused_share_goes_to_sections_that_want_more(self):
+        limits = allocate_budget(100, {"guide": 10, "history": 500}, {"guide": 3, "history": 1})
+
+        self.assertEqual(limits, {"guide": 10, "history": 90})
+
+    def test_no_budget(self):
+        self.assertEqual(allocate_budget(-5, {"guide": 10}, {}), {"guide": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()